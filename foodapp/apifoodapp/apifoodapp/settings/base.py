@@ -1,5 +1,6 @@
 """
-Django settings for apifoodapp project.
+Django settings for apifoodapp project - phần dùng chung cho mọi môi trường.
+Cấu hình riêng nằm ở dev.py / prod.py, chọn bằng biến môi trường DJANGO_ENV (xem __init__.py).
 
 Generated by 'django-admin startproject' using Django 5.1.2.
 
@@ -12,19 +13,20 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 import os
 from pathlib import Path
 
-import cloudinary
-
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
-BASE_DIR = Path(__file__).resolve().parent.parent
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+ENVIRONMENT = 'base'
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-i!_^62v6mlx$x9wdwi0^qsy536y$1-tw+almbtc&noioz5f+=4'
+# Secret chỉ lấy từ biến môi trường, không để giá trị mặc định trong repo (dev.py có giá trị giả cho máy dev)
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = False
 
 ALLOWED_HOSTS = ['192.168.1.213', '127.0.0.1',
                  '192.168.0.108', '192.168.10.200',
@@ -46,18 +48,11 @@ INSTALLED_APPS = [
     'oauth2_provider',
     'drf_yasg',
     'cloudinary',
-    'debug_toolbar',
     # 'django_celery_email',
 ]
 
-cloudinary.config(
-    cloud_name="dq94qmefz",
-    api_key="876776184315666",
-    api_secret="XNP84wQu2yfxt1gjm59KdGMBxJk",  # Click 'View API Keys' above to copy your API secret
-    secure=True
-)
-
 MIDDLEWARE = [
+    'app.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -65,13 +60,17 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
 INTERNAL_IPS = [
     '127.0.0.1', '192.168.1.213', '192.168.10.200',
 ]
 
+# Request chậm hơn ngưỡng này (ms) sẽ được log kèm các câu SQL chậm nhất
+SLOW_REQUEST_MS = 500
+# IP được phép đọc /metrics (None = không giới hạn)
+METRICS_ALLOWED_IPS = INTERNAL_IPS
+
 ROOT_URLCONF = 'apifoodapp.urls'
 
 REST_FRAMEWORK = {
@@ -107,10 +106,18 @@ WSGI_APPLICATION = 'apifoodapp.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.mysql',
-        'NAME': 'foodapp4db',
-        'USER': 'root',
-        'PASSWORD': 'tiendatmySQL964@',
-        'HOST': ''
+        'NAME': os.environ.get('DB_NAME', 'foodapp4db'),
+        'USER': os.environ.get('DB_USER', 'root'),
+        'PASSWORD': os.environ.get('DB_PASSWORD'),
+        'HOST': os.environ.get('DB_HOST', ''),
+        'PORT': os.environ.get('DB_PORT', ''),
+    }
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'foodapp',
     }
 }
 
@@ -139,6 +146,9 @@ LANGUAGE_CODE = 'en-us'
 
 TIME_ZONE = 'UTC'
 
+# Giờ phục vụ món ăn/menu được tính theo giờ địa phương của nhà hàng
+RESTAURANT_TIME_ZONE = 'Asia/Ho_Chi_Minh'
+
 USE_I18N = True
 
 USE_TZ = True
@@ -149,18 +159,37 @@ USE_TZ = True
 STATIC_URL = 'static/'
 MEDIA_ROOT = '%s/app/static' % BASE_DIR
 
+# Ảnh upload được lưu tạm ở đây rồi worker `process_uploads` đẩy lên storage
+UPLOAD_STAGING_DIR = os.environ.get('UPLOAD_STAGING_DIR', str(BASE_DIR / 'uploads' / 'staging'))
+# app.storage.LocalImageStorage để chạy offline (ảnh lưu trong app/static/images)
+IMAGE_STORAGE_BACKEND = os.environ.get('IMAGE_STORAGE_BACKEND', 'app.storage.CloudinaryImageStorage')
+# app.carts.CacheCartStorage: giỏ hàng nằm trong cache (cần Redis), ghi xuống DB khi đọc giỏ/đặt hàng
+# và định kỳ bằng `python manage.py flush_carts`
+CART_STORAGE_BACKEND = os.environ.get('CART_STORAGE_BACKEND', 'app.carts.OrmCartStorage')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'app.User'
 
-CLIENT_ID = 'QvhI26LJ0bwHurLgrMoEYRy5OPeMrMLbmGLtZxGE'
-CLIENT_SECRET = 'Muy7Hq81uX5ElvZTT3zMr84CkzreJ4qXZsiTc7OYYwMCrNAL6UxZTeztJRri2mGxihlT2yDaqX9ZDpCbmx2FBkKBTWEwJ0dZzOeGaxSKG001yxXpodHBpXwk6DvVVmCY'
+CLIENT_ID = os.environ.get('OAUTH_CLIENT_ID')
+CLIENT_SECRET = os.environ.get('OAUTH_CLIENT_SECRET')
 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
-EMAIL_HOST_USER = 'lequoctrunggg@gmail.com'
-EMAIL_HOST_PASSWORD = 'tanx bduy nlqo eeul'
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'app': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
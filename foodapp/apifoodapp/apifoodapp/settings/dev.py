@@ -0,0 +1,31 @@
+import os
+
+import cloudinary
+
+from .base import *  # noqa
+
+ENVIRONMENT = 'dev'
+
+DEBUG = True
+
+# Giá trị giả chỉ để chạy trên máy dev; secret thật đặt qua biến môi trường
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', 'django-insecure-dev-only')
+DATABASES['default']['PASSWORD'] = os.environ.get('DB_PASSWORD', '')
+CLIENT_ID = os.environ.get('OAUTH_CLIENT_ID', 'dev-client-id')
+CLIENT_SECRET = os.environ.get('OAUTH_CLIENT_SECRET', 'dev-client-secret')
+
+# không có tài khoản Cloudinary thì dùng IMAGE_STORAGE_BACKEND=app.storage.LocalImageStorage
+cloudinary.config(
+    cloud_name=os.environ.get('CLOUDINARY_CLOUD_NAME', ''),
+    api_key=os.environ.get('CLOUDINARY_API_KEY', ''),
+    api_secret=os.environ.get('CLOUDINARY_API_SECRET', ''),
+    secure=True
+)
+
+INSTALLED_APPS = INSTALLED_APPS + [
+    'debug_toolbar',
+]
+
+MIDDLEWARE = MIDDLEWARE + [
+    'debug_toolbar.middleware.DebugToolbarMiddleware',
+]
@@ -14,3 +14,16 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'apifoodapp.settings')
 
 application = get_wsgi_application()
+
+# build sẵn chỉ mục gợi ý / tìm gần đúng; DB chưa sẵn sàng thì để request đầu tiên build.
+# Đóng kết nối DB dùng để build: server pre-fork (gunicorn --preload) không để các worker dùng chung 1 socket MySQL
+from django.db import DatabaseError, connections  # noqa: E402
+from app import autocomplete, fuzzy  # noqa: E402
+
+try:
+    autocomplete.warm_up()
+    fuzzy.get_index()
+except DatabaseError:
+    pass
+finally:
+    connections.close_all()
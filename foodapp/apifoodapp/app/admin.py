@@ -4,7 +4,8 @@ from django.core.mail import send_mail
 from django.db.models import Q
 
 from django.contrib import admin
-from django.db.models import Sum, Count
+from django.db.models import Sum, Count, BigIntegerField, OuterRef, Subquery
+from django.db.models.functions import Cast, Coalesce
 from django.shortcuts import render
 from django.urls import path
 from django.utils import timezone
@@ -64,8 +65,11 @@ class FoodAppAdminSite(admin.AdminSite):
 
         date_filter = Q(restaurant_orders__order_date__gte=start_date) & Q(
             restaurant_orders__order_date__lte=end_date)
+        # doanh thu tính bằng subquery riêng: SUM(DISTINCT total) trên phép join với foods bỏ mất các đơn cùng tổng tiền
+        sales = Order.objects.filter(restaurant=OuterRef('pk'), order_date__gte=start_date,
+                                     order_date__lte=end_date).values('restaurant').annotate(s=Sum('total')).values('s')
         restaurant_stats = Restaurant.objects.annotate(
-            sales=Sum('restaurant_orders__total', filter=date_filter, distinct=True),
+            sales=Coalesce(Cast(Subquery(sales), BigIntegerField()), 0),
             total_orders=Count('restaurant_orders', filter= date_filter, distinct=True),
             food_count=Count('foods', distinct=True)
         )
@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.core.exceptions import ImproperlyConfigured
 
 
 class AppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app'
+
+    def ready(self):
+        from . import signals  # noqa
+        from .checks import check_production_settings, check_cart_storage
+
+        # gunicorn/uwsgi không chạy system check -> kiểm tra ngay khi khởi động
+        errors = check_production_settings(None) + check_cart_storage(None)
+        if errors:
+            raise ImproperlyConfigured('; '.join(e.msg for e in errors))
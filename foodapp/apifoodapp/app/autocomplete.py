@@ -0,0 +1,115 @@
+import bisect
+import threading
+
+from .categories import normalize
+from .models import Food, Restaurant, MainCategory
+from .search_index import SyncedIndex, search_log
+
+# Gợi ý khi gõ từ khoá: chỉ mục tiền tố nằm trong RAM của mỗi worker, không chạm MySQL khi trả lời.
+# Món/nhà hàng/danh mục đổi thì mọi worker cập nhật từng dòng qua log thay đổi chung (app/search_index.py).
+MAX_WORDS = 4  # khớp tiền tố từ tối đa 4 từ đầu: "tam" -> "Cơm tấm"
+SCAN_LIMIT = 500  # số entry tối đa duyệt cho 1 tiền tố trước khi xếp hạng
+CATEGORY_WEIGHT = 1e9  # danh mục chính luôn đứng đầu
+
+
+def index_keys(name):
+    words = normalize(name).split()
+    return {' '.join(words[i:]) for i in range(min(len(words), MAX_WORDS))}
+
+
+class PrefixIndex:
+    # entries: list đã sort các (key, kind, id); items[(kind, id)] = (name, weight, keys)
+    def __init__(self):
+        self.entries = []
+        self.items = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def build(cls, rows=None):
+        # rows: [(kind, id, tên, điểm)], mặc định đọc danh mục, nhà hàng, món đang hoạt động
+        index = cls()
+        if rows is None:
+            rows = [('category', c_id, name, CATEGORY_WEIGHT)
+                    for c_id, name in MainCategory.objects.filter(active=True).values_list('id', 'name')]
+            rows += [('restaurant', r_id, name, weight) for r_id, name, weight in
+                     Restaurant.objects.filter(active=True).values_list('id', 'name', 'popularity')]
+            rows += [('food', f_id, name, weight) for f_id, name, weight in
+                     Food.objects.filter(is_available=True).values_list('id', 'name', 'popularity')]
+
+        entries = []
+        for kind, item_id, name, weight in rows:
+            keys = index_keys(name)
+            index.items[(kind, item_id)] = (name, weight, keys)
+            entries.extend((key, kind, item_id) for key in keys)
+        entries.sort()
+        index.entries = entries
+        return index
+
+    def remove(self, kind, item_id):
+        with self.lock:
+            item = self.items.pop((kind, item_id), None)
+            if item is None:
+                return
+            for key in item[2]:
+                i = bisect.bisect_left(self.entries, (key, kind, item_id))
+                if i < len(self.entries) and self.entries[i] == (key, kind, item_id):
+                    del self.entries[i]
+
+    def put(self, kind, item_id, name, weight):
+        self.remove(kind, item_id)
+        with self.lock:
+            keys = index_keys(name)
+            self.items[(kind, item_id)] = (name, weight, keys)
+            for key in keys:
+                bisect.insort(self.entries, (key, kind, item_id))
+
+    def search(self, text, limit=10):
+        prefix = ' '.join(normalize(text).split())
+        if not prefix:
+            return []
+        with self.lock:
+            i = bisect.bisect_left(self.entries, (prefix,))
+            candidates = []
+            for key, kind, item_id in self.entries[i:i + SCAN_LIMIT]:
+                if not key.startswith(prefix):
+                    break
+                name, weight, _ = self.items[(kind, item_id)]
+                candidates.append((weight, kind, item_id, name))
+
+        # nhiều nhà hàng cùng bán "Cơm tấm" -> chỉ gợi ý 1 lần, lấy món có điểm cao nhất
+        candidates.sort(key=lambda c: (-c[0], c[3]))
+        results, seen = [], set()
+        for _, kind, item_id, name in candidates:
+            if (kind, name.lower()) in seen:
+                continue
+            seen.add((kind, name.lower()))
+            results.append({'type': kind, 'id': item_id, 'name': name})
+            if len(results) >= limit:
+                break
+        return results
+
+
+def apply_change(index, change):
+    if change['kind'] not in ('food', 'restaurant', 'category'):
+        return
+    if change['visible']:
+        weight = CATEGORY_WEIGHT if change['kind'] == 'category' else change['weight']
+        index.put(change['kind'], change['id'], change['name'], weight)
+    else:
+        index.remove(change['kind'], change['id'])
+
+
+_synced = SyncedIndex(search_log, PrefixIndex.build, apply_change)
+
+
+def get_index():
+    return _synced.get()
+
+
+def warm_up():
+    # gọi sẵn khi worker khởi động (xem wsgi.py) để request đầu tiên không phải chờ build
+    return get_index()
+
+
+def suggest(text, limit=10):
+    return get_index().search(text, limit)
@@ -0,0 +1,158 @@
+import bisect
+import zoneinfo
+from datetime import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Food, Menu, ServicePeriod
+
+# Khung giờ phục vụ của từng buổi (giờ địa phương của nhà hàng)
+PERIOD_HOURS = {
+    ServicePeriod.MORNING: (time(6, 0), time(10, 30)),
+    ServicePeriod.NOON: (time(10, 30), time(14, 0)),
+    ServicePeriod.AFTERNOON: (time(14, 0), time(17, 30)),
+    ServicePeriod.EVENING: (time(17, 30), time(23, 0)),
+    ServicePeriod.ALLDAY: (None, None),
+}
+
+DAY_MINUTES = 24 * 60
+SCHEDULE_TIMEOUT = 60 * 60 * 24
+
+
+def minute_of(t):
+    return t.hour * 60 + t.minute
+
+
+def local_now(at=None):
+    tz = zoneinfo.ZoneInfo(getattr(settings, 'RESTAURANT_TIME_ZONE', settings.TIME_ZONE))
+    return timezone.localtime(at or timezone.now(), tz)
+
+
+def intervals(start, end):
+    # [start, end) theo phút trong ngày, khung giờ qua nửa đêm (22:00 - 02:00) được tách làm 2
+    if start is None or end is None:
+        return [(0, DAY_MINUTES)]
+    start, end = minute_of(start), minute_of(end)
+    if start == end:
+        return [(0, DAY_MINUTES)]
+    if start < end:
+        return [(start, end)]
+    return [(start, DAY_MINUTES), (0, end)]
+
+
+def food_intervals(is_available, serve_period, available_start, available_end):
+    # giờ cụ thể của món ưu tiên hơn buổi phục vụ
+    if not is_available:
+        return []
+    if available_start and available_end:
+        return intervals(available_start, available_end)
+    return menu_intervals(serve_period)
+
+
+def menu_intervals(serve_period):
+    return intervals(*PERIOD_HOURS.get(serve_period, (None, None)))
+
+
+class RestaurantSchedule:
+    # boundaries: các mốc phút đã sort; segments[i] = (food_ids, menu_ids) phục vụ trong [boundaries[i], boundaries[i+1])
+    def __init__(self, foods, menus):
+        points = {0}
+        for _, ivs in foods + menus:
+            for start, end in ivs:
+                points.update((start, end % DAY_MINUTES))
+        self.boundaries = sorted(points)
+
+        food_sets = [set() for _ in self.boundaries]
+        menu_sets = [set() for _ in self.boundaries]
+        for items, sets in ((foods, food_sets), (menus, menu_sets)):
+            for item_id, ivs in items:
+                for start, end in ivs:
+                    first = bisect.bisect_left(self.boundaries, start)
+                    last = bisect.bisect_left(self.boundaries, end)
+                    for i in range(first, last):
+                        sets[i].add(item_id)
+
+        self.segments = [(frozenset(f), frozenset(m)) for f, m in zip(food_sets, menu_sets)]
+
+    @classmethod
+    def build(cls, restaurant_id):
+        foods = [(f['id'], food_intervals(f['is_available'], f['serve_period'], f['available_start'],
+                                          f['available_end']))
+                 for f in Food.objects.filter(restaurant_id=restaurant_id).values(
+                     'id', 'is_available', 'serve_period', 'available_start', 'available_end')]
+        menus = [(m['id'], menu_intervals(m['serve_period']))
+                 for m in Menu.objects.filter(restaurant_id=restaurant_id, active=True).values('id', 'serve_period')]
+        return cls(foods, menus)
+
+    def at(self, minute):
+        i = bisect.bisect_right(self.boundaries, minute) - 1
+        next_boundary = self.boundaries[i + 1] if i + 1 < len(self.boundaries) else DAY_MINUTES
+        return self.segments[i], next_boundary
+
+
+def schedule_key(restaurant_id):
+    return 'availability:schedule:%s' % restaurant_id
+
+
+def now_key(restaurant_id):
+    return 'availability:now:%s' % restaurant_id
+
+
+def get_schedule(restaurant_id):
+    schedule = cache.get(schedule_key(restaurant_id))
+    if schedule is None:
+        schedule = RestaurantSchedule.build(restaurant_id)
+        cache.set(schedule_key(restaurant_id), schedule, SCHEDULE_TIMEOUT)
+    return schedule
+
+
+def available_ids(restaurant_id, at=None):
+    # Trả về (food_ids, menu_ids) đang phục vụ; kết quả "bây giờ" được cache tới mốc giờ kế tiếp
+    if at is None:
+        cached = cache.get(now_key(restaurant_id))
+        if cached is not None:
+            return cached
+
+    now = local_now(at)
+    minute = minute_of(now)
+    segment, next_boundary = get_schedule(restaurant_id).at(minute)
+
+    if at is None:
+        seconds_left = (next_boundary - minute) * 60 - now.second
+        cache.set(now_key(restaurant_id), segment, max(1, seconds_left))
+    return segment
+
+
+def invalidate(restaurant_id):
+    cache.delete_many([schedule_key(restaurant_id), now_key(restaurant_id)])
+
+
+def is_food_available(food, at=None):
+    return food.id in available_ids(food.restaurant_id, at)[0]
+
+
+def periods_at(minute):
+    return [p for p, hours in PERIOD_HOURS.items() if any(start <= minute < end for start, end in intervals(*hours))]
+
+
+def available_menus_q(at=None):
+    periods = periods_at(minute_of(local_now(at)))
+    return Q(active=True) & (Q(serve_period__in=periods) | Q(serve_period__isnull=True) | Q(serve_period=''))
+
+
+def available_foods_q(at=None):
+    # Điều kiện SQL cho danh sách món của nhiều nhà hàng (foods, search), cùng quy tắc với food_intervals()
+    now = local_now(at).time().replace(second=0, microsecond=0)
+    periods = periods_at(minute_of(now))
+
+    by_period = Q(serve_period__in=periods) | Q(serve_period__isnull=True) | Q(serve_period='')
+
+    has_hours = Q(available_start__isnull=False, available_end__isnull=False)
+    same_day = Q(available_start__lt=F('available_end'), available_start__lte=now, available_end__gt=now)
+    overnight = Q(available_start__gt=F('available_end')) & (Q(available_start__lte=now) | Q(available_end__gt=now))
+    all_day = Q(available_start=F('available_end'))
+
+    return Q(is_available=True) & ((has_hours & (same_day | overnight | all_day)) | (~has_hours & by_period))
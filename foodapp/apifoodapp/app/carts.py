@@ -0,0 +1,377 @@
+import time
+import uuid
+from contextlib import contextmanager
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Now
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import APIException
+
+from .models import Cart, SubCart, SubCartItem, Food
+
+BADGE_TIMEOUT = 60 * 5
+
+
+def badge_key(user_id):
+    return 'cart:badge:%s' % user_id
+
+
+def sum_of(queryset, group, field, output_field):
+    # (SELECT SUM(field) ... GROUP BY group) dùng trong UPDATE, không kéo dòng nào về Python
+    total = queryset.values(group).annotate(s=Sum(field)).values('s')
+    return Coalesce(Subquery(total), 0, output_field=output_field)
+
+
+def sub_cart_totals():
+    items = SubCartItem.objects.filter(sub_cart_id=OuterRef('pk'))
+    return {'total_price': sum_of(items, 'sub_cart_id', 'price', IntegerField()),
+            'total_quantity': sum_of(items, 'sub_cart_id', 'quantity', IntegerField())}
+
+
+def cart_totals():
+    sub_carts = SubCart.objects.filter(cart_id=OuterRef('pk'))
+    return {'items_number': Coalesce(Subquery(sub_carts.values('cart_id').annotate(c=Count('*')).values('c')), 0),
+            'total_price': sum_of(sub_carts, 'cart_id', 'total_price', IntegerField())}
+
+
+def refresh_totals(cart, sub_cart_ids=None, forget=True):
+    # Tính lại tổng của sub cart (tất cả hoặc sub_cart_ids) và của cart bằng 2 câu UPDATE, rồi xoá cache badge.
+    # forget: bảng trong DB vừa bị sửa trực tiếp -> bỏ bản giỏ hàng trong cache (CacheCartStorage) để đọc lại
+    sub_carts = SubCart.objects.filter(cart_id=cart.id)
+    if sub_cart_ids is not None:
+        sub_carts = sub_carts.filter(id__in=sub_cart_ids)
+    sub_carts.update(**sub_cart_totals())
+    Cart.objects.filter(id=cart.id).update(updated_date=Now(), **cart_totals())
+    invalidate_badge(cart.user_id)
+    if forget:
+        user_id = cart.user_id
+        transaction.on_commit(lambda: get_cart_storage().forget(user_id))
+
+
+def invalidate_badge(user_id):
+    # xoá sau khi commit để request đọc song song không cache lại số cũ
+    transaction.on_commit(lambda: cache.delete(badge_key(user_id)))
+
+
+def get_badge(user_id):
+    # {'items_number', 'total_price'}: 1 câu SQL theo index unique user_id, cache theo user
+    badge = cache.get(badge_key(user_id))
+    if badge is None:
+        badge = Cart.objects.filter(user_id=user_id).values('items_number', 'total_price').first() \
+            or {'items_number': 0, 'total_price': 0}
+        cache.set(badge_key(user_id), badge, BADGE_TIMEOUT)
+    return badge
+
+
+def reprice_food(food_id, price):
+    # Giá món đổi: thành tiền các dòng trong giỏ có món này và tổng của sub cart/cart chứa chúng được tính lại
+    # bằng 3 câu UPDATE theo tập, không nạp dòng giỏ hàng nào vào Python.
+    # Giỏ trong cache (CacheCartStorage) được tính lại giá lúc flush
+    lines = SubCartItem.objects.filter(food_id=food_id)
+    affected = Cart.objects.filter(id__in=SubCart.objects.filter(id__in=lines.values('sub_cart_id')).values('cart_id'))
+    user_ids = list(affected.values_list('user_id', flat=True))
+    if not user_ids:
+        return 0
+    with transaction.atomic():
+        updated = lines.update(price=F('quantity') * price)
+        SubCart.objects.filter(id__in=lines.values('sub_cart_id')).update(**sub_cart_totals())
+        affected.update(**cart_totals())
+    transaction.on_commit(lambda: forget_prices(user_ids))
+    return updated
+
+
+def forget_prices(user_ids):
+    cache.delete_many([badge_key(user_id) for user_id in user_ids])
+    storage = get_cart_storage()
+    for user_id in user_ids:
+        storage.forget_clean(user_id)
+
+
+def verify_prices(sub_cart):
+    # Đặt hàng (gọi trong transaction): 1 câu SELECT ... FOR UPDATE lấy các dòng của sub cart kèm giá hiện tại
+    # của món, khoá cả dòng giỏ lẫn món đến hết transaction.
+    # Trả về (rows, stale): stale = các dòng có thành tiền khác quantity * giá hiện tại
+    rows = list(SubCartItem.objects.select_for_update().filter(sub_cart=sub_cart).values(
+        'food_id', 'quantity', 'price', unit_price=F('food__price')).order_by('id'))
+    stale = [row for row in rows if row['price'] != row['quantity'] * row['unit_price']]
+    return rows, stale
+
+
+def reprice_sub_cart(sub_cart):
+    # tính lại thành tiền các dòng của 1 sub cart theo giá hiện tại (UPDATE ... SET price = quantity * (SELECT price))
+    current = Food.objects.filter(id=OuterRef('food_id')).values('price')
+    with transaction.atomic():
+        SubCartItem.objects.filter(sub_cart=sub_cart).update(price=F('quantity') * Subquery(current))
+        refresh_totals(sub_cart.cart, [sub_cart.id])
+
+
+def delete_sub_carts(cart, sub_cart_ids):
+    # Xoá các sub cart của đúng giỏ này (id lạ bị bỏ qua), đếm lại items_number bằng COUNT trong cùng transaction;
+    # giỏ rỗng thì xoá luôn. Trả về cart với items_number/total_price mới
+    with transaction.atomic():
+        cart = Cart.objects.select_for_update().get(pk=cart.pk)
+        SubCart.objects.filter(cart=cart, id__in=sub_cart_ids).delete()
+        refresh_totals(cart, [])
+        cart.refresh_from_db(fields=['items_number', 'total_price'])
+        if cart.items_number == 0:
+            cart.delete()
+    return cart
+
+
+def sweep_abandoned(before, batch_size=1000, skip_user_ids=()):
+    # Xoá giỏ không đổi từ trước `before`, mỗi lô 1 transaction ngắn (theo index updated_date) để không khoá bảng lâu.
+    # Giỏ đang được thêm món (add_item giữ khoá dòng cart) bị bỏ qua, không bị xoá giữa chừng.
+    # Trả về số giỏ đã xoá
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            batch = list(Cart.objects.select_for_update(skip_locked=True)
+                         .filter(updated_date__lt=before).exclude(user_id__in=skip_user_ids)
+                         .order_by('updated_date', 'id').values_list('id', 'user_id')[:batch_size])
+            if not batch:
+                return deleted
+            cart_ids = [cart_id for cart_id, _ in batch]
+            SubCartItem.objects.filter(sub_cart__cart_id__in=cart_ids).delete()
+            SubCart.objects.filter(cart_id__in=cart_ids).delete()
+            Cart.objects.filter(id__in=cart_ids).delete()
+        # user bắt đầu sửa giỏ (CacheCartStorage) sau khi sweep_carts lấy danh sách dirty: bản trong cache được giữ,
+        # flush sau đó ghi lại giỏ xuống DB
+        for _, user_id in batch:
+            cache.delete(badge_key(user_id))
+            get_cart_storage().forget_clean(user_id)
+        deleted += len(batch)
+
+
+class OrmCartStorage:
+    # Mặc định: mỗi thao tác ghi thẳng Cart/SubCart/SubCartItem
+    def add_item(self, user_id, food, quantity, note=''):
+        # quantity âm để bớt; còn <= 0 thì bỏ món khỏi giỏ. Trả về Cart (có items_number, total_price)
+        with transaction.atomic():
+            # khoá dòng cart: sweep_abandoned bỏ qua giỏ đang được sửa
+            cart, _ = Cart.objects.select_for_update().get_or_create(user_id=user_id)
+            sub_cart, _ = SubCart.objects.get_or_create(cart=cart, restaurant_id=food.restaurant_id)
+            item = SubCartItem.objects.select_for_update().filter(sub_cart=sub_cart, food=food).first()
+            if item is None:
+                item = SubCartItem(restaurant_id=food.restaurant_id, sub_cart=sub_cart, food=food, quantity=0,
+                                   note=note or '')
+            item.quantity += quantity
+            item.price = item.quantity * food.price
+            if note:
+                item.note = note
+            if item.quantity > 0:
+                item.save()
+            else:
+                if item.pk:
+                    item.delete()
+                if not sub_cart.sub_cart_items.exists():
+                    sub_cart.delete()
+            refresh_totals(cart, [sub_cart.id], forget=False)
+        cart.refresh_from_db(fields=['items_number', 'total_price'])
+        return cart
+
+    def badge(self, user_id):
+        return get_badge(user_id)
+
+    def flush(self, user_id):
+        pass
+
+    def forget(self, user_id):
+        pass
+
+    def forget_clean(self, user_id):
+        pass
+
+
+class CartBusy(APIException):
+    status_code = 503
+    default_detail = 'Giỏ hàng đang được cập nhật, vui lòng thử lại.'
+    default_code = 'cart_busy'
+
+
+class CacheCartStorage:
+    # Giỏ hàng của user là 1 key trong cache (Redis ở prod, xem app/checks.py):
+    #   {'cart_id', 'items': {food_id: [restaurant_id, quantity, price, note]}, 'dirty'}
+    # Thêm/bớt món chỉ đọc-ghi key này. Ghi xuống 3 bảng (write-behind) khi flush(): trước khi đọc giỏ từ DB
+    # (my-cart, sub-carts, checkout...) và định kỳ bằng `python manage.py flush_carts`.
+    # Mọi thao tác đọc-sửa-ghi trên giỏ của 1 user chạy trong khoá theo user nằm trong cache (cache.add là SET NX
+    # trên Redis) nên 2 worker không ghi đè lên nhau và không flush cùng 1 giỏ 2 lần.
+    # User có giỏ chưa ghi xuống DB được ghi vào 1 log trong cache (cache.incr nguyên tử):
+    # cart:dirty:<n> = user id với head < n <= seq; flush_carts đọc log rồi cắt phần đã xử lý
+    lock_timeout = 30  # khoá tự hết hạn nếu worker chết giữa chừng
+    lock_wait = 5
+    seq_key = 'cart:dirty:seq'
+    head_key = 'cart:dirty:head'
+
+    def state_key(self, user_id):
+        return 'cart:state:%s' % user_id
+
+    def flag_key(self, user_id):
+        return 'cart:dirty:user:%s' % user_id
+
+    def log_key(self, n):
+        return 'cart:dirty:%d' % n
+
+    @contextmanager
+    def locked(self, name):
+        key, token = 'cart:lock:%s' % name, uuid.uuid4().hex
+        deadline = time.monotonic() + self.lock_wait
+        while not cache.add(key, token, self.lock_timeout):
+            if time.monotonic() > deadline:
+                raise CartBusy()
+            time.sleep(0.01)
+        try:
+            yield
+        finally:
+            if cache.get(key) == token:
+                cache.delete(key)
+
+    def load(self, user_id):
+        state = cache.get(self.state_key(user_id))
+        if state is None:
+            cart_id = Cart.objects.filter(user_id=user_id).values_list('id', flat=True).first()
+            items = {}
+            if cart_id is not None:
+                for row in SubCartItem.objects.filter(sub_cart__cart_id=cart_id).values_list(
+                        'food_id', 'restaurant_id', 'quantity', 'price', 'note'):
+                    items[row[0]] = list(row[1:])
+            state = {'cart_id': cart_id, 'items': items, 'dirty': False}
+        return state
+
+    def save(self, user_id, state):
+        cache.set(self.state_key(user_id), state, None)
+
+    def summary(self, state):
+        restaurants = {item[0] for item in state['items'].values()}
+        return {'items_number': len(restaurants), 'total_price': sum(item[2] for item in state['items'].values())}
+
+    def add_item(self, user_id, food, quantity, note=''):
+        with self.locked(user_id):
+            state = self.load(user_id)
+            item = state['items'].get(food.id) or [food.restaurant_id, 0, 0, note or '']
+            item[1] += quantity
+            item[2] = item[1] * food.price
+            if note:
+                item[3] = note
+            if item[1] > 0:
+                state['items'][food.id] = item
+            else:
+                state['items'].pop(food.id, None)
+            state['dirty'] = True
+            self.save(user_id, state)
+            self.mark_dirty(user_id)
+        return Cart(id=state['cart_id'], user_id=user_id, **self.summary(state))
+
+    def badge(self, user_id):
+        state = cache.get(self.state_key(user_id))
+        return self.summary(state) if state is not None else get_badge(user_id)
+
+    def mark_dirty(self, user_id):
+        # gọi trong khoá của user: chỉ ghi log lần đầu giỏ chuyển sang dirty.
+        # Ghi log trước rồi mới đặt cờ: worker chết giữa 2 bước thì chỉ thừa 1 dòng log, không mất giỏ
+        if cache.get(self.flag_key(user_id)) is None:
+            self.append_log([user_id])
+            cache.set(self.flag_key(user_id), 1, None)
+
+    def append_log(self, user_ids):
+        cache.add(self.seq_key, 0, None)
+        for user_id in user_ids:
+            cache.set(self.log_key(cache.incr(self.seq_key)), user_id, None)
+
+    def log_range(self):
+        return cache.get(self.head_key) or 0, cache.get(self.seq_key) or 0
+
+    def dirty_users(self, head=None, seq=None):
+        if head is None:
+            head, seq = self.log_range()
+        users = set(cache.get_many([self.log_key(n) for n in range(head + 1, seq + 1)]).values())
+        flags = cache.get_many([self.flag_key(user_id) for user_id in users])
+        return sorted(user_id for user_id in users if self.flag_key(user_id) in flags)
+
+    def flush_dirty(self):
+        # flush_carts: ghi mọi giỏ dirty trong log rồi cắt log; giỏ ghi lỗi/đang bận được ghi lại vào cuối log.
+        # Trả về số giỏ đã ghi
+        head, seq = self.log_range()
+        flushed = 0
+        for user_id in self.dirty_users(head, seq):
+            try:
+                self.flush(user_id)
+                flushed += 1
+            except CartBusy:
+                pass  # request của user đang giữ khoá, và request đó sẽ flush
+        with self.locked('dirty-log'):
+            head = cache.get(self.head_key) or 0
+            if head >= seq:
+                return flushed  # flush_carts khác đã cắt
+            self.append_log(self.dirty_users(head, seq))
+            cache.set(self.head_key, seq, None)
+            cache.delete_many([self.log_key(n) for n in range(head + 1, seq + 1)])
+        return flushed
+
+    def flush(self, user_id):
+        with self.locked(user_id):
+            state = cache.get(self.state_key(user_id))
+            if state is None or not state['dirty']:
+                return
+            with transaction.atomic():
+                # giá món có thể đã đổi từ lúc thêm vào giỏ: tính lại thành tiền theo giá hiện tại (1 câu SQL)
+                prices = dict(Food.objects.filter(id__in=state['items']).values_list('id', 'price'))
+                for food_id in [f for f in state['items'] if f not in prices]:
+                    del state['items'][food_id]  # món đã bị xoá
+                for food_id, item in state['items'].items():
+                    item[2] = item[1] * prices[food_id]
+
+                cart, _ = Cart.objects.select_for_update().get_or_create(user_id=user_id)
+                restaurants = {item[0] for item in state['items'].values()}
+                SubCart.objects.filter(cart=cart).exclude(restaurant_id__in=restaurants).delete()
+                existing = set(SubCart.objects.filter(cart=cart).values_list('restaurant_id', flat=True))
+                SubCart.objects.bulk_create([SubCart(cart=cart, restaurant_id=r) for r in restaurants - existing])
+                # MySQL không trả id sau bulk_create -> đọc lại
+                sub_carts = dict(SubCart.objects.filter(cart=cart).values_list('restaurant_id', 'id'))
+
+                items = {item.food_id: item for item in SubCartItem.objects.filter(sub_cart__cart=cart)}
+                SubCartItem.objects.filter(id__in=[i.id for f, i in items.items() if f not in state['items']]).delete()
+                changed, created = [], []
+                for food_id, (restaurant_id, quantity, price, note) in state['items'].items():
+                    item = items.get(food_id)
+                    if item is None:
+                        created.append(SubCartItem(restaurant_id=restaurant_id, sub_cart_id=sub_carts[restaurant_id],
+                                                   food_id=food_id, quantity=quantity, price=price, note=note))
+                    elif (item.quantity, item.price, item.note) != (quantity, price, note):
+                        item.quantity, item.price, item.note = quantity, price, note
+                        changed.append(item)
+                SubCartItem.objects.bulk_update(changed, ['quantity', 'price', 'note'])
+                SubCartItem.objects.bulk_create(created)
+                refresh_totals(cart, forget=False)
+
+            state['cart_id'] = cart.id
+            state['dirty'] = False
+            self.save(user_id, state)
+            cache.delete(self.flag_key(user_id))
+
+    def forget(self, user_id):
+        with self.locked(user_id):
+            cache.delete(self.state_key(user_id))
+
+    def forget_clean(self, user_id):
+        # bản trong cache chưa sửa gì so với DB thì bỏ để đọc lại giá mới; bản đang sửa dở được tính lại giá khi flush
+        with self.locked(user_id):
+            state = cache.get(self.state_key(user_id))
+            if state is not None and not state['dirty']:
+                cache.delete(self.state_key(user_id))
+
+
+@lru_cache(maxsize=None)
+def get_cart_storage():
+    return import_string(getattr(settings, 'CART_STORAGE_BACKEND', 'app.carts.OrmCartStorage'))()
+
+
+@receiver(setting_changed)
+def reset_cart_storage(setting, **kwargs):
+    if setting == 'CART_STORAGE_BACKEND':
+        get_cart_storage.cache_clear()
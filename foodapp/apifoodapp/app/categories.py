@@ -0,0 +1,96 @@
+import unicodedata
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .models import Food, MainCategory, FoodMainCategory
+
+FOOD_COUNTS_TIMEOUT = 60 * 10
+CLASSIFY_BATCH_SIZE = 2000
+
+# Từ khoá thêm cho từng danh mục chính (ngoài chính tên danh mục), so khớp không dấu, không phân biệt hoa thường
+CATEGORY_KEYWORDS = {
+    'Cơm': ['com tam', 'com ga', 'com chien', 'com suon'],
+    'Bún': ['bun bo', 'bun cha', 'bun rieu', 'mi quang', 'hu tieu'],
+    'Bánh mì': ['banh mi', 'sandwich'],
+    'Trà sữa': ['tra sua', 'tra dao', 'hong tra', 'milk tea', 'tran chau'],
+    'Cà phê': ['ca phe', 'cafe', 'coffee', 'bac xiu'],
+    'Gà rán': ['ga ran', 'canh ga', 'dui ga', 'ga chien', 'fried chicken'],
+    'Ăn vặt': ['banh trang', 'xoai lac', 'khoai tay chien', 'bot chien', 'snack'],
+}
+
+
+def normalize(text):
+    # bỏ dấu tiếng Việt để "Cà phê" khớp "ca phe", "CÀ PHÊ"
+    text = unicodedata.normalize('NFD', (text or '').lower()).replace('đ', 'd')
+    return ''.join(ch for ch in text if unicodedata.category(ch) != 'Mn')
+
+
+def keyword_table():
+    # [(id danh mục, [từ khoá đã normalize])]
+    table = []
+    for category_id, name in MainCategory.objects.filter(active=True).values_list('id', 'name'):
+        keywords = {normalize(name)} | {normalize(k) for k in CATEGORY_KEYWORDS.get(name, ())}
+        table.append((category_id, sorted(keywords)))
+    return table
+
+
+def classify(name, category_name, table):
+    # Danh mục chính của món theo tên món và tên danh mục trong nhà hàng
+    text = '%s | %s' % (normalize(name), normalize(category_name))
+    return [category_id for category_id, keywords in table if any(k in text for k in keywords)]
+
+
+def classify_foods(foods=None, table=None):
+    # Gán danh mục chính cho các món (mặc định: tất cả), chỉ thêm liên kết còn thiếu. Trả về số liên kết mới.
+    table = table or keyword_table()
+    foods = (foods if foods is not None else Food.objects.all()).order_by('id')
+    created = 0
+    last_id = 0
+    while True:
+        batch = list(foods.filter(id__gt=last_id).values_list('id', 'name', 'category__name')[:CLASSIFY_BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1][0]
+        links = [FoodMainCategory(food_id=food_id, main_category_id=category_id)
+                 for food_id, name, category_name in batch for category_id in classify(name, category_name, table)]
+        created += len(FoodMainCategory.objects.bulk_create(links, ignore_conflicts=True))
+    invalidate_counts()
+    return created
+
+
+def main_category_ids(values):
+    # Nhận id hoặc tên danh mục chính (client cũ gửi tên), trả về list id
+    ids, names = [], []
+    for value in values:
+        value = str(value).strip()
+        if value.isdigit():
+            ids.append(int(value))
+        elif value:
+            names.append(normalize(value))
+    if names:
+        lookup = cache.get('categories:ids_by_name')
+        if lookup is None:
+            lookup = {normalize(name): category_id for category_id, name in MainCategory.objects.values_list('id', 'name')}
+            cache.set('categories:ids_by_name', lookup, FOOD_COUNTS_TIMEOUT)
+        ids.extend(lookup[name] for name in names if name in lookup)
+    return ids
+
+
+def main_category_q(values):
+    # Lọc món theo danh mục chính bằng bảng nối (index main_category, food), không quét tên món
+    return Q(id__in=FoodMainCategory.objects.filter(main_category_id__in=main_category_ids(values)).values('food_id'))
+
+
+def food_counts():
+    # {id danh mục: số món đang bán}, cache cho màn hình lưới danh mục
+    counts = cache.get('categories:food_counts')
+    if counts is None:
+        counts = dict(FoodMainCategory.objects.filter(food__is_available=True).values('main_category')
+                      .annotate(n=Count('food')).values_list('main_category', 'n'))
+        cache.set('categories:food_counts', counts, FOOD_COUNTS_TIMEOUT)
+    return counts
+
+
+def invalidate_counts():
+    cache.delete_many(['categories:food_counts', 'categories:ids_by_name'])
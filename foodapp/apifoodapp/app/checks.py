@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+DEBUG_APPS = ['debug_toolbar']
+DEBUG_MIDDLEWARE = ['debug_toolbar.middleware.DebugToolbarMiddleware']
+# cache dùng chung giữa các worker và không tự xoá key (Redis với maxmemory-policy noeviction hoặc volatile-*)
+SHARED_CACHE_BACKENDS = ('django.core.cache.backends.redis.RedisCache', 'django_redis.cache.RedisCache')
+
+
+@register(Tags.security)
+def check_production_settings(app_configs, **kwargs):
+    # DEBUG = True giữ lại toàn bộ câu SQL của mỗi request trong bộ nhớ (connection.queries) -> rò rỉ bộ nhớ
+    if getattr(settings, 'ENVIRONMENT', None) != 'prod':
+        return []
+
+    errors = []
+    if settings.DEBUG:
+        errors.append(Error('DEBUG đang bật trong môi trường prod', id='app.E001'))
+    for app in DEBUG_APPS:
+        if app in settings.INSTALLED_APPS:
+            errors.append(Error('%s không được cài trong môi trường prod' % app, id='app.E002'))
+    for middleware in DEBUG_MIDDLEWARE:
+        if middleware in settings.MIDDLEWARE:
+            errors.append(Error('%s không được bật trong môi trường prod' % middleware, id='app.E003'))
+    for db in settings.DATABASES.values():
+        if not db.get('CONN_MAX_AGE'):
+            errors.append(Error('Database %s chưa bật CONN_MAX_AGE trong môi trường prod' % db['NAME'],
+                                id='app.E004'))
+    # thiếu REDIS_URL thì prod.py giữ LocMem của base: mỗi worker 1 cache riêng -> throttle, snapshot,
+    # log đồng bộ chỉ mục tìm kiếm... không còn dùng chung
+    backend = settings.CACHES['default']['BACKEND']
+    if backend not in SHARED_CACHE_BACKENDS:
+        errors.append(Error('Môi trường prod cần cache Redis dùng chung, đang dùng %s' % backend,
+                            hint='Đặt biến môi trường REDIS_URL', id='app.E006'))
+    return errors
+
+
+@register()
+def check_cart_storage(app_configs, **kwargs):
+    # CacheCartStorage giữ giỏ hàng chưa ghi xuống DB trong cache: LocMem riêng từng process và tự xoá khi quá
+    # MAX_ENTRIES, Memcached tự xoá khi đầy -> giỏ hàng mất âm thầm
+    if getattr(settings, 'CART_STORAGE_BACKEND', '') != 'app.carts.CacheCartStorage':
+        return []
+    backend = settings.CACHES['default']['BACKEND']
+    if backend not in SHARED_CACHE_BACKENDS:
+        return [Error('CacheCartStorage cần cache dùng chung và không tự xoá key, đang dùng %s' % backend,
+                      hint='Cấu hình Redis (REDIS_URL) hoặc dùng app.carts.OrmCartStorage', id='app.E005')]
+    return []
@@ -0,0 +1,208 @@
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .availability import available_foods_q, local_now
+from .categories import main_category_q
+from .models import MainCategory, FoodMainCategory, ServicePeriod
+
+FACETS_TIMEOUT = 60
+MAX_RESTAURANT_FACETS = 20
+
+# (key, giá từ, giá đến) - giá đến không tính
+PRICE_BUCKETS = [
+    ('0-30000', 0, 30000),
+    ('30000-50000', 30000, 50000),
+    ('50000-100000', 50000, 100000),
+    ('100000-200000', 100000, 200000),
+    ('200000+', 200000, None),
+]
+# (key, sao từ, sao đến)
+RATING_BUCKETS = [
+    ('4.5+', 4.5, None),
+    ('4-4.5', 4, 4.5),
+    ('3-4', 3, 4),
+    ('<3', None, 3),
+]
+
+# các tham số lọc món (dùng chung cho danh sách món và chữ ký cache của facet)
+FILTER_PARAMS = ('name', 'min_price', 'max_price', 'price', 'serve_period', 'main_category', 'restaurant',
+                 'restaurant_id', 'min_rating', 'available', 'available_now')
+
+
+def range_q(field, start, end):
+    q = Q()
+    if start is not None:
+        q &= Q(**{'%s__gte' % field: start})
+    if end is not None:
+        q &= Q(**{'%s__lt' % field: end})
+    return q
+
+
+def parse_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def food_filters(params):
+    # ?name=&min_price=&max_price=&price=<bucket>&serve_period=&main_category=&restaurant=&restaurant_id=
+    # &min_rating=&available=1|0&available_now=1 ; các tham số dạng list gửi lặp lại (?price=a&price=b)
+    filters = Q()
+
+    name = params.get('name', '').strip()
+    if name:
+        filters &= Q(name__icontains=name)
+
+    # min_price / max_price dùng được riêng lẻ
+    min_price, max_price = parse_float(params.get('min_price')), parse_float(params.get('max_price'))
+    if min_price is not None:
+        filters &= Q(price__gte=min_price)
+    if max_price is not None:
+        filters &= Q(price__lte=max_price)
+
+    buckets = {key: (start, end) for key, start, end in PRICE_BUCKETS}
+    prices = [buckets[key] for key in params.getlist('price') if key in buckets]
+    if prices:
+        price_q = Q()
+        for start, end in prices:
+            price_q |= range_q('price', start, end)
+        filters &= price_q
+
+    periods = [p for p in params.getlist('serve_period') if p in ServicePeriod.values]
+    if periods:
+        filters &= Q(serve_period__in=periods)
+
+    main_categories = [c for c in params.getlist('main_category') if c.strip()]
+    if main_categories:
+        filters &= main_category_q(main_categories)
+
+    restaurant = params.get('restaurant', '').strip()  # tên nhà hàng
+    if restaurant:
+        filters &= Q(restaurant__name__icontains=restaurant)
+    restaurant_ids = [int(r) for r in params.getlist('restaurant_id') if r.isdigit()]
+    if restaurant_ids:
+        filters &= Q(restaurant_id__in=restaurant_ids)
+
+    min_rating = parse_float(params.get('min_rating'))
+    if min_rating is not None:
+        filters &= Q(star_rate__gte=min_rating)
+
+    available = params.get('available')
+    if available in ('1', 'true'):
+        filters &= Q(is_available=True)
+    elif available in ('0', 'false'):
+        filters &= Q(is_available=False)
+
+    if params.get('available_now') in ('1', 'true'):
+        filters &= available_foods_q()
+
+    return filters
+
+
+def signature(params):
+    parts = []
+    for key in FILTER_PARAMS:
+        values = sorted(v.strip().lower() for v in params.getlist(key) if v.strip())
+        if values:
+            parts.append('%s=%s' % (key, ','.join(values)))
+    if params.get('available_now') in ('1', 'true'):
+        parts.append('minute=%s' % local_now().strftime('%H%M'))  # kết quả đổi theo giờ phục vụ
+    return hashlib.md5('&'.join(parts).encode()).hexdigest()
+
+
+# facet -> tham số lọc của chính nó: đang lọc theo facet nào thì facet đó đếm như chưa lọc theo nó
+# (đã chọn giá 30-50k vẫn thấy số món ở các mức giá khác để chọn thêm)
+FACET_PARAMS = {
+    'price': 'price',
+    'rating': 'min_rating',
+    'serve_period': 'serve_period',
+    'main_category': 'main_category',
+    'restaurant': 'restaurant_id',
+    'available': 'available',
+}
+
+
+def without(params, param):
+    if param is None:
+        return params
+    params = params.copy()
+    params.pop(param, None)
+    return params
+
+
+def facet_aggregates(facet):
+    if facet == 'price':
+        return {'price_%d' % i: Count('id', filter=range_q('price', start, end))
+                for i, (_, start, end) in enumerate(PRICE_BUCKETS)}
+    if facet == 'rating':
+        return {'rating_%d' % i: Count('id', filter=range_q('star_rate', start, end))
+                for i, (_, start, end) in enumerate(RATING_BUCKETS)}
+    if facet == 'serve_period':
+        return {'period_%d' % i: Count('id', filter=Q(serve_period=period))
+                for i, period in enumerate(ServicePeriod.values)}
+    if facet == 'available':
+        return {'available': Count('id', filter=Q(is_available=True))}
+    return {}
+
+
+def facet_values(facet, rows):
+    def total(column):
+        return sum(row[column] for row in rows)
+
+    if facet == 'price':
+        return [{'value': key, 'count': total('price_%d' % i)} for i, (key, _, _) in enumerate(PRICE_BUCKETS)]
+    if facet == 'rating':
+        return [{'value': key, 'count': total('rating_%d' % i)} for i, (key, _, _) in enumerate(RATING_BUCKETS)]
+    if facet == 'serve_period':
+        return [{'value': period, 'count': total('period_%d' % i)} for i, period in enumerate(ServicePeriod.values)]
+    if facet == 'available':
+        return [{'value': True, 'count': total('available')},
+                {'value': False, 'count': total('total') - total('available')}]
+    restaurants = sorted(rows, key=lambda row: row['total'], reverse=True)[:MAX_RESTAURANT_FACETS]
+    return [{'value': row['restaurant'], 'name': row['restaurant__name'], 'count': row['total']}
+            for row in restaurants]
+
+
+def compute_facets(queryset, params):
+    # Các facet không bị lọc theo chính nó: 1 câu SQL GROUP BY nhà hàng, mỗi facet là vài cột
+    # COUNT(... FILTER/CASE ...), cộng dồn trong Python. Mỗi facet đang được lọc thêm 1 câu như vậy với bộ lọc của nó bỏ ra.
+    # Danh mục chính: 1 câu GROUP BY main_category trên bảng nối FoodMainCategory
+    active = {facet for facet, param in FACET_PARAMS.items() if any(v.strip() for v in params.getlist(param))}
+    groups = {None: []}  # tham số bỏ ra -> các facet đếm chung 1 câu
+    for facet, param in FACET_PARAMS.items():
+        if facet != 'main_category':
+            groups.setdefault(param if facet in active else None, []).append(facet)
+
+    facets = {}
+    for skipped, names in groups.items():
+        aggregates = {'total': Count('id')}
+        for facet in names:
+            aggregates.update(facet_aggregates(facet))
+        rows = list(queryset.filter(food_filters(without(params, skipped))).order_by()
+                    .values('restaurant', 'restaurant__name').annotate(**aggregates))
+        if skipped is None:
+            facets['count'] = sum(row['total'] for row in rows)
+        for facet in names:
+            facets[facet] = facet_values(facet, rows)
+
+    category_names = dict(MainCategory.objects.filter(active=True).values_list('id', 'name'))
+    skipped = 'main_category' if 'main_category' in active else None
+    foods = queryset.filter(food_filters(without(params, skipped))).order_by().values('id')
+    counts = dict(FoodMainCategory.objects.filter(food__in=foods, main_category_id__in=list(category_names))
+                  .order_by().values('main_category').annotate(count=Count('food_id'))
+                  .values_list('main_category', 'count'))
+    facets['main_category'] = [{'value': category_id, 'name': name, 'count': counts.get(category_id, 0)}
+                               for category_id, name in category_names.items()]
+    return {facet: facets[facet] for facet in ('count', *FACET_PARAMS)}
+
+
+def get_facets(queryset, params):
+    key = 'facets:food:%s' % signature(params)
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(queryset, params)
+        cache.set(key, facets, FACETS_TIMEOUT)
+    return facets
@@ -0,0 +1,188 @@
+import logging
+import math
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .media import image_urls
+from .models import Restaurant, Food, Menu, FeedItem, FeedKind, FeedJob, FeedJobAction
+
+logger = logging.getLogger('app.feed')
+
+FEED_MAX_ITEMS = 500  # số dòng tối đa giữ lại trong timeline mỗi user
+FEED_PAGE_SIZE = 20
+FEED_MAX_PAGE_SIZE = 50
+FANOUT_BATCH_SIZE = 1000
+TRIM_SLACK = 50  # cho vượt FEED_MAX_ITEMS chừng này dòng rồi mới xoá 1 lượt
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+POPULAR_RADIUS_KM = 5
+POPULAR_LIMIT = 10
+POPULAR_TIMEOUT = 60 * 10
+POPULAR_EVERY = 4  # trang đầu: chèn 1 món phổ biến sau mỗi 4 dòng timeline
+
+FOOD_FIELDS = ('id', 'name', 'price', 'image', 'restaurant', 'restaurant__name', 'is_available', 'serve_period',
+               'star_rate')
+
+
+def publish(restaurant, obj):
+    # Món/menu mới: chỉ thêm 1 FeedJob (cùng transaction với món), worker process_feed ghi vào timeline người theo dõi
+    kind = FeedKind.MENU if isinstance(obj, Menu) else FeedKind.FOOD
+    FeedJob.objects.create(action=FeedJobAction.PUBLISH, restaurant_id=restaurant.id, kind=kind, object_id=obj.id)
+
+
+def unpublish(kind, object_id):
+    # Món/menu bị xoá: worker xoá các dòng timeline trỏ tới nó
+    FeedJob.objects.create(action=FeedJobAction.REMOVE, kind=kind, object_id=object_id)
+
+
+def fan_out(job):
+    # Ghi theo lô follower tăng dần theo user_id, mỗi lô 1 transaction cùng với last_user_id của job:
+    # worker chết giữa chừng thì lần sau chạy tiếp từ lô chưa ghi, không ghi trùng
+    followers = Restaurant.followers.through.objects.filter(restaurant_id=job.restaurant_id).order_by('user_id')
+    while True:
+        user_ids = list(followers.filter(user_id__gt=job.last_user_id)
+                        .values_list('user_id', flat=True)[:FANOUT_BATCH_SIZE])
+        if not user_ids:
+            return
+        with transaction.atomic():
+            FeedItem.objects.bulk_create([FeedItem(user_id=user_id, restaurant_id=job.restaurant_id, kind=job.kind,
+                                                   object_id=job.object_id) for user_id in user_ids])
+            trim_timelines(user_ids)
+            job.last_user_id = user_ids[-1]
+            job.save(update_fields=['last_user_id'])
+
+
+def trim_timelines(user_ids, max_items=FEED_MAX_ITEMS):
+    # Giữ tối đa max_items dòng mỗi user. 1 câu GROUP BY tìm user vượt quá max_items + TRIM_SLACK rồi mới xoá,
+    # nên mỗi user chỉ bị xoá 1 lần sau mỗi TRIM_SLACK dòng mới
+    over = FeedItem.objects.filter(user_id__in=user_ids).values('user_id').annotate(c=Count('id')) \
+        .filter(c__gt=max_items + TRIM_SLACK).values_list('user_id', flat=True)
+    for user_id in list(over):
+        cutoff = FeedItem.objects.filter(user_id=user_id).order_by('-id') \
+            .values_list('id', flat=True)[max_items:max_items + 1]
+        FeedItem.objects.filter(user_id=user_id, id__lte=cutoff[0]).delete()
+
+
+def run_job(job):
+    if job.action == FeedJobAction.PUBLISH:
+        fan_out(job)
+    else:
+        FeedItem.objects.filter(kind=job.kind, object_id=job.object_id).delete()
+    job.delete()
+
+
+def claim_jobs(limit):
+    # SKIP LOCKED để nhiều worker chạy song song không nhận trùng; job nhận quá CLAIM_TIMEOUT (worker chết) được nhận lại
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(FeedJob.objects.select_for_update(skip_locked=True)
+                    .filter(Q(claimed_date__isnull=True) | Q(claimed_date__lt=now - CLAIM_TIMEOUT))
+                    .order_by('id')[:limit])
+        FeedJob.objects.filter(id__in=[job.id for job in jobs]).update(claimed_date=now)
+    return jobs
+
+
+def process_feed_jobs(limit=20):
+    done = failed = 0
+    for job in claim_jobs(limit):
+        try:
+            run_job(job)
+            done += 1
+        except Exception:
+            logger.exception('Feed job %s thất bại', job)
+            failed += 1  # nhận lại sau CLAIM_TIMEOUT
+    return done, failed
+
+
+def remove_restaurant_items(user_ids, restaurant_ids):
+    # Bỏ theo dõi thì bỏ luôn các dòng của nhà hàng đó khỏi timeline
+    FeedItem.objects.filter(user_id__in=user_ids, restaurant_id__in=restaurant_ids).delete()
+
+
+def food_row(row):
+    return {
+        'id': row['id'],
+        'name': row['name'],
+        'price': row['price'],
+        'image': image_urls(row['image']),
+        'restaurant': {'id': row['restaurant'], 'name': row['restaurant__name']},
+        'is_available': row['is_available'],
+        'serve_period': row['serve_period'],
+        'star_rate': row['star_rate'],
+    }
+
+
+def timeline_page(user_id, cursor=None, limit=FEED_PAGE_SIZE):
+    # Trả về (dòng timeline, has_more); món/menu của cả trang được lấy bằng 1 câu SQL mỗi loại
+    items = FeedItem.objects.filter(user_id=user_id).order_by('-id')
+    if cursor:
+        items = items.filter(id__lt=cursor)
+    items = list(items.values('id', 'kind', 'object_id', 'created_date')[:limit + 1])
+    has_more = len(items) > limit
+    items = items[:limit]
+
+    ids = {FeedKind.FOOD: set(), FeedKind.MENU: set()}
+    for item in items:
+        ids[item['kind']].add(item['object_id'])
+
+    foods = {row['id']: food_row(row) for row in Food.objects.filter(id__in=ids[FeedKind.FOOD]).values(*FOOD_FIELDS)}
+    menus = {row['id']: {'id': row['id'], 'name': row['name'], 'description': row['description'],
+                         'serve_period': row['serve_period'],
+                         'restaurant': {'id': row['restaurant'], 'name': row['restaurant__name']}}
+             for row in Menu.objects.filter(id__in=ids[FeedKind.MENU], active=True)
+             .values('id', 'name', 'description', 'serve_period', 'restaurant', 'restaurant__name')}
+    objects = {FeedKind.FOOD: foods, FeedKind.MENU: menus}
+
+    results = []
+    for item in items:
+        obj = objects[item['kind']].get(item['object_id'])
+        if obj is None:  # món/menu đã bị xoá hoặc ẩn
+            continue
+        results.append({'id': item['id'], 'type': item['kind'], 'created_date': item['created_date'], 'item': obj})
+    return results, has_more, (items[-1]['id'] if items else cursor)
+
+
+def bounding_box(lat, lng, radius_km):
+    dlat = radius_km / 111.0
+    dlng = radius_km / (111.0 * max(math.cos(math.radians(lat)), 0.01))
+    return lat - dlat, lat + dlat, lng - dlng, lng + dlng
+
+
+def popular_nearby(lat, lng, limit=POPULAR_LIMIT):
+    # Món bán chạy (điểm popularity) của các nhà hàng trong bán kính ~5km, cache theo ô lưới ~1km
+    key = 'feed:popular:%.2f:%.2f' % (lat, lng)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, POPULAR_RADIUS_KM)
+    foods = Food.objects.filter(
+        is_available=True, popularity__gt=0, restaurant__active=True,
+        restaurant__latitude__range=(min_lat, max_lat), restaurant__longitude__range=(min_lng, max_lng),
+    ).order_by('-popularity').values(*FOOD_FIELDS)[:limit]
+    result = [food_row(row) for row in foods]
+    cache.set(key, result, POPULAR_TIMEOUT)
+    return result
+
+
+def merge(timeline, popular, every=POPULAR_EVERY):
+    # Chèn món phổ biến vào giữa các dòng timeline, bỏ món đã có trong timeline
+    seen = {row['item']['id'] for row in timeline if row['type'] == FeedKind.FOOD}
+    popular = [{'id': None, 'type': 'popular', 'created_date': None, 'item': food}
+               for food in popular if food['id'] not in seen]
+    if not timeline:
+        return popular
+
+    merged = []
+    for i, row in enumerate(timeline, 1):
+        merged.append(row)
+        if i % every == 0 and popular:
+            merged.append(popular.pop(0))
+    if len(timeline) < every:
+        # timeline quá ngắn thì nối các món phổ biến còn lại vào cuối
+        merged.extend(popular)
+    return merged
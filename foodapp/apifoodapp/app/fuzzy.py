@@ -0,0 +1,182 @@
+import heapq
+import itertools
+import threading
+from collections import defaultdict
+
+from .categories import normalize
+from .models import Food, Restaurant
+from .search_index import SyncedIndex, search_log
+
+# Tìm kiếm gần đúng (gõ sai, thiếu dấu): chỉ mục trong RAM của mỗi worker, đồng bộ từng dòng qua log thay đổi
+# chung như app/autocomplete.py (app/search_index.py).
+# "com tam" khớp "Cơm tấm", "piza" khớp "Pizza", "bun bo hue" khớp "Bún bò Huế đặc biệt".
+# 2 tầng: trigram trên tập từ vựng (nhỏ, vài nghìn từ) để sửa chính tả từng từ,
+# rồi giao các tập tên chứa từ đã sửa (set.intersection chạy trong C) nên không phải duyệt từng tên
+MIN_WORD_SCORE = 0.3  # độ giống tối thiểu giữa 1 từ khoá và 1 từ trong tên
+MIN_SCORE = 0.5  # điểm trung bình tối thiểu trên các từ khoá
+PREFIX_SCORE = 0.75  # từ khoá là tiền tố của từ ("com ta" đang gõ dở)
+MAX_ALTERNATIVES = 5  # số từ gần giống nhất giữ lại cho mỗi từ khoá
+MAX_QUERY_WORDS = 6
+MAX_RESULTS = 500
+
+
+def trigrams(word):
+    # như pg_trgm: thêm 2 dấu cách đầu, 1 dấu cách cuối
+    word = '  %s ' % word
+    return frozenset(word[i:i + 3] for i in range(len(word) - 2))
+
+
+def similarity(a, b):
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+class TrigramIndex:
+    def __init__(self):
+        self.words = {}  # từ -> trigram của từ
+        self.gram_words = defaultdict(set)  # trigram -> các từ chứa nó
+        self.names = {}  # nid -> ((kind, tên đã normalize), item ids); tên trùng (nhiều quán bán "Cơm tấm") lưu 1 lần
+        self.name_ids = {}
+        self.item_names = {}
+        self.word_names = {'food': defaultdict(set), 'restaurant': defaultdict(set)}  # kind -> từ -> nid
+        self.next_id = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def build(cls, rows=None):
+        # rows: [(kind, id, tên)], mặc định đọc món đang bán + nhà hàng đang hoạt động
+        index = cls()
+        if rows is None:
+            rows = itertools.chain(
+                (('food', f_id, name) for f_id, name in
+                 Food.objects.filter(is_available=True).values_list('id', 'name').iterator(chunk_size=5000)),
+                (('restaurant', r_id, name) for r_id, name in
+                 Restaurant.objects.filter(active=True).values_list('id', 'name')))
+        normalized = {}
+        for kind, item_id, name in rows:
+            if name not in normalized:
+                normalized[name] = ' '.join(normalize(name).split())
+            index.add(kind, item_id, normalized[name])
+        return index
+
+    def add(self, kind, item_id, text):
+        key = (kind, text)
+        nid = self.name_ids.get(key)
+        if nid is None:
+            nid = self.next_id
+            self.next_id += 1
+            self.names[nid] = (key, set())
+            self.name_ids[key] = nid
+            for word in set(text.split()):
+                if word not in self.words:
+                    self.words[word] = trigrams(word)
+                    for gram in self.words[word]:
+                        self.gram_words[gram].add(word)
+                self.word_names[kind][word].add(nid)
+        self.names[nid][1].add(item_id)
+        self.item_names[(kind, item_id)] = nid
+
+    def remove(self, kind, item_id):
+        nid = self.item_names.pop((kind, item_id), None)
+        if nid is None:
+            return
+        key, ids = self.names[nid]
+        ids.discard(item_id)
+        if not ids:
+            del self.names[nid]
+            del self.name_ids[key]
+            for word in set(key[1].split()):
+                names = self.word_names[kind][word]
+                names.discard(nid)
+                if not names:
+                    del self.word_names[kind][word]
+                    self.prune(word)
+
+    def prune(self, word):
+        # bỏ từ không còn tên nào dùng khỏi từ vựng để từ vựng không phình mãi khi tên món bị sửa/xoá
+        if any(word in postings for postings in self.word_names.values()):
+            return
+        for gram in self.words.pop(word):
+            words = self.gram_words[gram]
+            words.discard(word)
+            if not words:
+                del self.gram_words[gram]
+
+    def put(self, kind, item_id, name):
+        with self.lock:
+            self.remove(kind, item_id)
+            self.add(kind, item_id, ' '.join(normalize(name).split()))
+
+    def discard(self, kind, item_id):
+        with self.lock:
+            self.remove(kind, item_id)
+
+    def alternatives(self, word, kind):
+        # các từ trong từ vựng gần giống word nhất: [(điểm, từ)]
+        grams = trigrams(word)
+        candidates = set()
+        for gram in grams:
+            candidates.update(self.gram_words.get(gram, ()))
+        scored = []
+        for candidate in candidates:
+            if not self.word_names[kind].get(candidate):
+                continue
+            score = similarity(grams, self.words[candidate])
+            if candidate.startswith(word):
+                score = max(score, PREFIX_SCORE)
+            if score >= MIN_WORD_SCORE:
+                scored.append((score, candidate))
+        return heapq.nlargest(MAX_ALTERNATIVES, scored)
+
+    def search(self, text, kind, limit=MAX_RESULTS):
+        # Trả về [(item id, điểm)] theo điểm giảm dần; điểm = trung bình độ giống của từng từ khoá.
+        # Duyệt các tổ hợp từ đã sửa theo điểm giảm dần, giao tập tên của tổ hợp, đủ limit thì dừng
+        words = list(dict.fromkeys(normalize(text).split()))[:MAX_QUERY_WORDS]
+        if not words:
+            return []
+        with self.lock:
+            options = [self.alternatives(word, kind) for word in words]
+            options = [o for o in options if o]
+            if not options:
+                return []
+            combos = sorted(itertools.product(*options), key=lambda c: -sum(score for score, _ in c))
+
+            postings = self.word_names[kind]
+            results, seen = [], set()
+            for combo in combos:
+                score = sum(s for s, _ in combo) / len(words)
+                if score < MIN_SCORE or len(results) >= limit:
+                    break
+                sets = sorted((postings[word] for _, word in combo), key=len)
+                matched = sets[0].intersection(*sets[1:])
+                matched.difference_update(seen)
+                score = round(score, 3)
+                # chỉ lấy đủ số còn thiếu, không sort cả tập (từ phổ biến như "com" khớp hàng chục nghìn tên)
+                for nid in heapq.nsmallest(limit - len(results), matched):
+                    seen.add(nid)
+                    results.extend((item_id, score) for item_id in sorted(self.names[nid][1]))
+        return results[:limit]
+
+
+def apply_change(index, change):
+    if change['kind'] not in ('food', 'restaurant'):
+        return
+    if change['visible']:
+        index.put(change['kind'], change['id'], change['name'])
+    else:
+        index.discard(change['kind'], change['id'])
+
+
+_synced = SyncedIndex(search_log, TrigramIndex.build, apply_change)
+
+
+def get_index():
+    return _synced.get()
+
+
+def search_foods(text, limit=MAX_RESULTS):
+    return get_index().search(text, 'food', limit)
+
+
+def search_restaurants(text, limit=MAX_RESULTS):
+    return get_index().search(text, 'restaurant', limit)
@@ -0,0 +1,99 @@
+import random
+import statistics
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from app import autocomplete, fuzzy
+
+# Tên món giả lập: <món> <kiểu> <topping> [<số>] -> nhiều tên trùng/gần giống nhau như dữ liệu thật
+DISHES = ['Cơm tấm', 'Cơm gà', 'Bún bò Huế', 'Bún chả', 'Phở bò', 'Phở gà', 'Bánh mì', 'Hủ tiếu', 'Mì Quảng',
+          'Pizza', 'Gà rán', 'Trà sữa', 'Cà phê sữa', 'Bánh xèo', 'Bánh cuốn', 'Lẩu thái', 'Xôi gà', 'Cháo lòng']
+STYLES = ['đặc biệt', 'thập cẩm', 'truyền thống', 'cay', 'size L', 'size M', 'nhà làm', 'Sài Gòn', 'Hà Nội']
+TOPPINGS = ['sườn', 'trứng', 'chả', 'trân châu', 'phô mai', 'xúc xích', 'bò viên', 'hải sản', 'nấm', 'thịt nướng']
+# từ khoá người dùng gõ: thiếu dấu, sai chính tả, thiếu chữ
+QUERIES = ['com tam', 'piza', 'bun bo hue', 'pho bo', 'tra sua tran chau', 'banh mi cha', 'ga ran cay', 'hu tiu',
+           'ca phe', 'lau thai hai san', 'xoi ga', 'banh xeo', 'mi quang', 'chao long']
+
+
+class Command(BaseCommand):
+    help = ('Đo chi phí 2 chỉ mục tìm kiếm trong RAM của mỗi worker (gợi ý + tìm gần đúng) với dữ liệu giả lập: '
+            'thời gian build lại toàn bộ, bộ nhớ, độ trễ áp dụng 1 thay đổi từ log và độ trễ tìm (không cần DB)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--foods', type=int, default=500000, help='Số món giả lập')
+        parser.add_argument('--restaurants', type=int, default=20000, help='Số nhà hàng giả lập')
+        parser.add_argument('--queries', type=int, default=2000, help='Số lần tìm')
+        parser.add_argument('--changes', type=int, default=2000, help='Số thay đổi (sửa tên/ẩn món) áp dụng từ log')
+        parser.add_argument('--budget-ms', type=float, default=50, help='Ngân sách p95 (ms)')
+        parser.add_argument('--skip-memory', action='store_true', help='Bỏ qua đo bộ nhớ (tracemalloc làm build chậm)')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        rows = []
+        for i in range(options['foods']):
+            name = '%s %s %s' % (rnd.choice(DISHES), rnd.choice(STYLES), rnd.choice(TOPPINGS))
+            if rnd.random() < 0.5:
+                name += ' %d' % rnd.randint(1, 500)
+            rows.append(('food', i, name))
+        for i in range(options['restaurants']):
+            rows.append(('restaurant', i, 'Quán %s %d' % (rnd.choice(DISHES), i)))
+
+        prefix_rows = [(kind, item_id, name, rnd.random() * 100) for kind, item_id, name in rows]
+
+        # build lại toàn bộ: chỉ chạy khi worker khởi động hoặc log thay đổi không đọc tiếp được (thread nền)
+        start = time.perf_counter()
+        index = fuzzy.TrigramIndex.build(rows)
+        build = time.perf_counter() - start
+        start = time.perf_counter()
+        prefix_index = autocomplete.PrefixIndex.build(prefix_rows)
+        prefix_build = time.perf_counter() - start
+        self.stdout.write('build: %d món, %d tên khác nhau, %d từ; trigram %.1fs, tiền tố %.1fs' % (
+            options['foods'], len(index.names), len(index.words), build, prefix_build))
+
+        if not options['skip_memory']:
+            # mỗi worker giữ 1 bản của cả 2 chỉ mục
+            tracemalloc.start()
+            built = [fuzzy.TrigramIndex.build(rows)]
+            trigram_memory = tracemalloc.get_traced_memory()[0]
+            built.append(autocomplete.PrefixIndex.build(prefix_rows))
+            prefix_memory = tracemalloc.get_traced_memory()[0] - trigram_memory
+            tracemalloc.stop()
+            del built
+            self.stdout.write('bộ nhớ mỗi worker: trigram %.0fMB, tiền tố %.0fMB' % (
+                trigram_memory / 2 ** 20, prefix_memory / 2 ** 20))
+
+        # áp dụng thay đổi từ log: đổi tên hoặc ẩn món ngẫu nhiên trên cả 2 chỉ mục
+        timings = []
+        for _ in range(options['changes']):
+            food_id = rnd.randrange(options['foods'])
+            change = {'kind': 'food', 'id': food_id, 'weight': 1, 'visible': rnd.random() < 0.8,
+                      'name': '%s %s %d' % (rnd.choice(DISHES), rnd.choice(TOPPINGS), rnd.randint(1, 10 ** 6))}
+            start = time.perf_counter()
+            fuzzy.apply_change(index, change)
+            autocomplete.apply_change(prefix_index, change)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        self.stdout.write('áp dụng 1 thay đổi: p50 %.3fms, p95 %.3fms, max %.2fms; từ vựng còn %d từ' % (
+            statistics.median(timings), timings[int(len(timings) * 0.95) - 1], timings[-1], len(index.words)))
+
+        latencies, hits = [], []
+        for _ in range(options['queries']):
+            query = rnd.choice(QUERIES)
+            start = time.perf_counter()
+            results = index.search(query, 'food')
+            index.search(query, 'restaurant')
+            latencies.append((time.perf_counter() - start) * 1000)
+            hits.append(len(results))
+
+        latencies.sort()
+        p50 = statistics.median(latencies)
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        self.stdout.write('search: p50 %.2fms, p95 %.2fms, max %.2fms, trung bình %d kết quả' % (
+            p50, p95, latencies[-1], statistics.mean(hits)))
+        if p95 > options['budget_ms']:
+            self.stdout.write(self.style.ERROR('Vượt ngân sách %.0fms' % options['budget_ms']))
+        else:
+            self.stdout.write(self.style.SUCCESS('Trong ngân sách %.0fms' % options['budget_ms']))
@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from app.models import Food, Restaurant, Order, Review
+from app.renderers import FastJSONRenderer
+from app.serializers import FoodSerializers, RestaurantSerializer, OrderSerializer, ReviewSerializer, \
+    FoodValuesSerializer, RestaurantValuesSerializer, OrderValuesSerializer, ReviewValuesSerializer
+
+# tên -> (queryset giống endpoint danh sách, serializer cũ, serializer values())
+TARGETS = {
+    'foods': (lambda: Food.objects.order_by('id'), FoodSerializers, FoodValuesSerializer),
+    'restaurants': (lambda: Restaurant.objects.order_by('id'), RestaurantSerializer, RestaurantValuesSerializer),
+    'orders': (lambda: Order.objects.order_by('-id'), OrderSerializer, OrderValuesSerializer),
+    'reviews': (lambda: Review.objects.order_by('-id'), ReviewSerializer, ReviewValuesSerializer),
+}
+
+
+class Command(BaseCommand):
+    help = 'Đo throughput (dòng/giây) của serializer + renderer cho các trang danh sách: ModelSerializer vs values()'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=500, help='Số dòng mỗi lần serialize')
+        parser.add_argument('--repeat', type=int, default=5, help='Số lần lặp, lấy lần nhanh nhất')
+        parser.add_argument('--targets', nargs='*', choices=list(TARGETS), help='Mặc định: tất cả')
+
+    def measure(self, repeat, rows, run):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            count = run()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return count / best if best else 0
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        json_renderer, fast_renderer = JSONRenderer(), FastJSONRenderer()
+
+        self.stdout.write('%-12s %8s %16s %16s %8s' % ('target', 'rows', 'model rows/s', 'values rows/s', 'x'))
+        for name in options['targets'] or TARGETS:
+            get_queryset, serializer_class, values_class = TARGETS[name]
+            count = get_queryset()[:rows].count()
+            if not count:
+                raise CommandError('Không có dữ liệu %s, chạy `python manage.py seed_data` trước' % name)
+
+            # thời gian đo gồm cả SQL, như khi endpoint thật chạy
+            def model_path():
+                data = serializer_class(get_queryset()[:rows], many=True).data
+                json_renderer.render(data)
+                return len(data)
+
+            def values_path():
+                reader = values_class()
+                data = reader.serialize(reader.values(get_queryset()[:rows]))
+                fast_renderer.render(data)
+                return len(data)
+
+            before = self.measure(repeat, rows, model_path)
+            after = self.measure(repeat, rows, values_path)
+            self.stdout.write('%-12s %8d %16.0f %16.0f %7.1fx' % (name, count, before, after,
+                                                                 after / before if before else 0))
@@ -0,0 +1,184 @@
+import contextlib
+import io
+import json
+import os
+import random
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from app import availability
+from app.models import User, Restaurant, Food, MainCategory, Cart
+from app.paginators import RestaurantPagination
+from .seed_data import SEED_PREFIX
+
+SEARCH_TERMS = ['cơm', 'phở', 'trà sữa', 'bún', 'pizza', 'gà']
+
+
+def percentile(values, p):
+    # nearest-rank percentile trên danh sách đã sort
+    if not values:
+        return 0
+    k = max(0, min(len(values) - 1, int(round(p / 100.0 * len(values) + 0.5)) - 1))
+    return values[k]
+
+
+class Command(BaseCommand):
+    help = 'Đo hiệu năng các luồng chính (search, add-to-cart, checkout, lịch sử đơn, báo cáo) trên dữ liệu seed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50, help='Số request đo cho mỗi endpoint')
+        parser.add_argument('--warmup', type=int, default=5, help='Số request chạy trước, không tính vào kết quả')
+        parser.add_argument('--flows', nargs='*', help='Chỉ chạy các flow này (mặc định: tất cả)')
+        parser.add_argument('--output', help='File JSON lưu kết quả (mặc định bench-<thời gian>.json)')
+        parser.add_argument('--compare', help='File JSON của lần chạy trước để so sánh')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def setup(self, seed):
+        self.rnd = random.Random(seed)
+        self.customer = User.objects.filter(username__startswith='%suser' % SEED_PREFIX,
+                                            my_addresses__isnull=False).order_by('id').first()
+        self.admin = User.objects.filter(username='%sadmin' % SEED_PREFIX).first()
+        if not self.customer or not self.admin:
+            raise CommandError('Chưa có dữ liệu, chạy `python manage.py seed_data` trước')
+
+        self.address = self.customer.my_addresses.first()
+        self.restaurant_ids = list(Restaurant.objects.values_list('id', flat=True)[:200])
+        self.restaurant_pages = max(1, min(5, len(self.restaurant_ids) // RestaurantPagination.page_size))
+        self.food_ids = self.servable_food_ids()
+        self.main_categories = list(MainCategory.objects.values_list('name', flat=True))
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+        self.admin_client = APIClient()
+        self.admin_client.force_login(self.admin)
+
+    def servable_food_ids(self, limit=2000):
+        # add-to-cart từ chối món ngoài giờ phục vụ -> chỉ lấy món đang phục vụ, cùng quy tắc với API
+        food_ids = []
+        restaurant_ids = Food.objects.filter(is_available=True).order_by('restaurant_id') \
+            .values_list('restaurant_id', flat=True).distinct()
+        for restaurant_id in restaurant_ids:
+            food_ids.extend(sorted(availability.available_ids(restaurant_id)[0]))
+            if len(food_ids) >= limit:
+                break
+        if not food_ids:
+            raise CommandError('Không có món nào đang phục vụ lúc này')
+        return food_ids[:limit]
+
+    # mỗi flow trả về (client, method, path, data); phần chuẩn bị trong flow không được tính giờ
+    def flows(self):
+        rnd = self.rnd
+        return {
+            'search': lambda: (self.client, 'get', '/search-food/', {'name': rnd.choice(SEARCH_TERMS)}),
+            'food-list': lambda: (self.client, 'get', '/foods/', {'main_category': rnd.choice(self.main_categories)}),
+            'restaurant-list': lambda: (self.client, 'get', '/restaurants/',
+                                        {'page': rnd.randint(1, self.restaurant_pages)}),
+            'restaurant-foods': lambda: (self.client, 'get',
+                                         '/restaurants/%d/foods/' % rnd.choice(self.restaurant_ids), {}),
+            'add-to-cart': lambda: (self.client, 'post', '/api/add-to-cart',
+                                    {'food_id': rnd.choice(self.food_ids), 'quantity': 1}),
+            'my-cart': lambda: (self.client, 'get', '/carts/my-cart/', {}),
+            'checkout': self.checkout,
+            'order-history': lambda: (self.client, 'get', '/order/', {}),
+            'food-report': lambda: (self.client, 'get',
+                                    '/restaurants/%d/food_report/' % rnd.choice(self.restaurant_ids), {}),
+            'admin-report': lambda: (self.admin_client, 'get', '/admin/reports/', {'report_type': 'year'}),
+        }
+
+    def checkout(self):
+        # chuẩn bị 1 sub cart mới (không tính giờ) rồi đo request đặt hàng
+        for attempt in range(2):
+            food_id = self.rnd.choice(self.food_ids)
+            with contextlib.redirect_stdout(io.StringIO()):
+                response = self.client.post('/api/add-to-cart', {'food_id': food_id, 'quantity': 1}, format='json')
+            if response.status_code == 200:
+                break
+            # benchmark chạy qua mốc giờ phục vụ: lấy lại danh sách món rồi thử lại 1 lần
+            self.food_ids = self.servable_food_ids()
+        else:
+            raise CommandError('Không thêm được món vào giỏ để checkout: %s' % response.content.decode())
+        cart = Cart.objects.get(user=self.customer)
+        sub_cart = cart.sub_carts.get(restaurant__foods__id=food_id)
+        return self.client, 'post', '/order/', {
+            'sub_cart_id': sub_cart.id, 'address_id': self.address.id, 'shipping_fee': 15000,
+            'total_price': sub_cart.total_price + 15000, 'payment': 'cash'}
+
+    def run_flow(self, flow, iterations, warmup):
+        timings, queries, sizes, errors = [], [], [], 0
+
+        for i in range(warmup + iterations):
+            client, method, path, data = flow()
+            kwargs = {'format': 'json'} if method == 'post' else {}
+
+            # các view còn print debug -> không in ra output benchmark
+            with CaptureQueriesContext(connection) as ctx, contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                response = getattr(client, method)(path, data, **kwargs)
+                elapsed = time.perf_counter() - start
+
+            if i < warmup:
+                continue
+            if response.status_code >= 400:
+                errors += 1
+            timings.append(elapsed * 1000)
+            queries.append(len(ctx.captured_queries))
+            sizes.append(len(response.content))
+
+        timings.sort()
+        total = sum(timings) / 1000
+        return {
+            'requests': iterations,
+            'errors': errors,
+            'throughput_rps': round(iterations / total, 2) if total else 0,
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'max_ms': round(timings[-1], 2) if timings else 0,
+            'queries_avg': round(sum(queries) / len(queries), 1) if queries else 0,
+            'queries_max': max(queries) if queries else 0,
+            'bytes_avg': int(sum(sizes) / len(sizes)) if sizes else 0,
+        }
+
+    def handle(self, *args, **options):
+        self.setup(options['seed'])
+        flows = self.flows()
+        names = options['flows'] or list(flows)
+        unknown = set(names) - set(flows)
+        if unknown:
+            raise CommandError('Flow không tồn tại: %s (có: %s)' % (', '.join(unknown), ', '.join(flows)))
+
+        results = {}
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for name in names:
+                results[name] = self.run_flow(flows[name], options['iterations'], options['warmup'])
+
+        previous = {}
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                previous = json.load(f)['results']
+
+        self.stdout.write('%-18s %8s %9s %9s %9s %8s %9s %6s' % (
+            'endpoint', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'queries', 'bytes', 'errors'))
+        for name, r in results.items():
+            line = '%-18s %8.1f %9.2f %9.2f %9.2f %8.1f %9d %6d' % (
+                name, r['throughput_rps'], r['p50_ms'], r['p95_ms'], r['p99_ms'], r['queries_avg'], r['bytes_avg'],
+                r['errors'])
+            if name in previous and previous[name]['p50_ms']:
+                line += '   p50 %+.0f%%' % ((r['p50_ms'] / previous[name]['p50_ms'] - 1) * 100)
+            self.stdout.write(line)
+
+        output = options['output'] or 'bench-%s.json' % datetime.now().strftime('%Y%m%d-%H%M%S')
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump({
+                'created': datetime.now().isoformat(),
+                'database': connection.vendor,
+                'iterations': options['iterations'],
+                'data': {'restaurants': Restaurant.objects.count(), 'foods': Food.objects.count()},
+                'results': results,
+            }, f, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS('Đã lưu kết quả vào %s' % os.path.abspath(output)))
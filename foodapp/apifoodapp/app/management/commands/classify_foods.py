@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from app.categories import classify_foods, invalidate_counts
+from app.models import FoodMainCategory
+
+
+class Command(BaseCommand):
+    help = 'Gán danh mục chính cho món ăn theo từ khoá trong tên món / danh mục của nhà hàng'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Xoá toàn bộ liên kết cũ rồi phân loại lại')
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            deleted, _ = FoodMainCategory.objects.all().delete()
+            invalidate_counts()
+            self.stdout.write('Đã xoá %d liên kết cũ' % deleted)
+
+        created = classify_foods()
+        self.stdout.write(self.style.SUCCESS('Đã thêm %d liên kết món ăn - danh mục chính' % created))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from app import popularity
+
+
+class Command(BaseCommand):
+    help = 'Giảm điểm bán chạy của món ăn/nhà hàng theo thời gian (chạy định kỳ, vd mỗi giờ bằng cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=1, help='Số giờ đã trôi qua kể từ lần chạy trước')
+        parser.add_argument('--rebuild', action='store_true', help='Tính lại toàn bộ điểm từ OrderDetail')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            popularity.rebuild()
+            self.stdout.write(self.style.SUCCESS('Đã tính lại điểm bán chạy'))
+            return
+
+        popularity.decay(options['hours'])
+        self.stdout.write(self.style.SUCCESS('Đã giảm điểm bán chạy (hệ số %.4f)'
+                                             % popularity.decay_factor(options['hours'])))
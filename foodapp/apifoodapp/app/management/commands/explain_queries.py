@@ -0,0 +1,90 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from app.models import Cart, Food, Order, Review, SubCart, SubCartItem, ACTIVE_ORDER_STATUSES, OrderStatus
+
+
+def first_id(model):
+    return model.objects.order_by('id').values_list('id', flat=True).first() or 1
+
+
+class Command(BaseCommand):
+    help = 'Chạy EXPLAIN trên các truy vấn của những endpoint chính, báo lỗi nếu có truy vấn quét toàn bảng'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plan', action='store_true', help='In ra toàn bộ query plan')
+
+    def endpoint_queries(self):
+        # Lấy id mẫu từ DB đã seed để plan sát với dữ liệu thật
+        user_id = Order.objects.values_list('user_id', flat=True).first() or 1
+        restaurant_id = Food.objects.values_list('restaurant_id', flat=True).first() or 1
+        food_id = first_id(Food)
+        cart_id = first_id(Cart)
+        sub_cart_id = first_id(SubCart)
+        since = timezone.now() - timedelta(days=30)
+
+        return [
+            ('order list (OrderViewSet.list)',
+             Order.objects.filter(user_id=user_id, delivery_status=OrderStatus.PENDING).order_by('-id')),
+            ('order queue snapshot (RestaurantViewSet.get_order_queue)',
+             Order.objects.filter(restaurant_id=restaurant_id, delivery_status__in=ACTIVE_ORDER_STATUSES)
+             .order_by('updated_date', 'id')),
+            ('order queue delta (RestaurantViewSet.get_order_queue)',
+             Order.objects.filter(restaurant_id=restaurant_id, updated_date__gt=since).order_by('updated_date', 'id')),
+            ('restaurant orders by date (reports)',
+             Order.objects.filter(restaurant_id=restaurant_id, order_date__gte=since)),
+            ('restaurant reviews (ReviewViewSet.list)',
+             Review.objects.filter(restaurant_id=restaurant_id).order_by('-id')),
+            ('food reviews (ReviewViewSet.list)',
+             Review.objects.filter(food_id=food_id).order_by('-id')),
+            ('restaurant foods (RestaurantFoodsView)',
+             Food.objects.filter(restaurant_id=restaurant_id, is_available=True)),
+            ('my cart (CartViewSet.get_my_cart)',
+             Cart.objects.filter(user_id=user_id)),
+            ('sub cart (AddItemToCart)',
+             SubCart.objects.filter(cart_id=cart_id, restaurant_id=restaurant_id)),
+            ('sub cart item (AddItemToCart)',
+             SubCartItem.objects.filter(sub_cart_id=sub_cart_id, food_id=food_id)),
+        ]
+
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        vendor = connection.vendor
+
+        with connection.cursor() as cursor:
+            if vendor == 'mysql':
+                cursor.execute('EXPLAIN ' + sql, params)
+                columns = [c[0] for c in cursor.description]
+                rows = [dict(zip(columns, r)) for r in cursor.fetchall()]
+                plan = ['%(table)s type=%(type)s key=%(key)s rows=%(rows)s' % r for r in rows]
+                full_scans = [r['table'] for r in rows if r['type'] == 'ALL']
+            elif vendor == 'sqlite':
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                plan = [r[-1] for r in cursor.fetchall()]
+                full_scans = [p for p in plan if p.startswith('SCAN ') and ' INDEX ' not in p]
+            else:
+                raise CommandError('Chưa hỗ trợ EXPLAIN cho database %s' % vendor)
+
+        return plan, full_scans
+
+    def handle(self, *args, **options):
+        failed = []
+
+        for name, queryset in self.endpoint_queries():
+            plan, full_scans = self.explain(queryset)
+
+            if full_scans:
+                failed.append(name)
+                self.stdout.write(self.style.ERROR('FULL SCAN  %s: %s' % (name, ', '.join(full_scans))))
+            else:
+                self.stdout.write(self.style.SUCCESS('OK         %s' % name))
+
+            if options['verbose_plan'] or full_scans:
+                for line in plan:
+                    self.stdout.write('    %s' % line)
+
+        if failed:
+            raise CommandError('%d truy vấn quét toàn bảng: %s' % (len(failed), ', '.join(failed)))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from app.carts import get_cart_storage
+
+
+class Command(BaseCommand):
+    help = 'Ghi các giỏ hàng đang nằm trong cache xuống DB (CART_STORAGE_BACKEND = CacheCartStorage), chạy định kỳ'
+
+    def handle(self, *args, **options):
+        storage = get_cart_storage()
+        if not hasattr(storage, 'flush_dirty'):
+            self.stdout.write('CART_STORAGE_BACKEND ghi thẳng DB, không có gì để flush')
+            return
+
+        flushed = storage.flush_dirty()
+        self.stdout.write(self.style.SUCCESS('Đã ghi %d giỏ hàng xuống DB' % flushed))
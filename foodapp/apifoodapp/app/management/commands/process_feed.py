@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.feed import process_feed_jobs
+
+
+class Command(BaseCommand):
+    help = 'Worker ghi món/menu mới vào timeline người theo dõi và xoá món/menu đã bị xoá khỏi timeline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Chạy liên tục thay vì xử lý 1 lượt')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Số giây nghỉ khi không còn việc chờ')
+        parser.add_argument('--batch', type=int, default=20)
+
+    def handle(self, *args, **options):
+        while True:
+            done, failed = process_feed_jobs(options['batch'])
+            if done or failed:
+                self.stdout.write('Đã xử lý %d việc, %d lỗi' % (done, failed))
+
+            if not options['loop']:
+                break
+            if not done and not failed:
+                time.sleep(options['sleep'])
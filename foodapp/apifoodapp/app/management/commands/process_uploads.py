@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.uploads import process_pending_uploads
+
+
+class Command(BaseCommand):
+    help = 'Worker đẩy ảnh đã lưu tạm lên storage (resize, upload) rồi gán URL thật vào bản ghi'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Chạy liên tục thay vì xử lý 1 lượt')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Số giây nghỉ khi không còn ảnh chờ')
+        parser.add_argument('--batch', type=int, default=50)
+
+    def handle(self, *args, **options):
+        while True:
+            done, failed = process_pending_uploads(options['batch'])
+            if done or failed:
+                self.stdout.write('Đã xử lý %d ảnh, %d lỗi' % (done, failed))
+
+            if not options['loop']:
+                break
+            if not done and not failed:
+                time.sleep(options['sleep'])
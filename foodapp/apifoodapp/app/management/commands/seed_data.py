@@ -0,0 +1,233 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from app.availability import PERIOD_HOURS
+from app.signals import update_followers_count
+from app import popularity, reorder
+from app.categories import classify_foods
+from app.models import User, Role, MainCategory, RestaurantCategory, Restaurant, Food, Menu, Cart, SubCart, \
+    SubCartItem, MyAddress, Order, OrderDetail, Payment, Review, OrderStatus, PaymentMethod, ServicePeriod
+
+SEED_PREFIX = 'seed_'
+
+MAIN_CATEGORIES = ['Cơm', 'Phở', 'Bún', 'Bánh mì', 'Trà sữa', 'Cà phê', 'Pizza', 'Gà rán', 'Lẩu', 'Ăn vặt']
+
+FOOD_WORDS = {
+    'Cơm': ['Cơm tấm sườn', 'Cơm gà xối mỡ', 'Cơm chiên dương châu', 'Cơm sườn bì chả'],
+    'Phở': ['Phở bò tái', 'Phở gà', 'Phở bò viên', 'Phở đặc biệt'],
+    'Bún': ['Bún bò Huế', 'Bún chả', 'Bún riêu', 'Bún thịt nướng'],
+    'Bánh mì': ['Bánh mì thịt', 'Bánh mì ốp la', 'Bánh mì chả cá', 'Bánh mì xíu mại'],
+    'Trà sữa': ['Trà sữa trân châu', 'Trà sữa matcha', 'Trà đào cam sả', 'Hồng trà sữa'],
+    'Cà phê': ['Cà phê sữa đá', 'Bạc xỉu', 'Cà phê muối', 'Cà phê đen'],
+    'Pizza': ['Pizza hải sản', 'Pizza phô mai', 'Pizza bò băm', 'Pizza gà nướng'],
+    'Gà rán': ['Gà rán giòn', 'Cánh gà chiên nước mắm', 'Gà sốt cay', 'Đùi gà rán'],
+    'Lẩu': ['Lẩu thái', 'Lẩu gà lá é', 'Lẩu bò', 'Lẩu nấm'],
+    'Ăn vặt': ['Bánh tráng trộn', 'Xoài lắc', 'Khoai tây chiên', 'Bột chiên'],
+}
+
+DISTRICTS = ['Quận 1', 'Quận 3', 'Quận 5', 'Quận 7', 'Quận 10', 'Bình Thạnh', 'Phú Nhuận', 'Gò Vấp', 'Thủ Đức']
+
+def around_hcm(rnd):
+    # toạ độ ngẫu nhiên quanh trung tâm TP.HCM (~15km)
+    return 10.7769 + rnd.uniform(-0.15, 0.15), 106.7009 + rnd.uniform(-0.15, 0.15)
+
+
+class Command(BaseCommand):
+    help = 'Sinh dữ liệu giả lập (users, nhà hàng, món ăn, menu, giỏ hàng, đơn hàng, đánh giá) để đo hiệu năng'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0, help='Hệ số nhân cho tất cả số lượng mặc định')
+        parser.add_argument('--users', type=int, help='Số khách hàng (mặc định 200 * scale)')
+        parser.add_argument('--restaurants', type=int, help='Số nhà hàng (mặc định 20 * scale)')
+        parser.add_argument('--foods', type=int, default=30, help='Số món ăn mỗi nhà hàng')
+        parser.add_argument('--orders', type=int, help='Số đơn hàng (mặc định 2000 * scale)')
+        parser.add_argument('--reviews', type=int, help='Số đánh giá (mặc định 1000 * scale)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=42, help='Random seed, cùng seed cho cùng dữ liệu')
+        parser.add_argument('--clear', action='store_true', help='Xoá dữ liệu đã seed trước đó')
+
+    def bulk_create(self, model, objs):
+        created = model.objects.bulk_create(objs, batch_size=self.batch_size)
+        # MySQL không trả về id sau bulk_create -> lấy lại các id vừa insert (command chạy một mình trên DB)
+        if created and created[0].pk is None:
+            ids = list(model.objects.order_by('-id').values_list('id', flat=True)[:len(created)])
+            for obj, pk in zip(created, reversed(ids)):
+                obj.pk = pk
+        return created
+
+    def clear(self):
+        users = User.objects.filter(username__startswith=SEED_PREFIX)
+        Order.objects.filter(user__in=users).delete()
+        Menu.objects.filter(restaurant__owner__in=users).delete()
+        deleted, _ = users.delete()
+        self.stdout.write('Đã xoá %d bản ghi seed cũ' % deleted)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        scale = options['scale']
+        self.batch_size = options['batch_size']
+
+        n_users = options['users'] or max(1, int(200 * scale))
+        n_restaurants = options['restaurants'] or max(1, int(20 * scale))
+        n_orders = options['orders'] if options['orders'] is not None else int(2000 * scale)
+        n_reviews = options['reviews'] if options['reviews'] is not None else int(1000 * scale)
+
+        if options['clear']:
+            self.clear()
+        elif User.objects.filter(username__startswith=SEED_PREFIX).exists():
+            raise CommandError('Đã có dữ liệu seed, chạy lại với --clear')
+
+        with transaction.atomic():
+            password = make_password('123456')  # hash 1 lần, dùng chung cho mọi user seed
+
+            for name in MAIN_CATEGORIES:
+                MainCategory.objects.get_or_create(name=name)
+
+            customers = self.bulk_create(User, [
+                User(username='%suser%d' % (SEED_PREFIX, i), email='%suser%d@foodapp.test' % (SEED_PREFIX, i),
+                     password=password, role=Role.CUSTOMER, phone_number='09%08d' % i)
+                for i in range(n_users)
+            ])
+            owners = self.bulk_create(User, [
+                User(username='%sowner%d' % (SEED_PREFIX, i), email='%sowner%d@foodapp.test' % (SEED_PREFIX, i),
+                     password=password, role=Role.RES_USER, is_restaurant_user=True)
+                for i in range(n_restaurants)
+            ])
+            if not User.objects.filter(username='%sadmin' % SEED_PREFIX).exists():
+                User.objects.create(username='%sadmin' % SEED_PREFIX, email='%sadmin@foodapp.test' % SEED_PREFIX,
+                                    password=password, role=Role.ADMIN, is_staff=True, is_superuser=True)
+
+            restaurants = []
+            for i, owner in enumerate(owners):
+                lat, lng = around_hcm(rnd)
+                restaurants.append(Restaurant(
+                    name='%s %s %d' % (rnd.choice(MAIN_CATEGORIES), rnd.choice(DISTRICTS), i), owner=owner,
+                    address='%d Đường số %d, %s' % (rnd.randint(1, 500), rnd.randint(1, 50), rnd.choice(DISTRICTS)),
+                    latitude=lat, longitude=lng, star_rate=round(rnd.uniform(3, 5), 1),
+                    confirmation_status=True, shipping_fee=rnd.choice([10000, 15000, 20000, 25000])))
+            restaurants = self.bulk_create(Restaurant, restaurants)
+
+            categories = self.bulk_create(RestaurantCategory, [
+                RestaurantCategory(name=name, restaurant=r)
+                for r in restaurants for name in rnd.sample(MAIN_CATEGORIES, 3)
+            ])
+            categories_by_restaurant = {}
+            for c in categories:
+                categories_by_restaurant.setdefault(c.restaurant_id, []).append(c)
+
+            foods = []
+            for r in restaurants:
+                for j in range(options['foods']):
+                    category = rnd.choice(categories_by_restaurant[r.id])
+                    period = rnd.choice(ServicePeriod.values)
+                    start, end = PERIOD_HOURS[period]
+                    foods.append(Food(
+                        name='%s %d' % (rnd.choice(FOOD_WORDS[category.name]), j), restaurant=r, category=category,
+                        price=rnd.randrange(20000, 200000, 5000), description='Món ngon của %s' % r.name,
+                        is_available=rnd.random() > 0.1, serve_period=period,
+                        available_start=start, available_end=end, star_rate=round(rnd.uniform(3, 5), 1)))
+            foods = self.bulk_create(Food, foods)
+            foods_by_restaurant = {}
+            for f in foods:
+                foods_by_restaurant.setdefault(f.restaurant_id, []).append(f)
+
+            menus = self.bulk_create(Menu, [
+                Menu(restaurant=r, name='Menu %s %d' % (period, k), serve_period=period)
+                for r in restaurants for k, period in enumerate(rnd.sample(ServicePeriod.values, 2))
+            ])
+            Menu.food.through.objects.bulk_create([
+                Menu.food.through(menu_id=m.id, food_id=f.id)
+                for m in menus for f in rnd.sample(foods_by_restaurant[m.restaurant_id],
+                                                   min(8, len(foods_by_restaurant[m.restaurant_id])))
+            ], batch_size=self.batch_size)
+
+            Restaurant.followers.through.objects.bulk_create([
+                Restaurant.followers.through(restaurant_id=r.id, user_id=u.id)
+                for u in customers for r in rnd.sample(restaurants, min(5, len(restaurants)))
+            ], batch_size=self.batch_size)
+            # bulk_create không gửi m2m_changed
+            update_followers_count([r.id for r in restaurants])
+
+            addresses = []
+            for u in customers:
+                lat, lng = around_hcm(rnd)
+                addresses.append(MyAddress(user=u, receiver_name=u.username, phone_number='0900000000',
+                                           address='%d %s' % (rnd.randint(1, 999), rnd.choice(DISTRICTS)),
+                                           latitude=lat, longitude=lng))
+            addresses = self.bulk_create(MyAddress, addresses)
+            address_by_user = {a.user_id: a for a in addresses}
+
+            # 1/3 khách hàng đang có giỏ hàng
+            carts = self.bulk_create(Cart, [Cart(user=u) for u in customers[::3]])
+            sub_carts = []
+            for cart in carts:
+                for r in rnd.sample(restaurants, min(2, len(restaurants))):
+                    sub_carts.append(SubCart(cart=cart, restaurant=r))
+            sub_carts = self.bulk_create(SubCart, sub_carts)
+            items = []
+            for sc in sub_carts:
+                for f in rnd.sample(foods_by_restaurant[sc.restaurant_id], min(3, len(foods_by_restaurant[sc.restaurant_id]))):
+                    quantity = rnd.randint(1, 3)
+                    items.append(SubCartItem(restaurant_id=sc.restaurant_id, food=f, sub_cart=sc, quantity=quantity,
+                                             price=f.price * quantity, note=''))
+                    sc.total_price += f.price * quantity
+                    sc.total_quantity += quantity
+            self.bulk_create(SubCartItem, items)
+            SubCart.objects.bulk_update(sub_carts, ['total_price', 'total_quantity'], batch_size=self.batch_size)
+            for cart in carts:
+                cart.items_number = min(2, len(restaurants))
+            Cart.objects.bulk_update(carts, ['items_number'], batch_size=self.batch_size)
+
+            now = timezone.now()
+            orders, order_lines = [], []
+            for _ in range(n_orders):
+                u = rnd.choice(customers)
+                r = rnd.choice(restaurants)
+                lines = [(f, rnd.randint(1, 3)) for f in rnd.sample(foods_by_restaurant[r.id],
+                                                                   min(rnd.randint(1, 4), len(foods_by_restaurant[r.id])))]
+                total = sum(f.price * q for f, q in lines) + r.shipping_fee
+                orders.append(Order(user=u, restaurant=r, shipping_address=address_by_user[u.id],
+                                    shipping_fee=r.shipping_fee, total=total,
+                                    delivery_status=rnd.choices(OrderStatus.values, weights=[1, 1, 1, 6, 1])[0]))
+                order_lines.append(lines)
+            orders = self.bulk_create(Order, orders)
+
+            # order_date là auto_now_add -> rải lại trong 180 ngày gần nhất bằng bulk_update
+            for o in orders:
+                o.order_date = now - timedelta(days=rnd.randint(0, 180), minutes=rnd.randint(0, 1440))
+            Order.objects.bulk_update(orders, ['order_date'], batch_size=self.batch_size)
+
+            details = self.bulk_create(OrderDetail, [
+                OrderDetail(order=o, food=f, quantity=q, sub_total=f.price * q, evaluated=False)
+                for o, lines in zip(orders, order_lines) for f, q in lines
+            ])
+            Payment.objects.bulk_create([
+                Payment(order=o, user_id=o.user_id, amount=o.total,
+                        payment_method=rnd.choice(PaymentMethod.values), is_successful=True)
+                for o in orders
+            ], batch_size=self.batch_size)
+
+            reviewed = rnd.sample(details, min(n_reviews, len(details)))
+            orders_by_id = {o.id: o for o in orders}
+            self.bulk_create(Review, [
+                Review(user_id=orders_by_id[d.order_id].user_id, food=d.food, restaurant_id=d.food.restaurant_id,
+                       stars=rnd.randint(1, 5), customer_comment=rnd.choice(['Ngon', 'Tạm được', 'Giao nhanh', '']))
+                for d in reviewed
+            ])
+            for d in reviewed:
+                d.evaluated = True
+            OrderDetail.objects.bulk_update(reviewed, ['evaluated'], batch_size=self.batch_size)
+
+        # danh mục chính, điểm bán chạy và tần suất đặt món theo dữ liệu vừa seed (bulk_create không gửi signal)
+        classify_foods(Food.objects.filter(restaurant__in=restaurants))
+        popularity.rebuild()
+        reorder.rebuild_food_stats([u.id for u in customers])
+
+        self.stdout.write(self.style.SUCCESS(
+            'Đã seed %d khách hàng, %d nhà hàng, %d món ăn, %d menu, %d giỏ hàng, %d đơn hàng, %d đánh giá'
+            % (len(customers), len(restaurants), len(foods), len(menus), len(carts), len(orders), len(reviewed))))
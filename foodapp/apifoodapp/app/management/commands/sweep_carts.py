@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app.carts import get_cart_storage, sweep_abandoned
+
+
+class Command(BaseCommand):
+    help = 'Xoá giỏ hàng bị bỏ quên (không thay đổi sau N ngày) theo từng lô, chạy định kỳ bằng cron'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Giỏ không thay đổi quá số ngày này sẽ bị xoá')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Số giỏ xoá trong mỗi transaction')
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['days'])
+        # giỏ còn thay đổi trong cache chưa ghi xuống DB (CacheCartStorage) thì chưa phải giỏ bỏ quên
+        storage = get_cart_storage()
+        skip = storage.dirty_users() if hasattr(storage, 'dirty_users') else ()
+
+        deleted = sweep_abandoned(before, options['batch_size'], skip)
+        self.stdout.write(self.style.SUCCESS('Đã xoá %d giỏ hàng không thay đổi từ %s'
+                                             % (deleted, before.strftime('%d/%m/%Y'))))
@@ -0,0 +1,38 @@
+from functools import lru_cache
+
+from cloudinary import CloudinaryResource
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework import serializers
+
+from .storage import get_image_storage
+
+
+@lru_cache(maxsize=20000)
+def _build_image_urls(value):
+    return get_image_storage().urls(value)
+
+
+def image_urls(image):
+    # image: CloudinaryResource (từ model) hoặc chuỗi lưu trong DB (từ .values())
+    if not image:
+        return None
+    if isinstance(image, CloudinaryResource):
+        image = image.get_prep_value()
+        if not image:
+            return None
+    # trả về bản copy để nơi gọi có sửa dict cũng không làm hỏng cache
+    return dict(_build_image_urls(str(image)))
+
+
+@receiver(setting_changed)
+def reset_image_storage(setting, **kwargs):
+    if setting in ('IMAGE_STORAGE_BACKEND', 'IMAGE_PLACEHOLDER', 'LOCAL_IMAGE_ROOT', 'LOCAL_IMAGE_URL'):
+        get_image_storage.cache_clear()
+        _build_image_urls.cache_clear()
+
+
+class ImageVariantsField(serializers.ImageField):
+    # Ghi: upload file như ImageField. Đọc: {'url', 'list', 'card', 'detail'}
+    def to_representation(self, value):
+        return image_urls(value)
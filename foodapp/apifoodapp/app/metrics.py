@@ -0,0 +1,101 @@
+import bisect
+import threading
+
+# Bucket (giống Prometheus) cho từng loại số đo
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+METRICS = {
+    'request_duration_seconds': ('Thời gian xử lý request', SECONDS_BUCKETS),
+    'db_queries': ('Số câu SQL mỗi request', QUERY_BUCKETS),
+    'db_duration_seconds': ('Thời gian chạy SQL mỗi request', SECONDS_BUCKETS),
+    'serializer_duration_seconds': ('Thời gian serializer mỗi request', SECONDS_BUCKETS),
+    'response_size_bytes': ('Kích thước response', BYTES_BUCKETS),
+}
+
+# Bộ đếm (Prometheus counter)
+COUNTERS = {
+    'search_cache_hits': 'Số lần search-food/ trả từ cache',
+    'search_cache_misses': 'Số lần search-food/ phải query DB',
+    'search_cache_evictions': 'Số kết quả bị đẩy ra khi cache đầy',
+    'search_cache_invalidations': 'Số kết quả bị xoá do món/nhà hàng thay đổi',
+}
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # phần tử cuối là +Inf
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}  # (metric, method, endpoint, status) -> Histogram
+        self._counters = dict.fromkeys(COUNTERS, 0)
+
+    def observe(self, method, endpoint, status, values):
+        with self._lock:
+            for metric, value in values.items():
+                key = (metric, method, endpoint, status)
+                h = self._histograms.get(key)
+                if h is None:
+                    h = self._histograms[key] = Histogram(METRICS[metric][1])
+                h.observe(value)
+
+    def inc(self, counter, value=1):
+        with self._lock:
+            self._counters[counter] += value
+
+    def counter(self, counter):
+        return self._counters[counter]
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters = dict.fromkeys(COUNTERS, 0)
+
+    def render(self, prefix='foodapp'):
+        # Xuất theo Prometheus text exposition format 0.0.4
+        with self._lock:
+            items = sorted(self._histograms.items())
+            snapshot = [(key, list(h.counts), h.sum, h.count, h.buckets) for key, h in items]
+            counters = sorted(self._counters.items())
+
+        lines = []
+        for counter, value in counters:
+            name = '%s_%s_total' % (prefix, counter)
+            lines.append('# HELP %s %s' % (name, COUNTERS[counter]))
+            lines.append('# TYPE %s counter' % name)
+            lines.append('%s %d' % (name, value))
+
+        current = None
+        for (metric, method, endpoint, status), counts, total, count, buckets in snapshot:
+            name = '%s_%s' % (prefix, metric)
+            if metric != current:
+                lines.append('# HELP %s %s' % (name, METRICS[metric][0]))
+                lines.append('# TYPE %s histogram' % name)
+                current = metric
+
+            labels = 'method="%s",endpoint="%s",status="%s"' % (method, endpoint.replace('"', '\\"'), status)
+            cumulative = 0
+            for le, c in zip(list(buckets) + ['+Inf'], counts):
+                cumulative += c
+                lines.append('%s_bucket{%s,le="%s"} %d' % (name, labels, le, cumulative))
+            lines.append('%s_sum{%s} %s' % (name, labels, repr(float(total))))
+            lines.append('%s_count{%s} %d' % (name, labels, count))
+
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,110 @@
+import logging
+import threading
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connection
+from rest_framework.serializers import Serializer, ListSerializer
+
+from .metrics import registry
+from .serializers import ValuesSerializer
+
+logger = logging.getLogger('app.slow_requests')
+
+_local = threading.local()
+_serializer_timer_installed = False
+
+MAX_CAPTURED_QUERIES = 200
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_time', 'serializer_time', 'serializer_depth', 'statements')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.statements = []
+
+    def record_query(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = perf_counter() - start
+            self.queries += 1
+            self.db_time += duration
+            if len(self.statements) < MAX_CAPTURED_QUERIES:
+                self.statements.append((duration, sql))
+
+
+def _timed(func):
+    def timed(self, *args):
+        stats = getattr(_local, 'stats', None)
+        # chỉ tính serializer ngoài cùng, serializer lồng nhau đã nằm trong thời gian của nó
+        if stats is None or stats.serializer_depth:
+            return func(self, *args)
+        stats.serializer_depth += 1
+        start = perf_counter()
+        try:
+            return func(self, *args)
+        finally:
+            stats.serializer_time += perf_counter() - start
+            stats.serializer_depth -= 1
+
+    return timed
+
+
+def install_serializer_timer():
+    global _serializer_timer_installed
+    if not _serializer_timer_installed:
+        Serializer.data = property(_timed(Serializer.data.fget))
+        ListSerializer.data = property(_timed(ListSerializer.data.fget))
+        ValuesSerializer.serialize = _timed(ValuesSerializer.serialize)
+        _serializer_timer_installed = True
+
+
+def endpoint_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else 'unmatched'
+
+
+# Ghi lại thời gian xử lý, số câu SQL, thời gian SQL, thời gian serializer và kích thước response
+# của từng endpoint vào histogram trong process (xem /metrics), log các request chậm kèm câu SQL.
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_request_ms = getattr(settings, 'SLOW_REQUEST_MS', 500)
+        install_serializer_timer()
+
+    def __call__(self, request):
+        stats = RequestStats()
+        _local.stats = stats
+        start = perf_counter()
+        try:
+            with connection.execute_wrapper(stats.record_query):
+                response = self.get_response(request)
+        finally:
+            _local.stats = None
+        duration = perf_counter() - start
+
+        endpoint = endpoint_name(request)
+        size = 0 if response.streaming else len(response.content)
+        registry.observe(request.method, endpoint, '%dxx' % (response.status_code // 100), {
+            'request_duration_seconds': duration,
+            'db_queries': stats.queries,
+            'db_duration_seconds': stats.db_time,
+            'serializer_duration_seconds': stats.serializer_time,
+            'response_size_bytes': size,
+        })
+
+        if duration * 1000 >= self.slow_request_ms:
+            slowest = sorted(stats.statements, key=lambda s: s[0], reverse=True)[:5]
+            logger.warning(
+                'Slow request %s %s (%s): %.0fms, %d queries, db %.0fms, serializer %.0fms\n%s',
+                request.method, request.path, endpoint, duration * 1000, stats.queries, stats.db_time * 1000,
+                stats.serializer_time * 1000,
+                '\n'.join('  %.1fms %s' % (d * 1000, sql) for d, sql in slowest))
+
+        return response
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.2 on 2026-10-19 16:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['restaurant', 'delivery_status', 'order_date'], name='order_res_status_date_idx'),
+        ),
+    ]
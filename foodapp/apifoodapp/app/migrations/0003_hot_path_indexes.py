@@ -0,0 +1,77 @@
+# Generated by Django 5.1.2 on 2026-10-19 16:22
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def merge_duplicate_sub_carts(apps, schema_editor):
+    # Gộp các sub cart/sub cart item trùng trước khi thêm unique constraint
+    SubCart = apps.get_model('app', 'SubCart')
+    SubCartItem = apps.get_model('app', 'SubCartItem')
+    Cart = apps.get_model('app', 'Cart')
+    touched = set()
+
+    duplicates = SubCart.objects.values('cart_id', 'restaurant_id').annotate(n=Count('id')).filter(n__gt=1)
+    for d in duplicates:
+        ids = list(SubCart.objects.filter(cart_id=d['cart_id'], restaurant_id=d['restaurant_id'])
+                   .order_by('id').values_list('id', flat=True))
+        SubCartItem.objects.filter(sub_cart_id__in=ids[1:]).update(sub_cart_id=ids[0])
+        SubCart.objects.filter(id__in=ids[1:]).delete()
+        touched.add(ids[0])
+        Cart.objects.filter(id=d['cart_id']).update(
+            items_number=SubCart.objects.filter(cart_id=d['cart_id']).count())
+
+    duplicates = SubCartItem.objects.values('sub_cart_id', 'food_id').annotate(n=Count('id')).filter(n__gt=1)
+    for d in duplicates:
+        items = list(SubCartItem.objects.filter(sub_cart_id=d['sub_cart_id'], food_id=d['food_id']).order_by('id'))
+        keep = items[0]
+        keep.quantity = sum(i.quantity for i in items)
+        keep.price = sum(i.price for i in items)
+        keep.save(update_fields=['quantity', 'price'])
+        SubCartItem.objects.filter(id__in=[i.id for i in items[1:]]).delete()
+        touched.add(d['sub_cart_id'])
+
+    for sub_cart in SubCart.objects.filter(id__in=touched):
+        totals = SubCartItem.objects.filter(sub_cart_id=sub_cart.id).aggregate(p=Sum('price'), q=Sum('quantity'))
+        sub_cart.total_price = totals['p'] or 0
+        sub_cart.total_quantity = totals['q'] or 0
+        sub_cart.save(update_fields=['total_price', 'total_quantity'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_order_queue_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='food',
+            index=models.Index(fields=['restaurant', 'is_available'], name='food_res_available_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['restaurant', 'order_date'], name='order_res_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'delivery_status'], name='order_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['restaurant', 'id'], name='review_res_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['food', 'id'], name='review_food_id_idx'),
+        ),
+        migrations.RunPython(merge_duplicate_sub_carts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='subcart',
+            constraint=models.UniqueConstraint(fields=('cart', 'restaurant'), name='unique_sub_cart_restaurant'),
+        ),
+        migrations.AddConstraint(
+            model_name='subcartitem',
+            constraint=models.UniqueConstraint(fields=('sub_cart', 'food'), name='unique_sub_cart_item_food'),
+        ),
+    ]
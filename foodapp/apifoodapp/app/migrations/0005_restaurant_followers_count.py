@@ -0,0 +1,29 @@
+# Generated by Django 5.1.2 on 2026-10-19 16:39
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_followers_count(apps, schema_editor):
+    Restaurant = apps.get_model('app', 'Restaurant')
+    through = Restaurant.followers.through
+    count = through.objects.filter(restaurant_id=OuterRef('pk')).values('restaurant_id') \
+        .annotate(c=Count('*')).values('c')
+    Restaurant.objects.update(followers_count=Coalesce(Subquery(count), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_pending_upload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_followers_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.2 on 2026-10-19 16:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_restaurant_followers_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('food', 'Food'), ('menu', 'Menu')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('created_date', models.DateTimeField(auto_now_add=True)),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.restaurant')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_items', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-id'], name='feed_user_id_idx'), models.Index(fields=['restaurant', 'user'], name='feed_res_user_idx')],
+            },
+        ),
+    ]
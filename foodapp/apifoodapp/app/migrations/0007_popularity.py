@@ -0,0 +1,31 @@
+# Generated by Django 5.1.2 on 2026-10-19 16:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_feed_item'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='food',
+            name='popularity',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='popularity',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='food',
+            index=models.Index(fields=['-popularity'], name='food_popularity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='restaurant',
+            index=models.Index(fields=['-popularity'], name='restaurant_popularity_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.2 on 2026-10-19 16:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def backfill_food_stats(apps, schema_editor):
+    OrderDetail = apps.get_model('app', 'OrderDetail')
+    UserFoodStat = apps.get_model('app', 'UserFoodStat')
+    rows = OrderDetail.objects.values('order__user', 'food').annotate(
+        order_count=Count('order', distinct=True), quantity=Sum('quantity'), last_ordered=Max('order__order_date'))
+    batch = []
+    for row in rows.iterator(chunk_size=5000):
+        batch.append(UserFoodStat(user_id=row['order__user'], food_id=row['food'], order_count=row['order_count'],
+                                  quantity=row['quantity'] or 0, last_ordered=row['last_ordered']))
+        if len(batch) >= 5000:
+            UserFoodStat.objects.bulk_create(batch)
+            batch = []
+    UserFoodStat.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_popularity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserFoodStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_count', models.IntegerField(default=0)),
+                ('quantity', models.IntegerField(default=0)),
+                ('last_ordered', models.DateTimeField(null=True)),
+                ('food', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.food')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='food_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-order_count', '-last_ordered'], name='food_stat_user_count_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'food'), name='unique_user_food_stat')],
+            },
+        ),
+        migrations.RunPython(backfill_food_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.2 on 2026-10-19 16:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_user_food_stat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FoodMainCategory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('food', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.food')),
+                ('main_category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.maincategory')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='food',
+            name='main_categories',
+            field=models.ManyToManyField(blank=True, related_name='foods', through='app.FoodMainCategory', to='app.maincategory'),
+        ),
+        migrations.AddIndex(
+            model_name='foodmaincategory',
+            index=models.Index(fields=['main_category', 'food'], name='food_main_category_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='foodmaincategory',
+            constraint=models.UniqueConstraint(fields=('food', 'main_category'), name='unique_food_main_category'),
+        ),
+    ]
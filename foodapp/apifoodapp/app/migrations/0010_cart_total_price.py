@@ -0,0 +1,40 @@
+# Generated by Django 5.1.2 on 2026-10-19 17:00
+
+from django.db import migrations, models
+from django.db.models import Count, FloatField, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_cart_totals(apps, schema_editor):
+    # items_number trước đây do client gửi lên nên có thể đã lệch, tính lại luôn
+    Cart = apps.get_model('app', 'Cart')
+    SubCart = apps.get_model('app', 'SubCart')
+    SubCartItem = apps.get_model('app', 'SubCartItem')
+
+    items = SubCartItem.objects.filter(sub_cart_id=OuterRef('pk')).values('sub_cart_id')
+    SubCart.objects.update(
+        total_price=Coalesce(Subquery(items.annotate(s=Sum('price')).values('s')), 0, output_field=FloatField()),
+        total_quantity=Coalesce(Subquery(items.annotate(s=Sum('quantity')).values('s')), 0,
+                                output_field=IntegerField()))
+
+    sub_carts = SubCart.objects.filter(cart_id=OuterRef('pk')).values('cart_id')
+    Cart.objects.update(
+        items_number=Coalesce(Subquery(sub_carts.annotate(c=Count('*')).values('c')), 0),
+        total_price=Coalesce(Subquery(sub_carts.annotate(s=Sum('total_price')).values('s')), 0,
+                             output_field=FloatField()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_food_main_category'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='total_price',
+            field=models.FloatField(default=0),
+        ),
+        migrations.RunPython(backfill_cart_totals, migrations.RunPython.noop),
+    ]
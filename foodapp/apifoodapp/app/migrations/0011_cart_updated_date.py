@@ -0,0 +1,24 @@
+# Generated by Django 5.1.2 on 2026-10-19 17:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_cart_total_price'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='updated_date',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['updated_date'], name='cart_updated_idx'),
+        ),
+    ]
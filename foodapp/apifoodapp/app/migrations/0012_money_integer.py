@@ -0,0 +1,107 @@
+# Generated by Django 5.1.2 on 2026-10-19 17:07
+
+from django.db import migrations, models, transaction
+from django.db.models import F, FloatField, Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce, Round
+
+BATCH_SIZE = 5000
+MONEY_FIELDS = {
+    'Food': ['price'],
+    'Restaurant': ['shipping_fee'],
+    'SubCartItem': ['price'],
+    'Order': ['shipping_fee', 'total'],
+    'Payment': ['amount'],
+    'OrderDetail': ['sub_total'],
+}
+
+
+def batches(model):
+    # chia theo khoảng id, mỗi lô 1 transaction ngắn: bảng đơn hàng lớn không bị khoá cả bảng trong 1 câu UPDATE
+    last_id = model.objects.aggregate(m=Max('pk'))['m'] or 0
+    for start in range(0, last_id + 1, BATCH_SIZE):
+        yield model.objects.filter(pk__gte=start, pk__lt=start + BATCH_SIZE)
+
+
+def round_money(apps, schema_editor):
+    # Làm tròn tiền về số nguyên đồng trước khi đổi kiểu cột (CAST của MySQL/SQLite/Postgres làm tròn khác nhau);
+    # chỉ ghi các dòng có phần lẻ
+    for model_name, fields in MONEY_FIELDS.items():
+        model = apps.get_model('app', model_name)
+        fractional = Q()
+        for field in fields:
+            fractional |= ~Q(**{field: Round(F(field))})
+        for rows in batches(model):
+            with transaction.atomic():
+                rows.filter(fractional).update(**{field: Round(F(field)) for field in fields})
+
+    # tổng giỏ hàng = tổng các dòng đã làm tròn
+    SubCart = apps.get_model('app', 'SubCart')
+    Cart = apps.get_model('app', 'Cart')
+    items = apps.get_model('app', 'SubCartItem').objects.filter(sub_cart_id=OuterRef('pk')).values('sub_cart_id')
+    sub_carts = SubCart.objects.filter(cart_id=OuterRef('pk')).values('cart_id')
+    for rows in batches(SubCart):
+        with transaction.atomic():
+            rows.update(total_price=Coalesce(Subquery(items.annotate(s=Sum('price')).values('s')), 0,
+                                             output_field=FloatField()))
+    for rows in batches(Cart):
+        with transaction.atomic():
+            rows.update(total_price=Coalesce(Subquery(sub_carts.annotate(s=Sum('total_price')).values('s')), 0,
+                                             output_field=FloatField()))
+
+
+class Migration(migrations.Migration):
+    # mỗi lô của round_money tự commit
+    atomic = False
+
+    dependencies = [
+        ('app', '0011_cart_updated_date'),
+    ]
+
+    operations = [
+        migrations.RunPython(round_money, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='cart',
+            name='total_price',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='food',
+            name='price',
+            field=models.IntegerField(),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='shipping_fee',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='total',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='orderdetail',
+            name='sub_total',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='amount',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='restaurant',
+            name='shipping_fee',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='subcart',
+            name='total_price',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='subcartitem',
+            name='price',
+            field=models.IntegerField(default=0),
+        ),
+    ]
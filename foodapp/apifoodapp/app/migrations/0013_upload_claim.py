@@ -0,0 +1,22 @@
+# Generated by Django 5.1.2 on 2026-10-19 17:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_money_integer'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pendingupload',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done'), ('skipped', 'Skipped'), ('failed', 'Failed')], default='pending', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='pendingupload',
+            index=models.Index(fields=['model', 'object_id', 'field'], name='upload_target_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.2 on 2026-10-19 17:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0013_upload_claim'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('publish', 'Publish'), ('remove', 'Remove')], max_length=10)),
+                ('restaurant_id', models.BigIntegerField(null=True)),
+                ('kind', models.CharField(choices=[('food', 'Food'), ('menu', 'Menu')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('last_user_id', models.BigIntegerField(default=0)),
+                ('claimed_date', models.DateTimeField(null=True)),
+                ('created_date', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='feeditem',
+            index=models.Index(fields=['kind', 'object_id'], name='feed_object_idx'),
+        ),
+    ]
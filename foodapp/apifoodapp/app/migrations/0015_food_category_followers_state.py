@@ -0,0 +1,26 @@
+# Generated by Django 5.1.2 on 2026-10-19 17:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Đồng bộ state của 2 field đã đổi trong models.py trước đây (không đổi schema), tách khỏi migration index
+
+    dependencies = [
+        ('app', '0014_feed_job'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='food',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='app.restaurantcategory'),
+        ),
+        migrations.AlterField(
+            model_name='restaurant',
+            name='followers',
+            field=models.ManyToManyField(blank=True, related_name='following_restaurants', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.2 on 2026-10-19 17:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0015_food_category_followers_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='updated_date',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['restaurant', 'updated_date', 'id'], name='order_res_updated_idx'),
+        ),
+    ]
@@ -28,6 +28,10 @@ class OrderStatus(models.TextChoices):
     CANCEL = 'Hủy'
 
 
+# Các trạng thái đơn hàng nhà hàng còn phải xử lý (hàng đợi bếp)
+ACTIVE_ORDER_STATUSES = (OrderStatus.PENDING, OrderStatus.ACCEPT, OrderStatus.DELIVERING)
+
+
 class PaymentMethod(models.TextChoices):
     COD = 'Thanh toán tiền mặt'
     MOMO = 'Momo'
@@ -95,7 +99,14 @@ class Restaurant(models.Model):
     confirmation_status = models.BooleanField(default=False, null=True)
     image = CloudinaryField('image', null=True)
     followers = models.ManyToManyField(User, related_name='following_restaurants', blank=True)
-    shipping_fee = models.FloatField(max_length=100, null=True)
+    followers_count = models.PositiveIntegerField(default=0)  # cập nhật bởi signal m2m_changed của followers
+    shipping_fee = models.IntegerField(null=True)  # tiền lưu số nguyên đồng
+    popularity = models.FloatField(default=0)  # điểm bán chạy có suy giảm theo thời gian, xem app/popularity.py
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-popularity'], name='restaurant_popularity_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -103,7 +114,7 @@ class Restaurant(models.Model):
 
 class Food(models.Model):
     name = models.CharField(max_length=100, null=False)
-    price = models.FloatField(null=False)
+    price = models.IntegerField(null=False)  # đồng
     description = models.TextField(null=True, blank=True)
     category = models.ForeignKey(RestaurantCategory, on_delete=models.SET_NULL, null=True, blank=True)
     image = CloudinaryField('image', null=True)
@@ -113,11 +124,41 @@ class Food(models.Model):
     available_start = models.TimeField(null=True, blank=True)
     available_end = models.TimeField(null=True, blank=True)
     star_rate = models.FloatField(null=True, blank=True)
+    popularity = models.FloatField(default=0)  # điểm bán chạy có suy giảm theo thời gian, xem app/popularity.py
+    main_categories = models.ManyToManyField(MainCategory, through='FoodMainCategory', related_name='foods', blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['restaurant', 'is_available'], name='food_res_available_idx'),
+            models.Index(fields=['-popularity'], name='food_popularity_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # giữ giá lúc đọc từ DB: sửa giá thì signals.reprice_carts biết mà không phải SELECT lại trước khi lưu
+        instance = super().from_db(db, field_names, values)
+        if 'price' in field_names:
+            instance._loaded_price = instance.price
+        return instance
 
     def __str__(self):
         return self.name
 
 
+# Món ăn thuộc danh mục chính nào (gán bởi classify_foods / khi tạo món, xem app/categories.py)
+class FoodMainCategory(models.Model):
+    food = models.ForeignKey(Food, on_delete=models.CASCADE, related_name='+')
+    main_category = models.ForeignKey(MainCategory, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['food', 'main_category'], name='unique_food_main_category'),
+        ]
+        indexes = [
+            models.Index(fields=['main_category', 'food'], name='food_main_category_idx'),
+        ]
+
+
 class Comment(models.Model):
     content = models.TextField(null=True, blank=True)
     created_date = models.DateTimeField(auto_now_add=True)
@@ -142,6 +183,12 @@ class Review(models.Model):
         related_name='restaurant_review'
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['restaurant', 'id'], name='review_res_id_idx'),
+            models.Index(fields=['food', 'id'], name='review_food_id_idx'),
+        ]
+
     def __str__(self):
         return f'{self.user}: {self.stars}: {self.customer_comment}'
 
@@ -149,23 +196,41 @@ class Review(models.Model):
 class Cart(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='my_cart')
     items_number = models.IntegerField(default=0)
+    total_price = models.IntegerField(default=0)  # tổng tiền các sub cart, cập nhật bởi app/carts.py
+    updated_date = models.DateTimeField(auto_now=True)  # lần sửa giỏ gần nhất, dùng để dọn giỏ bỏ quên
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_date'], name='cart_updated_idx'),
+        ]
 
 
 class SubCart(models.Model):
     cart = models.ForeignKey(Cart, related_name='sub_carts', on_delete=models.CASCADE)
     restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='sub_carts')
-    total_price = models.FloatField(default=0)
+    total_price = models.IntegerField(default=0)
     total_quantity = models.IntegerField(default=0)
 
+    class Meta:
+        # mỗi giỏ hàng chỉ có 1 sub cart cho mỗi nhà hàng (get_or_create an toàn khi request song song)
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'restaurant'], name='unique_sub_cart_restaurant'),
+        ]
+
 
 class SubCartItem(models.Model):
     restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='sub_cart_items')
     food = models.ForeignKey(Food, on_delete=models.CASCADE, null=False, related_name='sub_cart_items')
     sub_cart = models.ForeignKey(SubCart, on_delete=models.CASCADE, related_name='sub_cart_items')
     quantity = models.IntegerField(default=1)
-    price = models.FloatField(default=0, null=False)  # tự động tính quantity * food.price
+    price = models.IntegerField(default=0, null=False)  # tự động tính quantity * food.price
     note = models.TextField()
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['sub_cart', 'food'], name='unique_sub_cart_item_food'),
+        ]
+
 
 class MyAddress(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='my_addresses')
@@ -184,11 +249,19 @@ class Order(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='my_orders')
     restaurant = models.ForeignKey(Restaurant, on_delete=models.SET_NULL, null=True, related_name='restaurant_orders')
     shipping_address = models.ForeignKey(MyAddress, on_delete=models.SET_NULL, null=True, related_name='orders')
-    shipping_fee = models.FloatField(default=0)
-    total = models.FloatField(default=0)
+    shipping_fee = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)
     delivery_status = models.CharField(max_length=20, choices=OrderStatus.choices, default=OrderStatus.PENDING)
     order_date = models.DateTimeField(auto_now_add=True, null=True)
+    updated_date = models.DateTimeField(auto_now=True)  # đổi trạng thái/sửa đơn -> hàng đợi bếp nhận lại (order_queue.py)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['restaurant', 'delivery_status', 'order_date'], name='order_res_status_date_idx'),
+            models.Index(fields=['restaurant', 'order_date'], name='order_res_date_idx'),
+            models.Index(fields=['restaurant', 'updated_date', 'id'], name='order_res_updated_idx'),
+            models.Index(fields=['user', 'delivery_status'], name='order_user_status_idx'),
+        ]
 
     def __str__(self):
         return f'{self.id}'
@@ -198,7 +271,7 @@ class Payment(models.Model):
     order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='payment_detail')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='my_payments')
     created_date = models.DateTimeField(auto_now_add=True)
-    amount = models.FloatField(default=0)
+    amount = models.IntegerField(default=0)
     payment_method = models.CharField(max_length=20, choices=PaymentMethod.choices, default=PaymentMethod.COD)
     is_successful = models.BooleanField(default=False)
 
@@ -207,7 +280,7 @@ class OrderDetail(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='order_details')
     food = models.ForeignKey(Food, on_delete=models.CASCADE, related_name='food_details')
     quantity = models.IntegerField(default=1)
-    sub_total = models.FloatField(default=0)
+    sub_total = models.IntegerField(default=0)
     evaluated = models.BooleanField(default=False)
 
     # def save(self, *args, **kwargs):
@@ -227,3 +300,93 @@ class Menu(models.Model):
 
     def __str__(self):
         return f'{self.name}'
+
+
+class UploadStatus(models.TextChoices):
+    PENDING = 'pending'
+    PROCESSING = 'processing'  # đã có worker nhận
+    DONE = 'done'
+    SKIPPED = 'skipped'  # người dùng đã upload ảnh mới hơn cho cùng field
+    FAILED = 'failed'
+
+
+# Ảnh đã lưu tạm trên đĩa, chờ worker (process_uploads) đẩy lên storage rồi gán vào bản ghi
+class PendingUpload(models.Model):
+    model = models.CharField(max_length=50)  # vd: 'app.Food'
+    object_id = models.BigIntegerField()
+    field = models.CharField(max_length=50)
+    staged_path = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=UploadStatus.choices, default=UploadStatus.PENDING)
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(null=True, blank=True)
+    created_date = models.DateTimeField(auto_now_add=True)
+    updated_date = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='upload_status_idx'),
+            models.Index(fields=['model', 'object_id', 'field'], name='upload_target_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.model}#{self.object_id}.{self.field} ({self.status})'
+
+
+class FeedKind(models.TextChoices):
+    FOOD = 'food'
+    MENU = 'menu'
+
+
+# Timeline của từng user: khi nhà hàng thêm món/menu, ghi sẵn 1 dòng cho mỗi người theo dõi (fan-out on write)
+class FeedItem(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='feed_items')
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=10, choices=FeedKind.choices)
+    object_id = models.BigIntegerField()
+    created_date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-id'], name='feed_user_id_idx'),
+            models.Index(fields=['restaurant', 'user'], name='feed_res_user_idx'),
+            models.Index(fields=['kind', 'object_id'], name='feed_object_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id}: {self.kind}#{self.object_id}'
+
+
+class FeedJobAction(models.TextChoices):
+    PUBLISH = 'publish'  # ghi món/menu mới vào timeline của người theo dõi
+    REMOVE = 'remove'  # món/menu đã bị xoá: bỏ khỏi mọi timeline
+
+
+# Việc ghi/xoá timeline chờ worker (process_feed) chạy, request chỉ thêm 1 dòng ở đây
+class FeedJob(models.Model):
+    action = models.CharField(max_length=10, choices=FeedJobAction.choices)
+    restaurant_id = models.BigIntegerField(null=True)  # không dùng FK: job xoá vẫn chạy khi nhà hàng đã bị xoá
+    kind = models.CharField(max_length=10, choices=FeedKind.choices)
+    object_id = models.BigIntegerField()
+    last_user_id = models.BigIntegerField(default=0)  # fan-out đã ghi tới follower này (chạy tiếp nếu worker chết)
+    claimed_date = models.DateTimeField(null=True)
+    created_date = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.action} {self.kind}#{self.object_id}'
+
+
+# Số lần mỗi user đã đặt từng món, cập nhật khi tạo đơn (xem app/reorder.py) để gợi ý "Đặt lại"
+class UserFoodStat(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='food_stats')
+    food = models.ForeignKey(Food, on_delete=models.CASCADE, related_name='+')
+    order_count = models.IntegerField(default=0)
+    quantity = models.IntegerField(default=0)
+    last_ordered = models.DateTimeField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'food'], name='unique_user_food_stat'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-order_count', '-last_ordered'], name='food_stat_user_count_idx'),
+        ]
@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Order
+
+# Hàng đợi bếp: tablet giữ danh sách đơn đang xử lý và chỉ kéo phần thay đổi.
+# Cursor = (updated_date, id) của đơn cuối cùng đã nhận, dạng "<micro giây epoch>:<id>".
+#  - Không có cursor: lấy toàn bộ đơn đang xử lý (ít, lọc theo index order_res_status_date_idx).
+#  - Có cursor: mọi đơn của nhà hàng đổi sau cursor theo index order_res_updated_idx (restaurant, updated_date, id);
+#    đơn còn trong các trạng thái đang xem trả trong results, đơn đã chuyển sang trạng thái khác trả id trong removed.
+# updated_date lấy lúc save (trước commit): bỏ qua các đơn sửa trong SETTLE gần nhất để transaction đang chạy dở
+# commit muộn không bị cursor vượt qua; chúng về ở lần kéo sau
+SETTLE = timedelta(seconds=2)
+
+
+def parse_cursor(value):
+    # None = không có cursor (hoặc cursor kiểu cũ là id đơn) -> lấy lại toàn bộ; ValueError nếu sai định dạng
+    if not value or ':' not in value:
+        return None
+    micros, order_id = value.split(':', 1)
+    updated = datetime(1970, 1, 1, tzinfo=dt_timezone.utc) + timedelta(microseconds=int(micros))
+    return updated, int(order_id)
+
+
+def format_cursor(updated, order_id):
+    delta = updated - datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+    return '%d:%d' % (delta // timedelta(microseconds=1), order_id)
+
+
+def queue_page(restaurant, statuses, cursor, limit):
+    # Trả về (orders, removed_ids, cursor mới, has_more)
+    settle = timezone.now() - SETTLE
+    orders = Order.objects.filter(restaurant=restaurant, updated_date__lt=settle)
+    if cursor is None:
+        orders = orders.filter(delivery_status__in=statuses)
+    else:
+        updated, order_id = cursor
+        orders = orders.filter(Q(updated_date__gt=updated) | Q(updated_date=updated, id__gt=order_id))
+    rows = list(orders.order_by('updated_date', 'id').values_list('id', 'updated_date', 'delivery_status')[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if has_more:
+        next_cursor = format_cursor(rows[-1][1], rows[-1][0])
+    else:
+        # đã đọc hết tới settle: lần sau bắt đầu từ đó
+        next_cursor = format_cursor(settle, 0)
+
+    active = [order_id for order_id, _, delivery_status in rows if delivery_status in statuses]
+    removed = [order_id for order_id, _, delivery_status in rows if delivery_status not in statuses]
+    details = Order.objects.filter(id__in=active).select_related('user', 'shipping_address') \
+        .prefetch_related('order_details__food').in_bulk()
+    return [details[order_id] for order_id in active if order_id in details], removed, next_cursor, has_more
@@ -0,0 +1,144 @@
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import search_cache
+from .models import Food, Restaurant, OrderDetail, FoodMainCategory
+
+# Điểm = tổng số lượng bán, mỗi giờ giảm theo chu kỳ bán rã (decay_popularity chạy định kỳ)
+HALF_LIFE_HOURS = getattr(settings, 'POPULARITY_HALF_LIFE_HOURS', 72)
+MIN_SCORE = 0.01  # nhỏ hơn thì đưa về 0
+TOP_K = 50
+TOP_K_TIMEOUT = 60 * 60
+AREA_CELL_DEGREES = 0.05  # ô lưới ~5km
+DECAY_BATCH_SIZE = 10000
+
+TOP_FIELDS = ('id', 'popularity', 'restaurant__latitude', 'restaurant__longitude')
+
+
+def decay_factor(hours):
+    return 0.5 ** (hours / HALF_LIFE_HOURS)
+
+
+def area_of(lat, lng):
+    if lat is None or lng is None:
+        return None
+    return '%d:%d' % (math.floor(lat / AREA_CELL_DEGREES), math.floor(lng / AREA_CELL_DEGREES))
+
+
+def area_bounds(area):
+    i, j = (int(x) for x in area.split(':'))
+    return (i * AREA_CELL_DEGREES, (i + 1) * AREA_CELL_DEGREES), (j * AREA_CELL_DEGREES, (j + 1) * AREA_CELL_DEGREES)
+
+
+# ---- top-K trong cache: mỗi khoá (danh mục, khu vực) giữ list [[food_id, điểm], ...] đã sort giảm dần ----
+
+def top_key(category_id=None, area=None):
+    version = cache.get_or_set('popularity:version', 1, None)
+    return 'popularity:top:%s:%s:%s' % (version, category_id or '-', area or '-')
+
+
+def keys_for(row, category_ids):
+    area = area_of(row['restaurant__latitude'], row['restaurant__longitude'])
+    categories = [None] + category_ids
+    areas = [None, area] if area else [None]
+    return [top_key(c, a) for c in categories for a in areas]
+
+
+def build_top(category_id=None, area=None):
+    foods = Food.objects.filter(is_available=True, restaurant__active=True, popularity__gt=0)
+    if category_id:
+        foods = foods.filter(main_categories=category_id)
+    if area:
+        lat_range, lng_range = area_bounds(area)
+        foods = foods.filter(restaurant__latitude__gte=lat_range[0], restaurant__latitude__lt=lat_range[1],
+                             restaurant__longitude__gte=lng_range[0], restaurant__longitude__lt=lng_range[1])
+    return [[row['id'], row['popularity']] for row in foods.order_by('-popularity').values('id', 'popularity')[:TOP_K]]
+
+
+def get_top(category_id=None, area=None):
+    key = top_key(category_id, area)
+    top = cache.get(key)
+    if top is None:
+        top = build_top(category_id, area)
+        cache.set(key, top, TOP_K_TIMEOUT)
+    return top
+
+
+def refresh_top(food_ids):
+    # Cập nhật điểm mới của các món vào những top-K đang có trong cache (khoá chưa có thì lần đọc sau tự build)
+    category_ids = {}
+    for food_id, category_id in FoodMainCategory.objects.filter(food_id__in=food_ids) \
+            .values_list('food_id', 'main_category_id'):
+        category_ids.setdefault(food_id, []).append(category_id)
+
+    for row in Food.objects.filter(id__in=food_ids, is_available=True).values(*TOP_FIELDS):
+        for key in keys_for(row, category_ids.get(row['id'], [])):
+            top = cache.get(key)
+            if top is None:
+                continue
+            top = [entry for entry in top if entry[0] != row['id']]
+            top.append([row['id'], row['popularity']])
+            top.sort(key=lambda entry: entry[1], reverse=True)
+            cache.set(key, top[:TOP_K], TOP_K_TIMEOUT)
+
+
+def record_order(order):
+    # Gọi trong transaction tạo đơn, sau khi đã tạo OrderDetail
+    quantities = {}
+    for food_id, quantity in OrderDetail.objects.filter(order=order).values_list('food_id', 'quantity'):
+        quantities[food_id] = quantities.get(food_id, 0) + quantity
+    if not quantities:
+        return
+
+    for food_id, quantity in quantities.items():
+        Food.objects.filter(id=food_id).update(popularity=F('popularity') + quantity)
+    Restaurant.objects.filter(id=order.restaurant_id).update(popularity=F('popularity') + sum(quantities.values()))
+
+    transaction.on_commit(lambda: refresh_top(list(quantities)))
+    search_cache.invalidate_popularity([order.restaurant_id])
+
+
+def decay(hours):
+    # Nhân toàn bộ điểm với hệ số suy giảm, chạy theo lô id để không khoá cả bảng lâu
+    factor = decay_factor(hours)
+    for model in (Food, Restaurant):
+        last_id = model.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        for start in range(0, last_id + 1, DECAY_BATCH_SIZE):
+            batch = model.objects.filter(id__gte=start, id__lt=start + DECAY_BATCH_SIZE, popularity__gt=0)
+            batch.filter(popularity__lt=MIN_SCORE / factor).update(popularity=0)
+            batch.update(popularity=F('popularity') * factor)
+    invalidate_top()
+    search_cache.invalidate_popularity()
+
+
+def rebuild():
+    # Tính lại từ đầu theo toàn bộ OrderDetail (dùng sau khi seed dữ liệu hoặc khi điểm bị lệch)
+    now = timezone.now()
+    food_scores, restaurant_scores = {}, {}
+    rows = OrderDetail.objects.values_list('food_id', 'food__restaurant_id', 'quantity', 'order__order_date')
+    for food_id, restaurant_id, quantity, order_date in rows.iterator(chunk_size=DECAY_BATCH_SIZE):
+        hours = (now - order_date).total_seconds() / 3600 if order_date else 0
+        score = quantity * decay_factor(hours)
+        food_scores[food_id] = food_scores.get(food_id, 0) + score
+        restaurant_scores[restaurant_id] = restaurant_scores.get(restaurant_id, 0) + score
+
+    with transaction.atomic():
+        for model, scores in ((Food, food_scores), (Restaurant, restaurant_scores)):
+            model.objects.filter(popularity__gt=0).update(popularity=0)
+            objs = [model(id=pk, popularity=score) for pk, score in scores.items() if score >= MIN_SCORE]
+            model.objects.bulk_update(objs, ['popularity'], batch_size=1000)
+    invalidate_top()
+    search_cache.invalidate_popularity()
+
+
+def invalidate_top():
+    # đổi version thay vì xoá từng khoá (không liệt kê được khoá trong cache)
+    try:
+        cache.incr('popularity:version')
+    except ValueError:
+        cache.set('popularity:version', 2, None)
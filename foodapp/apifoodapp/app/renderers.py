@@ -0,0 +1,19 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # không có orjson thì dùng JSONRenderer thuần Python của DRF
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    # orjson nhanh hơn json chuẩn nhiều lần, kiểu orjson không tự xử lý (Decimal, lazy str...) dùng encoder của DRF
+    encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        return orjson.dumps(data, default=self.encoder.default, option=orjson.OPT_NON_STR_KEYS)
@@ -0,0 +1,84 @@
+from django.db import transaction
+from django.db.models import F, Sum, Count, Max
+from django.utils import timezone
+
+from . import carts
+from .availability import available_ids
+from .models import Food, Cart, SubCart, SubCartItem, OrderDetail, UserFoodStat
+
+
+def record_order(order):
+    # Gọi trong transaction tạo đơn: cộng số lần đặt/số lượng vào bảng tần suất của user
+    quantities = {}
+    for food_id, quantity in OrderDetail.objects.filter(order=order).values_list('food_id', 'quantity'):
+        quantities[food_id] = quantities.get(food_id, 0) + quantity
+    if not quantities:
+        return
+
+    now = order.order_date or timezone.now()
+    UserFoodStat.objects.bulk_create([UserFoodStat(user_id=order.user_id, food_id=food_id) for food_id in quantities],
+                                     ignore_conflicts=True)
+    for food_id, quantity in quantities.items():
+        UserFoodStat.objects.filter(user_id=order.user_id, food_id=food_id).update(
+            order_count=F('order_count') + 1, quantity=F('quantity') + quantity, last_ordered=now)
+
+
+def rebuild_food_stats(user_ids=None):
+    # Tính lại bảng tần suất từ OrderDetail (dùng sau khi seed/import đơn hàng không qua API)
+    details = OrderDetail.objects.all()
+    stats = UserFoodStat.objects.all()
+    if user_ids is not None:
+        details = details.filter(order__user_id__in=user_ids)
+        stats = stats.filter(user_id__in=user_ids)
+    rows = details.values('order__user', 'food').annotate(
+        order_count=Count('order', distinct=True), quantity=Sum('quantity'), last_ordered=Max('order__order_date'))
+
+    with transaction.atomic():
+        stats.delete()
+        UserFoodStat.objects.bulk_create([
+            UserFoodStat(user_id=row['order__user'], food_id=row['food'], order_count=row['order_count'],
+                         quantity=row['quantity'] or 0, last_ordered=row['last_ordered'])
+            for row in rows.iterator(chunk_size=5000)
+        ], batch_size=5000, ignore_conflicts=True)  # record_order của đơn mới chạy song song có thể đã ghi dòng đó
+
+
+def frequent_foods(user, limit):
+    return UserFoodStat.objects.filter(user=user, food__restaurant__active=True) \
+        .order_by('-order_count', '-last_ordered').values('food', 'order_count', 'quantity', 'last_ordered')[:limit]
+
+
+def reorder(user, order):
+    # Dựng lại sub cart của nhà hàng từ đơn cũ theo giá hiện tại. Món đã xoá/ngừng bán thì bỏ qua.
+    # Trả về (sub_cart, [id món bị bỏ qua])
+    lines = {}
+    for food_id, quantity in OrderDetail.objects.filter(order=order).values_list('food_id', 'quantity'):
+        lines[food_id] = lines.get(food_id, 0) + quantity
+
+    available = available_ids(order.restaurant_id)[0]
+    prices = dict(Food.objects.filter(id__in=lines, restaurant_id=order.restaurant_id).values_list('id', 'price'))
+    skipped = [food_id for food_id in lines if food_id not in prices or food_id not in available]
+    lines = {food_id: quantity for food_id, quantity in lines.items() if food_id not in skipped}
+    if not lines:
+        return None, skipped
+
+    with transaction.atomic():
+        # khoá dòng cart như OrmCartStorage.add_item: 2 lần đặt lại / thêm món song song chạy lần lượt
+        cart, _ = Cart.objects.select_for_update().get_or_create(user=user)
+        sub_cart, _ = SubCart.objects.get_or_create(cart=cart, restaurant_id=order.restaurant_id)
+
+        existing = {item.food_id: item for item in SubCartItem.objects.select_for_update()
+                    .filter(sub_cart=sub_cart, food_id__in=lines)}
+        for food_id, item in existing.items():
+            item.quantity += lines[food_id]
+            item.price = item.quantity * prices[food_id]
+        SubCartItem.objects.bulk_update(existing.values(), ['quantity', 'price'])
+        SubCartItem.objects.bulk_create([
+            SubCartItem(restaurant_id=order.restaurant_id, sub_cart=sub_cart, food_id=food_id, quantity=quantity,
+                        price=quantity * prices[food_id], note='')
+            for food_id, quantity in lines.items() if food_id not in existing
+        ], ignore_conflicts=True)  # dòng đã được ghi ngoài khoá cart: giữ nguyên thay vì lỗi IntegrityError
+
+        carts.refresh_totals(cart, [sub_cart.id])
+        sub_cart.refresh_from_db(fields=['total_price', 'total_quantity'])
+
+    return sub_cart, skipped
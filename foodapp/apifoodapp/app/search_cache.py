@@ -0,0 +1,219 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from .availability import local_now
+from .categories import normalize
+from .fuzzy import trigrams, similarity, MIN_WORD_SCORE
+from .metrics import registry
+from .search_index import ChangeLog, SyncedIndex
+
+# Cache kết quả search-food/ trong RAM của mỗi worker: từ khoá phổ biến ("trà sữa", "phở", "cơm") không chạm DB.
+# Đầy thì bỏ 1 kết quả ít được dùng nhất trong EVICTION_SAMPLE kết quả lâu chưa dùng nhất (LRU + LFU xấp xỉ).
+# Món/nhà hàng đổi (kể cả điểm bán chạy đổi bằng UPDATE) -> 1 thay đổi vào log chung (app/search_index.py):
+# worker ghi xoá ngay, worker khác xoá khi đọc log (chậm nhất search_index.CHECK_INTERVAL giây sau commit).
+# Chỉ xoá các kết quả liên quan, tìm qua chỉ mục nhà hàng/từ khoá chứ không duyệt hết cache.
+# TTL chỉ là giới hạn cuối khi log không đọc được
+MAX_ENTRIES = 2000
+TTL = 30
+EVICTION_SAMPLE = 16
+MAX_TERM_LENGTH = 50  # từ khoá dài hơn không cache: tra chuỗi con của tên theo độ dài này
+SEARCH_PARAMS = ('name', 'min_price', 'max_price', 'main_category', 'restaurant', 'mode', 'sort', 'available_now')
+
+
+def cache_key(params):
+    # chữ ký đã chuẩn hoá: "Trà  Sữa" và "trà sữa" dùng chung 1 kết quả; chế độ fuzzy bỏ cả dấu
+    parts = []
+    for param in SEARCH_PARAMS:
+        values = sorted(' '.join(v.lower().split()) for v in params.getlist(param) if v.strip())
+        if param == 'name' and params.get('mode') == 'fuzzy':
+            values = [normalize(v) for v in values]
+        if values:
+            parts.append((param, tuple(values)))
+    if params.get('available_now') in ('1', 'true'):
+        parts.append(('minute', local_now().strftime('%H%M')))
+    return tuple(parts)
+
+
+class Entry:
+    __slots__ = ('data', 'restaurant_ids', 'terms', 'fuzzy', 'popular', 'expires', 'hits')
+
+    def __init__(self, data, restaurant_ids, terms, fuzzy, popular, expires):
+        self.data = data
+        self.restaurant_ids = restaurant_ids
+        self.terms = terms
+        self.fuzzy = fuzzy
+        self.popular = popular
+        self.expires = expires
+        self.hits = 0
+
+
+def link(index, value, key):
+    index.setdefault(value, set()).add(key)
+
+
+def unlink(index, value, key):
+    keys = index.get(value)
+    if keys is not None:
+        keys.discard(key)
+        if not keys:
+            del index[value]
+
+
+class SearchCache:
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> Entry, cuối = mới dùng nhất
+        self.by_restaurant = {}  # restaurant id -> các key có nhà hàng đó trong kết quả
+        self.by_term = {}  # từ khoá đã normalize -> các key
+        self.by_word = {}  # từ trong từ khoá fuzzy -> các key
+        self.gram_words = defaultdict(set)  # trigram -> các từ trong by_word
+        self.untermed = set()  # key không có từ khoá: món nào đổi cũng có thể làm kết quả đổi
+        self.popular = set()  # key xếp theo điểm bán chạy
+        self.max_term = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry.expires < time.monotonic():
+                self._drop(key)
+                entry = None
+            if entry is None:
+                registry.inc('search_cache_misses')
+                return None
+            entry.hits += 1
+            self.entries.move_to_end(key)
+        registry.inc('search_cache_hits')
+        return entry.data
+
+    def put(self, key, data, restaurant_ids):
+        params = dict(key)
+        terms = frozenset(' '.join(normalize(v).split()) for param in ('name', 'restaurant')
+                          for v in params.get(param, ()))
+        if any(len(term) > MAX_TERM_LENGTH for term in terms):
+            return
+        entry = Entry(data, frozenset(restaurant_ids), terms, params.get('mode') == ('fuzzy',),
+                      params.get('sort') == ('popular',), time.monotonic() + self.ttl)
+        with self.lock:
+            if key in self.entries:
+                self._drop(key)
+            while len(self.entries) >= self.max_entries:
+                self._evict()
+            self.entries[key] = entry
+            for restaurant_id in entry.restaurant_ids:
+                link(self.by_restaurant, restaurant_id, key)
+            for term in terms:
+                link(self.by_term, term, key)
+                self.max_term = max(self.max_term, len(term))
+                if entry.fuzzy:
+                    for word in term.split():
+                        if word not in self.by_word:
+                            for gram in trigrams(word):
+                                self.gram_words[gram].add(word)
+                        link(self.by_word, word, key)
+            if not terms:
+                self.untermed.add(key)
+            if entry.popular:
+                self.popular.add(key)
+
+    def _drop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for restaurant_id in entry.restaurant_ids:
+            unlink(self.by_restaurant, restaurant_id, key)
+        for term in entry.terms:
+            unlink(self.by_term, term, key)
+            if entry.fuzzy:
+                for word in term.split():
+                    unlink(self.by_word, word, key)
+                    if word not in self.by_word:
+                        for gram in trigrams(word):
+                            unlink(self.gram_words, gram, word)
+        self.untermed.discard(key)
+        self.popular.discard(key)
+
+    def _evict(self):
+        oldest = []
+        for key, entry in self.entries.items():
+            oldest.append((entry.hits, key))
+            if len(oldest) >= EVICTION_SAMPLE:
+                break
+        self._drop(min(oldest, key=lambda o: o[0])[1])
+        registry.inc('search_cache_evictions')
+
+    def matching(self, name):
+        # key có từ khoá là chuỗi con của tên (icontains), hoặc từ khoá fuzzy gần giống 1 từ trong tên
+        keys = set()
+        for start in range(len(name)):
+            for end in range(start + 1, min(len(name), start + self.max_term) + 1):
+                keys.update(self.by_term.get(name[start:end], ()))
+        for b in set(name.split()):
+            grams = trigrams(b)
+            candidates = set()
+            for gram in grams:
+                candidates.update(self.gram_words.get(gram, ()))
+            for a in candidates:
+                if similarity(trigrams(a), grams) >= MIN_WORD_SCORE:
+                    keys.update(self.by_word[a])
+        return keys
+
+    def invalidate(self, change):
+        # change: {'restaurant_ids': [...] hoặc None (tất cả), 'names': [...], 'popular': chỉ điểm bán chạy đổi}
+        restaurant_ids = change.get('restaurant_ids')
+        with self.lock:
+            if change.get('popular'):
+                keys = set(self.popular) if restaurant_ids is None else \
+                    {key for r in restaurant_ids for key in self.by_restaurant.get(r, ()) if key in self.popular}
+            else:
+                keys = {key for r in restaurant_ids for key in self.by_restaurant.get(r, ())}
+                keys.update(self.untermed)
+                for name in change.get('names', ()):
+                    if name:
+                        keys.update(self.matching(' '.join(normalize(name).split())))
+            for key in keys:
+                self._drop(key)
+        if keys:
+            registry.inc('search_cache_invalidations', len(keys))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.by_restaurant.clear()
+            self.by_term.clear()
+            self.by_word.clear()
+            self.gram_words.clear()
+            self.untermed.clear()
+            self.popular.clear()
+            self.max_term = 0
+
+
+# log riêng với search_index.search_log: đơn hàng đổi điểm bán chạy liên tục, chỉ mục gợi ý không cần đọc
+invalidation_log = ChangeLog('search-cache')
+# log không đọc được nữa -> "build lại" = cache rỗng
+search_cache = SyncedIndex(invalidation_log, SearchCache, SearchCache.invalidate)
+
+
+def get(key):
+    return search_cache.get().get(key)
+
+
+def put(key, data, restaurant_ids):
+    search_cache.get().put(key, data, restaurant_ids)
+
+
+def invalidate_food(food):
+    # tên cũ không cần: kết quả cũ có món này thì đã có nhà hàng của món trong by_restaurant
+    invalidation_log.publish({'restaurant_ids': [food.restaurant_id], 'names': [food.name]})
+
+
+def invalidate_restaurant(restaurant):
+    invalidation_log.publish({'restaurant_ids': [restaurant.id], 'names': [restaurant.name]})
+
+
+def invalidate_popularity(restaurant_ids=None):
+    # điểm bán chạy đổi bằng UPDATE (popularity.record_order, decay, rebuild) không gửi signal;
+    # chỉ thứ tự của kết quả ?sort=popular đổi. None: tất cả nhà hàng
+    invalidation_log.publish({'restaurant_ids': restaurant_ids, 'popular': True})
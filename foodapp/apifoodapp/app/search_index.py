@@ -0,0 +1,145 @@
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import connections, transaction
+
+# Đồng bộ các chỉ mục tìm kiếm nằm trong RAM của từng worker (app/autocomplete.py, app/fuzzy.py).
+# Món/nhà hàng/danh mục đổi -> ghi 1 thay đổi vào log trong cache: search-index:<n> với n tăng bằng cache.incr.
+# Mỗi CHECK_INTERVAL giây, worker đọc các thay đổi mới bằng 1 get_many rồi áp dụng từng cái vào chỉ mục của mình.
+# Chỉ khi log không còn dùng được (worker tụt lại quá LOG_TTL, cache bị xoá) mới build lại toàn bộ,
+# trong 1 thread nền: request vẫn dùng chỉ mục cũ trong lúc build
+CHECK_INTERVAL = 5  # giây giữa 2 lần đọc log
+LOG_TTL = 60 * 60  # mỗi thay đổi giữ trong log 1 giờ
+MAX_READ = 5000  # tụt lại hơn chừng này thay đổi thì build lại cho nhanh
+GAP_TIMEOUT = 2 * CHECK_INTERVAL  # key thiếu giữa log lâu hơn chừng này -> coi như đã hết hạn
+
+
+class ChangeLog:
+    def __init__(self, name, ttl=LOG_TTL):
+        self.name = name
+        self.ttl = ttl
+        self.seq_key = '%s:seq' % name
+        self.subscribers = []
+
+    def key(self, n):
+        return '%s:%d' % (self.name, n)
+
+    def position(self):
+        return cache.get(self.seq_key) or 0
+
+    def append(self, change):
+        cache.add(self.seq_key, 0, None)
+        n = cache.incr(self.seq_key)
+        cache.set(self.key(n), change, self.ttl)
+        return n
+
+    def read(self, after):
+        # Trả về (changes, position, status): status 'ok'; 'gap' khi thiếu 1 key (worker khác đang ghi dở hoặc key
+        # đã hết hạn) -> chỉ đọc đến trước chỗ thiếu; 'lost' khi không đọc tiếp được nữa (phải build lại)
+        seq = self.position()
+        if seq < after or seq - after > MAX_READ:
+            return [], seq, 'lost'
+        keys = [self.key(n) for n in range(after + 1, seq + 1)]
+        found = cache.get_many(keys)
+        changes = []
+        for n, key in enumerate(keys, after + 1):
+            if key not in found:
+                return changes, n - 1, 'gap'
+            changes.append(found[key])
+        return changes, seq, 'ok'
+
+    def publish(self, change):
+        # chỉ khi commit: transaction rollback thì không chỉ mục nào giữ thay đổi không tồn tại.
+        # Worker này áp dụng ngay, worker khác nhận qua log; worker này cũng sẽ đọc lại chính thay đổi đó
+        # từ log: áp dụng lại không đổi kết quả
+        def commit():
+            for subscriber in self.subscribers:
+                subscriber.apply_local(change)
+            self.append(change)
+
+        transaction.on_commit(commit)
+
+
+class SyncedIndex:
+    # Chỉ mục trong RAM của 1 worker, build(): dựng toàn bộ từ DB, apply(index, change): cập nhật 1 thay đổi
+    def __init__(self, log, build, apply):
+        self.log = log
+        self.build = build
+        self.apply = apply
+        self.index = None
+        self.position = 0
+        self.checked_at = 0
+        self.gap_since = None
+        self.rebuilding = False
+        self.lock = threading.Lock()
+        log.subscribers.append(self)
+
+    def get(self):
+        now = time.monotonic()
+        if self.index is not None and now - self.checked_at < CHECK_INTERVAL:
+            return self.index
+        with self.lock:
+            if self.index is None:
+                # lần đầu (wsgi.py build sẵn khi worker khởi động): chưa có gì để trả lời nên build ngay
+                self.position = self.log.position()
+                self.index = self.build()
+            elif now - self.checked_at >= CHECK_INTERVAL:
+                self.sync(now)
+            self.checked_at = now
+        return self.index
+
+    def sync(self, now):
+        changes, self.position, status = self.log.read(self.position)
+        for change in changes:
+            self.apply(self.index, change)
+        if status == 'ok':
+            self.gap_since = None
+            return
+        if status == 'gap':
+            self.gap_since = self.gap_since or now
+            if now - self.gap_since < GAP_TIMEOUT:
+                return
+        self.rebuild_in_background()
+
+    def rebuild_in_background(self):
+        if self.rebuilding:
+            return
+        self.rebuilding = True
+
+        def run():
+            try:
+                position = self.log.position()
+                index = self.build()
+                with self.lock:
+                    # các thay đổi từ lúc bắt đầu build được đọc lại ở lần get() sau
+                    self.index, self.position, self.gap_since, self.checked_at = index, position, None, 0
+            finally:
+                self.rebuilding = False
+                connections.close_all()
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def apply_local(self, change):
+        if self.index is not None:
+            with self.lock:
+                self.apply(self.index, change)
+
+
+search_log = ChangeLog('search-index')
+
+
+def publish(kind, item, visible, weight=0):
+    search_log.publish({'kind': kind, 'id': item.id, 'name': item.name, 'weight': weight, 'visible': visible})
+
+
+def publish_food(food, deleted=False):
+    publish('food', food, food.is_available and not deleted, food.popularity)
+
+
+def publish_restaurant(restaurant, deleted=False):
+    publish('restaurant', restaurant, restaurant.active and not deleted, restaurant.popularity)
+
+
+def publish_category(category, deleted=False):
+    publish('category', category, category.active and not deleted)
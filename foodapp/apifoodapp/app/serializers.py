@@ -1,23 +1,109 @@
-from django.core.exceptions import ObjectDoesNotExist
+from django.core.exceptions import FieldDoesNotExist, ObjectDoesNotExist
 from rest_framework import serializers
-from rest_framework.fields import SerializerMethodField
-from rest_framework.serializers import ModelSerializer
 
 from .models import Restaurant, User, MainCategory, RestaurantCategory, Food, Cart, SubCart, SubCartItem, ServicePeriod, \
     Menu, Order, OrderDetail, RestaurantAddress, MyAddress, Comment, Review
-
+from .media import ImageVariantsField, image_urls
+from .categories import food_counts
+
+
+# ?fields=id,name,image chỉ trả về các field này, ?exclude=owner bỏ các field này.
+# Chỉ áp dụng cho serializer ngoài cùng của request GET; có thể truyền trực tiếp Serializer(..., fields=[...]).
+class Projection:
+    def __init__(self, fields=None, exclude=None):
+        self.fields = set(fields) if fields else None
+        self.exclude = set(exclude or ())
+
+    @classmethod
+    def from_request(cls, request):
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return cls()
+        params = request.query_params
+
+        def names(key):
+            return [name.strip() for name in params.get(key, '').split(',') if name.strip()]
+
+        return cls(names('fields'), names('exclude'))
+
+    def __bool__(self):
+        return self.fields is not None or bool(self.exclude)
+
+    def keep(self, name):
+        return (self.fields is None or name in self.fields) and name not in self.exclude
+
+
+class ModelSerializer(serializers.ModelSerializer):
+    def __init__(self, *args, **kwargs):
+        fields, exclude = kwargs.pop('fields', None), kwargs.pop('exclude', None)
+        self.projection = Projection(fields, exclude) if fields or exclude else None
+        super().__init__(*args, **kwargs)
+
+    def is_root_serializer(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        projection = self.projection
+        if projection is None:
+            if not self.is_root_serializer():
+                return fields
+            projection = Projection.from_request(self.context.get('request'))
+        if not projection:
+            return fields
+        return {name: field for name, field in fields.items() if projection.keep(name)}
+
+
+def project_queryset(queryset, serializer_class, request):
+    # Thu hẹp queryset theo ?fields/?exclude: bỏ prefetch/select_related của quan hệ không trả về
+    # và .only() các cột còn dùng (khi mọi field còn lại đều là cột/quan hệ của model)
+    projection = Projection.from_request(request)
+    if not projection or not issubclass(serializer_class, ModelSerializer):
+        return queryset
+
+    all_fields = serializer_class(context={}).fields
+    kept = serializer_class(context={'request': request}).fields
+    dropped = {all_fields[name].source.split('.')[0] for name in all_fields if name not in kept}
+    kept_roots = {field.source.split('.')[0] for field in kept.values()}
+    dropped -= kept_roots
+
+    def root(lookup):
+        return getattr(lookup, 'prefetch_through', lookup).split('__')[0]
+
+    lookups = queryset._prefetch_related_lookups
+    if any(root(lookup) in dropped for lookup in lookups):
+        queryset = queryset.prefetch_related(None).prefetch_related(
+            *[lookup for lookup in lookups if root(lookup) not in dropped])
+
+    select_related = queryset.query.select_related
+    if isinstance(select_related, dict) and dropped & set(select_related):
+        # select_related() không đối số nghĩa là theo mọi FK: chỉ gọi lại khi còn quan hệ cần join
+        kept_related = [name for name in select_related if name not in dropped]
+        queryset = queryset.select_related(None)
+        if kept_related:
+            queryset = queryset.select_related(*kept_related)
+        select_related = queryset.query.select_related
+
+    columns = []
+    for field in kept.values():
+        try:
+            model_field = queryset.model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            return queryset  # property, method field hoặc source lồng: không đoán được cột cần dùng
+        if model_field.concrete:
+            columns.append(model_field.name)
+    if select_related is True:
+        return queryset
+    return queryset.only('pk', *columns, *(select_related or ()))
 
 class BaseSerializer(ModelSerializer):
-    image = SerializerMethodField(source='image')
-
-    def get_image(self, obj):
-        request = self.context.get('request')
-        if request and obj.image:
-            return request.build_absolute_uri('/static/%s' % obj.image)
+    image = ImageVariantsField(required=False)
 
 
 class UserSimpleSerializer(ModelSerializer):
-    avatar = serializers.ImageField(required=False)
+    avatar = ImageVariantsField(required=False)
 
     class Meta:
         model = User
@@ -40,7 +126,7 @@ class UserSerializer(ModelSerializer):
     #     user.save()
     #     return user
 
-    avatar = serializers.ImageField(required=False)
+    avatar = ImageVariantsField(required=False)
     restaurant_id = serializers.SerializerMethodField()
     confirm_status = serializers.SerializerMethodField()
 
@@ -69,7 +155,7 @@ class UserSerializer(ModelSerializer):
             return None
 
 
-class RestaurantAddressSerializer(serializers.ModelSerializer):
+class RestaurantAddressSerializer(ModelSerializer):
     address_restaurant = serializers.SerializerMethodField()
 
     class Meta:
@@ -81,12 +167,12 @@ class RestaurantAddressSerializer(serializers.ModelSerializer):
 
 
 class RestaurantSerializer(ModelSerializer):
-    image = serializers.ImageField(required=False)
+    image = ImageVariantsField(required=False)
 
     class Meta:
         model = Restaurant
-        fields = ['id', 'name', 'address', 'address', 'latitude', 'longitude', 'followers', 'owner', 'star_rate',
-                  'image', 'active', 'shipping_fee']
+        fields = ['id', 'name', 'address', 'address', 'latitude', 'longitude', 'followers_count', 'owner',
+                  'star_rate', 'image', 'active', 'shipping_fee']
 
     # def create(self, validated_data):
     #     owner_data = validated_data.pop('owner')
@@ -96,7 +182,7 @@ class RestaurantSerializer(ModelSerializer):
 
 
 class RestaurantSP(ModelSerializer):
-    image = serializers.ImageField(required=False)
+    image = ImageVariantsField(required=False)
 
     class Meta:
         model = Restaurant
@@ -110,12 +196,12 @@ class RestaurantName(ModelSerializer):
 
 
 class RestaurantFollowers(ModelSerializer):
-    image = serializers.ImageField(required=False)
+    image = ImageVariantsField(required=False)
     is_following = serializers.SerializerMethodField()
 
     class Meta:
         model = Restaurant
-        fields = ['id', 'name', 'address', 'image', 'is_following']
+        fields = ['id', 'name', 'address', 'image', 'followers_count', 'is_following']
 
     def get_is_following(self, obj):
         user = self.context['request'].user
@@ -123,11 +209,18 @@ class RestaurantFollowers(ModelSerializer):
 
 
 class MainCategorySerializer(ModelSerializer):
-    image = serializers.ImageField(required=False)
+    image = ImageVariantsField(required=False)
+    food_count = serializers.SerializerMethodField()
 
     class Meta:
         model = MainCategory
-        fields = ['id', 'name', 'image']
+        fields = ['id', 'name', 'image', 'food_count']
+
+    def get_food_count(self, obj):
+        # đếm sẵn cho mọi danh mục (cache), lấy 1 lần cho cả danh sách
+        if 'food_counts' not in self.context:
+            self.context['food_counts'] = food_counts()
+        return self.context['food_counts'].get(obj.id, 0)
 
 
 class RestaurantCategorySerializer(BaseSerializer):
@@ -141,7 +234,7 @@ class RestaurantCategorySerializer(BaseSerializer):
 class FoodSerializers(BaseSerializer):
     # restaurant = RestaurantSP(read_only=True)
     # category = RestaurantCategorySerializer()
-    image = serializers.ImageField(required=False)
+    image = ImageVariantsField(required=False)
     serve_period = serializers.ChoiceField(choices=ServicePeriod.choices)
 
     class Meta:
@@ -176,7 +269,7 @@ class SubCartSerializer(ModelSerializer):
 
 
 class FoodODSerializers(BaseSerializer):
-    image = serializers.ImageField(required=False)
+    image = ImageVariantsField(required=False)
 
     class Meta:
         model = Food
@@ -216,7 +309,7 @@ class CartSerializer(ModelSerializer):
 
     class Meta:
         model = Cart
-        fields = ['id', 'user', 'items_number']
+        fields = ['id', 'user', 'items_number', 'total_price']
 
 
 class FoodCreateSerializer(ModelSerializer):
@@ -276,7 +369,7 @@ class ClientMenuSerializer(ModelSerializer):
         fields = ['id', 'name', 'restaurant', 'description', 'food', 'serve_period', 'active']
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(ModelSerializer):
     class Meta:
         model = Comment
         fields = ['id', 'content', 'created_date', 'user']
@@ -284,7 +377,7 @@ class CommentSerializer(serializers.ModelSerializer):
 
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(ModelSerializer):
 
     restaurant_comment = CommentSerializer(read_only=True)
     user = UserSimpleSerializer()
@@ -295,6 +388,142 @@ class ReviewSerializer(serializers.ModelSerializer):
         fields = ['id', 'stars', 'user', 'username', 'food', 'restaurant', 'customer_comment',
                   'restaurant_comment', 'created_date']
 
+
+# Serializer chỉ đọc cho các trang danh sách: lấy dữ liệu bằng .values() rồi dựng dict trực tiếp,
+# không tạo model instance và field serializer cho từng dòng. Output giống serializer tương ứng ở trên.
+# Quan hệ nhiều (order_details...) được lấy thêm đúng 1 câu SQL cho cả trang trong attach().
+datetime_field = serializers.DateTimeField()
+
+
+def format_datetime(value):
+    return datetime_field.to_representation(value) if value else None
+
+
+class ValuesSerializer:
+    fields = ()  # key trả về
+    sources = {}  # key -> các cột .values() cần cho key đó (mặc định: cột cùng tên)
+
+    def __init__(self, fields=None, exclude=None, projection=None):
+        self.projection = projection or Projection(fields, exclude)
+
+    def wants(self, name):
+        return self.projection.keep(name)
+
+    def values(self, queryset):
+        columns = ['id']
+        for name in self.fields:
+            if self.wants(name):
+                columns.extend(c for c in self.sources.get(name, (name,)) if c not in columns)
+        return queryset.values(*columns)
+
+    def to_row(self, row):
+        return row
+
+    def attach(self, rows):
+        pass
+
+    def serialize(self, rows):
+        rows = [self.to_row(row) for row in rows]
+        if rows:
+            self.attach(rows)
+        if self.projection:
+            rows = [{name: value for name, value in row.items() if self.wants(name)} for row in rows]
+        return rows
+
+
+class FoodValuesSerializer(ValuesSerializer):  # FoodSerializers
+    fields = ('id', 'name', 'price', 'description', 'image', 'category', 'restaurant', 'is_available',
+              'serve_period', 'star_rate')
+
+    def to_row(self, row):
+        if 'image' in row:
+            row['image'] = image_urls(row['image'])
+        return row
+
+
+class RestaurantValuesSerializer(ValuesSerializer):  # RestaurantSerializer
+    fields = ('id', 'name', 'address', 'latitude', 'longitude', 'followers_count', 'owner', 'star_rate', 'image',
+              'active', 'shipping_fee')
+
+    def to_row(self, row):
+        if 'image' in row:
+            row['image'] = image_urls(row['image'])
+        return row
+
+
+class OrderValuesSerializer(ValuesSerializer):  # OrderSerializer
+    fields = ('id', 'user', 'user_name', 'restaurant', 'order_date', 'shipping_address', 'shipping_fee', 'total',
+              'delivery_status', 'order_details')
+    sources = {'user_name': ('user__username',), 'shipping_address': ('shipping_address__address',),
+               'order_details': ()}
+
+    def to_row(self, row):
+        data = {
+            'id': row['id'],
+            'user': row.get('user'),
+            'user_name': row.get('user__username'),
+            'restaurant': row.get('restaurant'),
+            'order_date': format_datetime(row.get('order_date')),
+            'shipping_address': row.get('shipping_address__address'),
+            'shipping_fee': row.get('shipping_fee'),
+            'total': row.get('total'),
+            'delivery_status': row.get('delivery_status'),
+            'order_details': [],
+        }
+        if data['shipping_address'] is None:
+            # OrderSerializer bỏ hẳn key khi đơn không còn địa chỉ
+            del data['shipping_address']
+        return data
+
+    def attach(self, rows):
+        if not self.wants('order_details'):
+            return
+        by_id = {row['id']: row for row in rows}
+        details = OrderDetail.objects.filter(order_id__in=by_id).order_by('id').values(
+            'id', 'food', 'food__name', 'food__price', 'food__image', 'order', 'quantity', 'sub_total', 'evaluated')
+        for d in details:
+            by_id[d['order']]['order_details'].append({
+                'id': d['id'],
+                'food': {'id': d['food'], 'name': d['food__name'], 'price': d['food__price'],
+                         'image': image_urls(d['food__image'])},
+                'order': d['order'],
+                'quantity': d['quantity'],
+                'sub_total': d['sub_total'],
+                'evaluated': d['evaluated'],
+            })
+
+
+class ReviewValuesSerializer(ValuesSerializer):  # ReviewSerializer
+    fields = ('id', 'stars', 'user', 'username', 'food', 'restaurant', 'customer_comment', 'restaurant_comment',
+              'created_date')
+    sources = {
+        'user': ('user', 'user__username', 'user__avatar'),
+        'username': ('user__username',),
+        'restaurant_comment': ('restaurant_comment', 'restaurant_comment__content',
+                               'restaurant_comment__created_date', 'restaurant_comment__user'),
+    }
+
+    def to_row(self, row):
+        comment = None
+        if row.get('restaurant_comment'):
+            comment = {'id': row['restaurant_comment'], 'content': row['restaurant_comment__content'],
+                       'created_date': format_datetime(row['restaurant_comment__created_date']),
+                       'user': row['restaurant_comment__user']}
+        user = None
+        if 'user' in row:
+            user = {'id': row['user'], 'username': row['user__username'], 'avatar': image_urls(row['user__avatar'])}
+        return {
+            'id': row['id'],
+            'stars': row.get('stars'),
+            'user': user,
+            'username': row.get('user__username'),
+            'food': row.get('food'),
+            'restaurant': row.get('restaurant'),
+            'customer_comment': row.get('customer_comment'),
+            'restaurant_comment': comment,
+            'created_date': format_datetime(row.get('created_date')),
+        }
+
 #
 # class OrderDetailSerializer(ModelSerializer):
 #     food_name = serializers.CharField(source='food.name', read_only=True)
@@ -0,0 +1,113 @@
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.db import transaction
+from django.dispatch import receiver
+
+from . import availability, snapshot, feed, categories, search_index, search_cache, carts
+from .models import Food, Menu, Restaurant, RestaurantCategory, FeedItem, FeedKind, MainCategory
+
+
+@receiver([post_save, post_delete], sender=Food)
+@receiver([post_save, post_delete], sender=Menu)
+def invalidate_availability(sender, instance, **kwargs):
+    if instance.restaurant_id:
+        availability.invalidate(instance.restaurant_id)
+        snapshot.bump_version(instance.restaurant_id)
+
+
+@receiver(post_save, sender=Food)
+def reprice_carts(sender, instance, created, **kwargs):
+    # nhà hàng sửa giá -> cập nhật thành tiền trong các giỏ hàng đang có món này
+    old_price = getattr(instance, '_loaded_price', None)
+    if not created and old_price is not None and old_price != instance.price:
+        carts.reprice_food(instance.pk, instance.price)
+    instance._loaded_price = instance.price
+
+
+@receiver(post_save, sender=Food)
+def classify_new_food(sender, instance, created, **kwargs):
+    if created:
+        categories.classify_foods(Food.objects.filter(id=instance.id))
+
+
+@receiver([post_save, post_delete], sender=MainCategory)
+def invalidate_main_categories(sender, instance, **kwargs):
+    categories.invalidate_counts()
+    search_index.publish_category(instance, deleted=kwargs.get('signal') is post_delete)
+
+
+@receiver([post_save, post_delete], sender=Food)
+def update_food_suggestions(sender, instance, **kwargs):
+    search_index.publish_food(instance, deleted=kwargs.get('signal') is post_delete)
+    search_cache.invalidate_food(instance)
+
+
+@receiver([post_save, post_delete], sender=Restaurant)
+def update_restaurant_suggestions(sender, instance, **kwargs):
+    search_index.publish_restaurant(instance, deleted=kwargs.get('signal') is post_delete)
+    search_cache.invalidate_restaurant(instance)
+
+
+@receiver(m2m_changed, sender=Menu.food.through)
+def invalidate_menu_foods(sender, instance, **kwargs):
+    if isinstance(instance, Menu) and instance.restaurant_id:
+        availability.invalidate(instance.restaurant_id)
+        snapshot.bump_version(instance.restaurant_id)
+
+
+@receiver([post_save, post_delete], sender=RestaurantCategory)
+def invalidate_category(sender, instance, **kwargs):
+    snapshot.bump_version(instance.restaurant_id)
+
+
+@receiver(post_save, sender=Restaurant)
+def invalidate_restaurant(sender, instance, **kwargs):
+    snapshot.bump_version(instance.id)
+
+
+@receiver(post_delete, sender=Restaurant)
+def forget_restaurant(sender, instance, **kwargs):
+    # sau commit: request đọc song song trước đó không ghi lại version cũ
+    restaurant_id = instance.id
+    transaction.on_commit(lambda: snapshot.forget(restaurant_id))
+
+
+def update_followers_count(restaurant_ids):
+    # Đếm lại bằng 1 câu UPDATE ... SET followers_count = (SELECT COUNT(*) ...), không đọc-sửa-ghi nên không bị race
+    through = Restaurant.followers.through
+    count = through.objects.filter(restaurant_id=OuterRef('pk')).values('restaurant_id') \
+        .annotate(c=Count('*')).values('c')
+    Restaurant.objects.filter(pk__in=restaurant_ids).update(followers_count=Coalesce(Subquery(count), 0))
+
+
+@receiver(post_delete, sender=Food)
+@receiver(post_delete, sender=Menu)
+def unpublish_feed_items(sender, instance, origin=None, **kwargs):
+    # xoá cả nhà hàng thì dòng timeline đã bị xoá theo (FK restaurant CASCADE)
+    if not isinstance(origin, Restaurant):
+        feed.unpublish(FeedKind.MENU if sender is Menu else FeedKind.FOOD, instance.pk)
+
+
+@receiver(m2m_changed, sender=Restaurant.followers.through)
+def sync_followers_count(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        # restaurant.followers.add/remove/clear(...)
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            update_followers_count([instance.pk])
+        if action == 'post_remove' and pk_set:
+            feed.remove_restaurant_items(pk_set, [instance.pk])
+        elif action == 'pre_clear':
+            FeedItem.objects.filter(restaurant_id=instance.pk).delete()
+        return
+
+    # user.following_restaurants.add/remove/clear(...)
+    if action == 'pre_clear':
+        instance._cleared_restaurant_ids = list(instance.following_restaurants.values_list('id', flat=True))
+    elif action == 'post_clear':
+        update_followers_count(getattr(instance, '_cleared_restaurant_ids', []))
+        FeedItem.objects.filter(user_id=instance.pk).delete()
+    elif action in ('post_add', 'post_remove') and pk_set:
+        update_followers_count(pk_set)
+        if action == 'post_remove':
+            feed.remove_restaurant_items([instance.pk], pk_set)
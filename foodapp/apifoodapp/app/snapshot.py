@@ -0,0 +1,113 @@
+import gzip
+import json
+import time
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .media import image_urls
+from .models import Restaurant, RestaurantCategory, Food, Menu
+
+try:
+    import brotli
+except ImportError:  # brotli là tuỳ chọn, không có thì chỉ nén gzip
+    brotli = None
+
+SNAPSHOT_TIMEOUT = 60 * 60 * 24
+# Payload nhỏ hơn ngưỡng này thì nén không đáng
+MIN_COMPRESS_SIZE = 1024
+
+RESTAURANT_FIELDS = ('id', 'name', 'address', 'latitude', 'longitude', 'phone_number', 'star_rate', 'active',
+                     'image', 'shipping_fee')
+FOOD_FIELDS = ('id', 'name', 'price', 'description', 'category_id', 'image', 'is_available', 'serve_period',
+               'available_start', 'available_end', 'star_rate')
+
+
+def version_key(restaurant_id):
+    return 'snapshot:version:%s' % restaurant_id
+
+
+def snapshot_key(restaurant_id, version):
+    return 'snapshot:%s:%s' % (restaurant_id, version)
+
+
+def get_version(restaurant_id):
+    # None nếu không có nhà hàng: id bất kỳ không tạo key version trong cache
+    version = cache.get(version_key(restaurant_id))
+    if version is None:
+        if not Restaurant.objects.filter(id=restaurant_id).exists():
+            return None
+        version = bump_version(restaurant_id)
+    return version
+
+
+def bump_version(restaurant_id):
+    # Đổi version thay vì xoá cache: bản cũ tự hết hạn, client dùng version làm ETag.
+    # Key version hết hạn cùng snapshot: nhà hàng không ai xem (hoặc đã bị xoá) không giữ key mãi
+    version = time.time_ns() // 1000
+    cache.set(version_key(restaurant_id), version, SNAPSHOT_TIMEOUT)
+    return version
+
+
+def forget(restaurant_id):
+    # nhà hàng bị xoá: bỏ version để snapshot cũ không còn được trả về
+    cache.delete(version_key(restaurant_id))
+
+
+def build_snapshot(restaurant_id):
+    # Đúng 5 câu SQL, không phụ thuộc số món/menu: nhà hàng, danh mục, món, menu, bảng nối menu-món
+    restaurant = Restaurant.objects.filter(id=restaurant_id).values(*RESTAURANT_FIELDS).first()
+    if restaurant is None:
+        return None
+    restaurant['image'] = image_urls(restaurant['image'])
+
+    categories = list(RestaurantCategory.objects.filter(restaurant_id=restaurant_id, active=True)
+                      .values('id', 'name').order_by('id'))
+
+    foods = {}
+    for food in Food.objects.filter(restaurant_id=restaurant_id).values(*FOOD_FIELDS).order_by('id'):
+        food['image'] = image_urls(food['image'])
+        foods[food['id']] = food
+
+    menus = {m['id']: dict(m, foods=[]) for m in Menu.objects.filter(restaurant_id=restaurant_id, active=True)
+             .values('id', 'name', 'description', 'serve_period').order_by('id')}
+    for menu_id, food_id in Menu.food.through.objects.filter(menu_id__in=menus).values_list('menu_id', 'food_id') \
+            .order_by('menu_id', 'food_id'):
+        menus[menu_id]['foods'].append(food_id)
+
+    return {
+        'restaurant': restaurant,
+        'categories': categories,
+        'foods': foods,
+        'menus': list(menus.values()),
+    }
+
+
+def get_snapshot(restaurant_id):
+    # Trả về (version, {encoding: bytes}) hoặc None nếu không có nhà hàng; các bản nén được cache cùng bản gốc
+    version = get_version(restaurant_id)
+    if version is None:
+        return None
+    key = snapshot_key(restaurant_id, version)
+    bodies = cache.get(key)
+    if bodies is None:
+        data = build_snapshot(restaurant_id)
+        if data is None:
+            return None
+        data['version'] = version
+        raw = json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+        bodies = {'identity': raw}
+        if len(raw) >= MIN_COMPRESS_SIZE:
+            bodies['gzip'] = gzip.compress(raw, compresslevel=6)
+            if brotli is not None:
+                bodies['br'] = brotli.compress(raw)
+        cache.set(key, bodies, SNAPSHOT_TIMEOUT)
+    return version, bodies
+
+
+def pick_encoding(accept_encoding, bodies):
+    accepted = {part.split(';')[0].strip() for part in (accept_encoding or '').split(',')}
+    for encoding in ('br', 'gzip'):
+        if encoding in accepted and encoding in bodies:
+            return encoding
+    return 'identity'
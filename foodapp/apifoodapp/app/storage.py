@@ -0,0 +1,96 @@
+import os
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from PIL import Image, ImageOps
+
+# Kích thước ảnh theo từng màn hình (list: danh sách, card: thẻ món/nhà hàng, detail: trang chi tiết)
+IMAGE_VARIANTS = {
+    'list': {'width': 160, 'height': 160, 'crop': 'fill'},
+    'card': {'width': 480, 'height': 320, 'crop': 'fill'},
+    'detail': {'width': 1080, 'crop': 'limit'},
+}
+# Ảnh gốc được thu nhỏ trước khi đẩy lên storage
+MAX_IMAGE_SIZE = 1600
+
+
+def resize_image(path, max_size=MAX_IMAGE_SIZE):
+    # Thu nhỏ ảnh tại chỗ (giữ tỉ lệ), trả về path
+    with Image.open(path) as img:
+        img = ImageOps.exif_transpose(img)
+        if max(img.size) > max_size:
+            img.thumbnail((max_size, max_size))
+            if img.mode not in ('RGB', 'L') and path.lower().endswith(('.jpg', '.jpeg')):
+                img = img.convert('RGB')
+            img.save(path, quality=85)
+    return path
+
+
+class CloudinaryImageStorage:
+    placeholder = 'image/upload/foodapp/placeholder.png'
+    common_options = {'quality': 'auto', 'fetch_format': 'auto', 'secure': True}
+
+    def __init__(self):
+        from cloudinary.models import CloudinaryField
+        self.parser = CloudinaryField('image')
+        self.placeholder = getattr(settings, 'IMAGE_PLACEHOLDER', self.placeholder)
+
+    def save(self, path, name):
+        from cloudinary import uploader
+        resource = uploader.upload_resource(resize_image(path), public_id=name, folder='foodapp')
+        return resource.get_prep_value()
+
+    def urls(self, value):
+        # Cloudinary resize + nén theo URL (q_auto, f_auto -> webp/avif nếu client hỗ trợ), không cần lưu thêm file
+        resource = self.parser.parse_cloudinary_resource(value)
+        urls = {'url': resource.build_url(secure=True)}
+        for variant, options in IMAGE_VARIANTS.items():
+            options = dict(options, **self.common_options)
+            if options['crop'] == 'fill':
+                options['gravity'] = 'auto'
+            urls[variant] = resource.build_url(**options)
+        return urls
+
+
+class LocalImageStorage:
+    # Lưu ảnh trong thư mục static của project, dùng khi dev/test không có mạng.
+    # Giá trị lưu trong DB cùng dạng với Cloudinary để CloudinaryField parse được
+    prefix = 'image/upload/local/'
+    placeholder = 'image/upload/local/placeholder.jpg'
+
+    def __init__(self):
+        self.root = getattr(settings, 'LOCAL_IMAGE_ROOT', os.path.join(settings.MEDIA_ROOT, 'images'))
+        self.base_url = getattr(settings, 'LOCAL_IMAGE_URL', '/%simages/' % settings.STATIC_URL.lstrip('/'))
+
+    def variant_name(self, name, variant):
+        stem, ext = os.path.splitext(name)
+        return '%s_%s%s' % (stem, variant, ext)
+
+    def save(self, path, name):
+        os.makedirs(self.root, exist_ok=True)
+        name = name + os.path.splitext(path)[1].lower()
+
+        with Image.open(resize_image(path)) as img:
+            img.save(os.path.join(self.root, name))
+            for variant, options in IMAGE_VARIANTS.items():
+                if options['crop'] == 'fill':
+                    resized = ImageOps.fit(img, (options['width'], options['height']))
+                else:
+                    resized = img.copy()
+                    resized.thumbnail((options['width'], options['width']))
+                resized.save(os.path.join(self.root, self.variant_name(name, variant)))
+
+        return self.prefix + name
+
+    def urls(self, value):
+        name = value[len(self.prefix):] if value.startswith(self.prefix) else value
+        urls = {'url': self.base_url + name}
+        for variant in IMAGE_VARIANTS:
+            urls[variant] = self.base_url + self.variant_name(name, variant)
+        return urls
+
+
+@lru_cache(maxsize=None)
+def get_image_storage():
+    return import_string(getattr(settings, 'IMAGE_STORAGE_BACKEND', 'app.storage.CloudinaryImageStorage'))()
@@ -1,3 +1,789 @@
-from django.test import TestCase
+import os
+import tempfile
+import threading
+import zoneinfo
+from datetime import datetime, time, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.http import QueryDict
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from . import availability, carts, feed, reorder, search_index, search_cache, popularity, order_queue, uploads
+from .facets import compute_facets
+from .autocomplete import PrefixIndex, apply_change
+from .models import User, Restaurant, Food, Cart, SubCart, SubCartItem, MyAddress, Order, OrderDetail, Payment, \
+    OrderStatus, MainCategory, FoodMainCategory, PendingUpload, UploadStatus, Menu, ServicePeriod, \
+    FeedItem, FeedJob, FeedKind, UserFoodStat, RestaurantCategory
+from .serializers import RestaurantCategorySerializer, project_queryset
+
+ORM = 'app.carts.OrmCartStorage'
+CACHE = 'app.carts.CacheCartStorage'
+
+
+class CartTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = [User.objects.create(username='user%d' % i, email='user%d@foodapp.vn' % i) for i in range(2)]
+        self.foods = []
+        for i in range(2):
+            owner = User.objects.create(username='owner%d' % i, email='owner%d@foodapp.vn' % i)
+            restaurant = Restaurant.objects.create(name='Quán %d' % i, owner=owner)
+            self.foods += [Food.objects.create(name='Món %d-%d' % (i, j), price=10000 * (j + 1), restaurant=restaurant)
+                           for j in range(2)]
+
+    def db_state(self, user):
+        cart = Cart.objects.filter(user=user).values('items_number', 'total_price').first()
+        sub_carts = sorted(SubCart.objects.filter(cart__user=user)
+                           .values_list('restaurant_id', 'total_price', 'total_quantity'))
+        items = sorted(SubCartItem.objects.filter(sub_cart__cart__user=user)
+                       .values_list('restaurant_id', 'food_id', 'quantity', 'price', 'note'))
+        return cart, sub_carts, items
+
+    def apply(self, backend, user, operations):
+        with override_settings(CART_STORAGE_BACKEND=backend):
+            storage = carts.get_cart_storage()
+            for food, quantity, note in operations:
+                storage.add_item(user.id, food, quantity, note)
+            badge = storage.badge(user.id)
+            storage.flush(user.id)
+        return badge
+
+
+class CartStorageTests(CartTestCase):
+    # 2 backend giỏ hàng phải cho ra cùng dữ liệu trong DB sau khi flush
+
+    def test_backends_write_same_rows(self):
+        a, b, c, d = self.foods
+        operations = [(a, 2, ''), (c, 1, 'ít cay'), (a, 1, ''), (b, 3, ''), (c, -1, ''), (d, 1, ''), (b, -1, '')]
+
+        orm_badge = self.apply(ORM, self.users[0], operations)
+        cache_badge = self.apply(CACHE, self.users[1], operations)
+
+        self.assertEqual(self.db_state(self.users[0]), self.db_state(self.users[1]))
+        self.assertEqual(orm_badge, cache_badge)
+        self.assertEqual(cache_badge, {'items_number': 2, 'total_price': 3 * 10000 + 2 * 20000 + 20000})
+
+    def test_removing_last_item_drops_sub_cart(self):
+        food = self.foods[0]
+        for backend, user in ((ORM, self.users[0]), (CACHE, self.users[1])):
+            self.apply(backend, user, [(food, 2, ''), (food, -2, '')])
+            self.assertEqual(self.db_state(user), ({'items_number': 0, 'total_price': 0}, [], []))
+
+    def test_cache_backend_writes_behind(self):
+        user = self.users[0]
+        with override_settings(CART_STORAGE_BACKEND=CACHE):
+            storage = carts.get_cart_storage()
+            storage.add_item(user.id, self.foods[0], 2)
+
+            self.assertFalse(SubCartItem.objects.exists())
+            self.assertEqual(storage.badge(user.id), {'items_number': 1, 'total_price': 20000})
+            self.assertEqual(storage.dirty_users(), [user.id])
+
+            call_command('flush_carts', stdout=StringIO())
+
+            self.assertEqual(storage.dirty_users(), [])
+            self.assertEqual(self.db_state(user)[2], [(self.foods[0].restaurant_id, self.foods[0].id, 2, 20000, '')])
+
+    def test_cart_endpoints_flush_before_reading(self):
+        user = self.users[0]
+        client = APIClient()
+        client.force_authenticate(user)
+        with override_settings(CART_STORAGE_BACKEND=CACHE):
+            response = client.post('/api/add-to-cart', {'food_id': self.foods[1].id, 'quantity': 1})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['cart']['items_number'], 1)
+
+            response = client.get('/carts/sub-carts/')
+            self.assertEqual(response.data['count'], 1)
+            self.assertEqual(response.data['results'][0]['total_price'], 20000)
+
+    def test_direct_db_change_reloads_cache_state(self):
+        user = self.users[0]
+        with override_settings(CART_STORAGE_BACKEND=CACHE):
+            storage = carts.get_cart_storage()
+            storage.add_item(user.id, self.foods[0], 1)
+            storage.add_item(user.id, self.foods[2], 1)
+            storage.flush(user.id)
+
+            cart = Cart.objects.get(user=user)
+            with self.captureOnCommitCallbacks(execute=True):
+                SubCart.objects.filter(cart=cart, restaurant_id=self.foods[2].restaurant_id).delete()
+                carts.refresh_totals(cart, [])
+
+            self.assertEqual(storage.badge(user.id), {'items_number': 1, 'total_price': 10000})
+            storage.add_item(user.id, self.foods[0], 1)
+            storage.flush(user.id)
+            self.assertEqual(self.db_state(user)[0], {'items_number': 1, 'total_price': 20000})
+
+    def test_workers_share_cart_without_losing_items(self):
+        # 2 instance CacheCartStorage = 2 worker dùng chung cache, sửa xen kẽ cùng 1 giỏ
+        user = self.users[0]
+        workers = [carts.CacheCartStorage(), carts.CacheCartStorage()]
+        workers[0].add_item(user.id, self.foods[0], 1)
+
+        def add(storage, food):
+            for _ in range(20):
+                storage.add_item(user.id, food, 1)
+
+        threads = [threading.Thread(target=add, args=(worker, food)) for worker, food in zip(workers, self.foods)]
+        with workers[1].locked(user.id):
+            for thread in threads:
+                thread.start()
+            threads[0].join(0.1)
+            self.assertTrue(threads[0].is_alive())  # chờ khoá của worker kia
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(workers[1].dirty_users(), [user.id])
+        self.assertEqual(workers[1].flush_dirty(), 1)
+        self.assertEqual(workers[0].dirty_users(), [])
+        self.assertEqual(self.db_state(user)[2], [(self.foods[0].restaurant_id, self.foods[0].id, 21, 210000, ''),
+                                                  (self.foods[1].restaurant_id, self.foods[1].id, 20, 400000, '')])
+
+        workers[0].add_item(user.id, self.foods[2], 1)
+        self.assertEqual(workers[1].dirty_users(), [user.id])
+
+    def test_price_change_reprices_carts(self):
+        food = self.foods[0]
+        self.apply(ORM, self.users[0], [(food, 2, '')])
+        with override_settings(CART_STORAGE_BACKEND=CACHE):
+            storage = carts.get_cart_storage()
+            storage.add_item(self.users[1].id, food, 3)
+
+            food.price = 12000
+            with self.captureOnCommitCallbacks(execute=True):
+                food.save()
+            storage.flush(self.users[1].id)
+
+        self.assertEqual(self.db_state(self.users[0])[0], {'items_number': 1, 'total_price': 24000})
+        self.assertEqual(self.db_state(self.users[1])[0], {'items_number': 1, 'total_price': 36000})
+        self.assertEqual(carts.get_badge(self.users[0].id)['total_price'], 24000)
+
+
+class UpdateSubCartItemTests(CartTestCase):
+    def test_only_owner_can_update_item(self):
+        owner, other = self.users
+        self.apply(ORM, owner, [(self.foods[0], 1, '')])
+        item = SubCartItem.objects.get(sub_cart__cart__user=owner)
+        client = APIClient()
+        data = {'sub_cart_item_id': item.id, 'quantity': 2}
+
+        self.assertEqual(client.patch('/update-sub-cart-item/', data, format='json').status_code, 401)
+        client.force_authenticate(other)
+        self.assertEqual(client.patch('/update-sub-cart-item/', data, format='json').status_code, 404)
+        self.assertIsNone(self.db_state(other)[0])
+        client.force_authenticate(owner)
+        self.assertEqual(client.patch('/update-sub-cart-item/', data, format='json').status_code, 200)
+        item.refresh_from_db()
+        self.assertEqual(item.quantity, 3)
+
+
+class SweepCartsTests(CartTestCase):
+    # sweep_carts xoá giỏ bỏ quên nhưng không làm mất giỏ đang được sửa trong cache
+
+    def age(self, user, days=60):
+        Cart.objects.filter(user=user).update(updated_date=timezone.now() - timedelta(days=days))
+
+    def test_sweeps_only_old_carts(self):
+        for user in self.users:
+            self.apply(ORM, user, [(self.foods[0], 1, '')])
+        self.age(self.users[0])
+        call_command('sweep_carts', days=30, stdout=StringIO())
+        self.assertIsNone(self.db_state(self.users[0])[0])
+        self.assertEqual(self.db_state(self.users[1])[0], {'items_number': 1, 'total_price': 10000})
+
+    def test_dirty_user_is_skipped(self):
+        user = self.users[0]
+        self.apply(CACHE, user, [(self.foods[0], 1, '')])
+        self.age(user)
+        with override_settings(CART_STORAGE_BACKEND=CACHE):
+            carts.get_cart_storage().add_item(user.id, self.foods[1], 1)
+            call_command('sweep_carts', days=30, stdout=StringIO())
+        self.assertEqual(self.db_state(user)[0], {'items_number': 1, 'total_price': 10000})
+
+    def test_cart_edited_during_sweep_survives(self):
+        # user thành dirty sau khi sweep_carts đã lấy danh sách dirty: giỏ DB bị xoá, bản trong cache thì không
+        user = self.users[0]
+        self.apply(CACHE, user, [(self.foods[0], 1, '')])
+        self.age(user)
+        with override_settings(CART_STORAGE_BACKEND=CACHE):
+            storage = carts.get_cart_storage()
+            storage.add_item(user.id, self.foods[2], 2)
+            self.assertEqual(carts.sweep_abandoned(timezone.now() - timedelta(days=30)), 1)
+            storage.flush(user.id)
+        self.assertEqual(self.db_state(user)[0], {'items_number': 2, 'total_price': 10000 + 2 * 10000})
+
+
+class CheckoutTests(TestCase):
+    # số tiền thu của đơn tính từ giá hiện tại của món, không lấy theo client
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='user', email='user@foodapp.vn')
+        owner = User.objects.create(username='owner', email='owner@foodapp.vn')
+        restaurant = Restaurant.objects.create(name='Quán', owner=owner)
+        self.food = Food.objects.create(name='Phở', price=40000, restaurant=restaurant)
+        self.address = MyAddress.objects.create(user=self.user, address='1 Lê Lợi')
+        carts.get_cart_storage().add_item(self.user.id, self.food, 2)
+        self.sub_cart = SubCart.objects.get(cart__user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def checkout(self, total_price):
+        return self.client.post('/order/', {'sub_cart_id': self.sub_cart.id, 'address_id': self.address.id,
+                                            'shipping_fee': 15000, 'total_price': total_price, 'payment': 'cash'})
+
+    def test_total_is_checked_against_cart(self):
+        response = self.checkout(1000)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['total_price'], 95000)
+        self.assertFalse(Order.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.checkout(95000)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(Payment.objects.values_list('order__total', 'amount')), [(95000, 95000)])
+
+    def test_stale_price_is_repriced_before_ordering(self):
+        Food.objects.filter(id=self.food.id).update(price=45000)
+        response = self.checkout(95000)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['sub_cart']['total_price'], 90000)
+        self.assertEqual(self.checkout(105000).status_code, 200)
+
+    def test_other_users_sub_cart_is_not_found(self):
+        other = User.objects.create(username='other', email='other@foodapp.vn')
+        self.address.user = other
+        self.address.save()
+        self.client.force_authenticate(other)
+        self.assertEqual(self.checkout(95000).status_code, 404)
+
+
+class MoneyMigrationTests(TransactionTestCase):
+    # 0012_money_integer: tiền lẻ (FloatField cũ) được làm tròn về đồng, tổng giỏ tính lại từ các dòng đã làm tròn
+
+    def migrate(self, name=None):
+        executor = MigrationExecutor(connection)
+        targets = [('app', name)] if name else executor.loader.graph.leaf_nodes('app')
+        executor.migrate(targets)
+        models = executor.loader.project_state(targets).apps
+        return lambda model: models.get_model('app', model).objects
+
+    def tearDown(self):
+        self.migrate()
+
+    def test_money_is_rounded_and_checkout_still_matches(self):
+        objects = self.migrate('0011_cart_updated_date')
+        customer = objects('User').create(username='user', email='user@foodapp.vn')
+        owner = objects('User').create(username='owner', email='owner@foodapp.vn')
+        restaurant = objects('Restaurant').create(name='Quán', owner=owner, shipping_fee=15000.4)
+        food = objects('Food').create(name='Phở', price=25000.4, restaurant=restaurant)
+        address = objects('MyAddress').create(user=customer, address='1 Lê Lợi')
+        cart = objects('Cart').create(user=customer, items_number=1, total_price=50000.8)
+        sub_cart = objects('SubCart').create(cart=cart, restaurant=restaurant, total_price=50000.8, total_quantity=2)
+        objects('SubCartItem').create(sub_cart=sub_cart, food=food, restaurant=restaurant, quantity=2, price=50000.8)
+        order = objects('Order').create(user=customer, restaurant=restaurant, shipping_fee=15000.4, total=65001.2)
+        objects('Payment').create(user=customer, order=order, amount=65001.2)
+        objects('OrderDetail').create(order=order, food=food, quantity=2, sub_total=50000.8)
+
+        objects = self.migrate('0012_money_integer')
+        self.assertEqual(list(objects('Food').values_list('price', flat=True)), [25000])
+        self.assertEqual(list(objects('Restaurant').values_list('shipping_fee', flat=True)), [15000])
+        self.assertEqual(list(objects('SubCartItem').values_list('price', flat=True)), [50001])
+        self.assertEqual(list(objects('SubCart').values_list('total_price', flat=True)), [50001])
+        self.assertEqual(list(objects('Cart').values_list('total_price', flat=True)), [50001])
+        self.assertEqual(list(objects('Order').values_list('shipping_fee', 'total')), [(15000, 65001)])
+        self.assertEqual(list(objects('Payment').values_list('amount', flat=True)), [65001])
+        self.assertEqual(list(objects('OrderDetail').values_list('sub_total', flat=True)), [50001])
+
+        # dòng giỏ làm tròn riêng (50001) lệch với 2 x giá đã làm tròn: checkout tính lại rồi thu đúng 2 x 25000 + ship
+        self.migrate()
+        client = APIClient()
+        client.force_authenticate(User.objects.get(id=customer.id))
+        data = {'sub_cart_id': sub_cart.id, 'address_id': address.id, 'shipping_fee': 15000, 'payment': 'cash'}
+        response = client.post('/order/', dict(data, total_price=65001))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['sub_cart']['total_price'], 50000)
+        self.assertEqual(client.post('/order/', dict(data, total_price=65000)).status_code, 200)
+        self.assertEqual(list(Order.objects.exclude(id=order.id).values_list('total', 'payment_detail__amount')),
+                         [(65000, 65000)])
+
+
+class SearchIndexSyncTests(TestCase):
+    # 2 SyncedIndex dùng chung 1 log = 2 worker: thay đổi ở worker này được worker kia áp dụng từng dòng, không build lại
+
+    def setUp(self):
+        cache.clear()
+        self.log = search_index.ChangeLog('test-index')
+        self.builds = 0
+        self.workers = [search_index.SyncedIndex(self.log, self.build, apply_change) for _ in range(2)]
+        owner = User.objects.create(username='owner', email='owner@foodapp.vn')
+        self.restaurant = Restaurant.objects.create(name='Quán', owner=owner)
+
+    def build(self):
+        self.builds += 1
+        return PrefixIndex.build()
+
+    def suggest(self, worker, text):
+        worker.checked_at = 0  # bỏ qua CHECK_INTERVAL
+        return [s['name'] for s in worker.get().search(text)]
+
+    def test_changes_are_applied_incrementally(self):
+        for worker in self.workers:
+            worker.get()
+        food = Food.objects.create(name='Cơm tấm sườn', price=30000, restaurant=self.restaurant)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.log.publish({'kind': 'food', 'id': food.id, 'name': food.name, 'weight': 0, 'visible': True})
+
+        self.assertEqual(self.suggest(self.workers[1], 'com tam'), ['Cơm tấm sườn'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.log.publish({'kind': 'food', 'id': food.id, 'name': food.name, 'weight': 0, 'visible': False})
+        self.assertEqual(self.suggest(self.workers[1], 'com tam'), [])
+        self.assertEqual(self.suggest(self.workers[0], 'com tam'), [])
+        self.assertEqual(self.builds, 2)
+
+    def test_rolled_back_change_is_not_applied(self):
+        worker = self.workers[0]
+        worker.get()
+        food = Food.objects.create(name='Cơm tấm sườn', price=30000, restaurant=self.restaurant)
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.log.publish({'kind': 'food', 'id': food.id, 'name': food.name, 'weight': 0,
+                                      'visible': True})
+                    raise DatabaseError
+            except DatabaseError:
+                pass
+        self.assertEqual(self.suggest(worker, 'com tam'), [])
+        self.assertEqual(self.log.position(), 0)
+
+    def test_missing_log_rebuilds_in_background(self):
+        worker = self.workers[0]
+        worker.get()
+        worker.position = 10  # log trong cache bị xoá: vị trí của worker vượt seq
+        worker.rebuild_in_background = lambda: setattr(worker, 'rebuild_requested', True)
+        self.suggest(worker, 'com')
+        self.assertTrue(worker.rebuild_requested)
+
+
+class SearchCacheTests(TestCase):
+    # kết quả search-food/ cache trong RAM từng worker bị xoá ở mọi worker khi món/nhà hàng đổi
+
+    def setUp(self):
+        cache.clear()
+        self.log = search_index.ChangeLog('test-search-cache')
+        store = search_cache.SearchCache
+        self.workers = [search_index.SyncedIndex(self.log, store, store.invalidate) for _ in range(2)]
+        owner = User.objects.create(username='owner', email='owner@foodapp.vn')
+        self.restaurant = Restaurant.objects.create(name='Quán', owner=owner)
+
+    def put(self, worker, query, restaurant_ids=()):
+        key = search_cache.cache_key(QueryDict(query))
+        worker.get().put(key, [query], restaurant_ids)
+        return key
+
+    def cached(self, worker, key):
+        worker.checked_at = 0  # bỏ qua CHECK_INTERVAL
+        return worker.get().get(key) is not None
+
+    def test_change_reaches_other_worker(self):
+        keys = [self.put(worker, 'name=cơm tấm') for worker in self.workers]
+        other = self.put(self.workers[1], 'name=phở')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.log.publish({'restaurant_ids': [self.restaurant.id], 'names': ['Cơm tấm sườn bì']})
+        self.assertFalse(self.cached(self.workers[0], keys[0]))
+        self.assertFalse(self.cached(self.workers[1], keys[1]))
+        self.assertTrue(self.cached(self.workers[1], other))
+
+    def test_fuzzy_terms_and_popularity(self):
+        worker = self.workers[0]
+        fuzzy_key = self.put(worker, 'name=com tamm&mode=fuzzy')
+        popular_key = self.put(worker, 'name=phở&sort=popular', [self.restaurant.id])
+        plain_key = self.put(worker, 'name=phở', [self.restaurant.id])
+        worker.get().invalidate({'restaurant_ids': [self.restaurant.id], 'popular': True})
+        self.assertFalse(self.cached(worker, popular_key))
+        self.assertTrue(self.cached(worker, plain_key))
+        worker.get().invalidate({'restaurant_ids': [], 'names': ['Cơm tấm']})
+        self.assertFalse(self.cached(worker, fuzzy_key))
+        self.assertTrue(self.cached(worker, plain_key))
+
+    def test_record_order_drops_popular_results(self):
+        food = Food.objects.create(name='Phở bò', price=40000, restaurant=self.restaurant)
+        search_cache.search_cache.get().clear()
+        key = search_cache.cache_key(QueryDict('name=phở&sort=popular'))
+        search_cache.put(key, [], [self.restaurant.id])
+        order = Order.objects.create(user=self.restaurant.owner, restaurant=self.restaurant)
+        OrderDetail.objects.create(order=order, food=food, quantity=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            popularity.record_order(order)
+        self.assertIsNone(search_cache.get(key))
+
+
+class FacetTests(TestCase):
+    # facet đang được lọc đếm như chưa lọc theo chính nó, các facet khác đếm theo toàn bộ bộ lọc
+
+    def setUp(self):
+        owner = User.objects.create(username='owner', email='owner@foodapp.vn')
+        restaurant = Restaurant.objects.create(name='Quán', owner=owner)
+        self.categories = [MainCategory.objects.create(name=name) for name in ('Cơm', 'Bún')]
+        FoodMainCategory.objects.all().delete()
+        for price, category in ((20000, 0), (40000, 0), (60000, 1)):
+            food = Food.objects.create(name='Món %d' % price, price=price, restaurant=restaurant)
+            FoodMainCategory.objects.get_or_create(food=food, main_category=self.categories[category])
+
+    def facets(self, query):
+        facets = compute_facets(Food.objects.all(), QueryDict(query))
+        categories = {c['value']: c['count'] for c in facets['main_category']}
+        return facets['count'], [p['count'] for p in facets['price'][:3]], \
+            [categories[c.id] for c in self.categories]
+
+    def test_own_filter_is_excluded(self):
+        self.assertEqual(self.facets(''), (3, [1, 1, 1], [2, 1]))
+        self.assertEqual(self.facets('price=0-30000'), (1, [1, 1, 1], [1, 0]))
+        query = 'price=0-30000&main_category=%d' % self.categories[1].id
+        self.assertEqual(self.facets(query), (0, [0, 0, 1], [1, 0]))
+
+
+@mock.patch.object(order_queue, 'SETTLE', timedelta(0))
+class OrderQueueTests(TestCase):
+    # tablet giữ hàng đợi đúng chỉ bằng các lần kéo delta theo cursor
+
+    def setUp(self):
+        owner = User.objects.create(username='owner', email='owner@foodapp.vn')
+        self.restaurant = Restaurant.objects.create(name='Quán', owner=owner)
+        customer = User.objects.create(username='user', email='user@foodapp.vn')
+        self.orders = [Order.objects.create(user=customer, restaurant=self.restaurant) for _ in range(3)]
+        self.client = APIClient()
+        self.client.force_authenticate(owner)
+
+    def pull(self, cursor=''):
+        response = self.client.get('/restaurants/%d/order-queue/' % self.restaurant.id, {'since': cursor})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_status_changes_reach_the_queue(self):
+        page = self.pull()
+        self.assertEqual([o['id'] for o in page['results']], [o.id for o in self.orders])
+
+        self.orders[0].delivery_status = OrderStatus.ACCEPT
+        self.orders[0].save()
+        self.orders[1].delivery_status = OrderStatus.DELIVERED
+        self.orders[1].save()
+        delta = self.pull(page['cursor'])
+        self.assertEqual([(o['id'], o['delivery_status']) for o in delta['results']],
+                         [(self.orders[0].id, OrderStatus.ACCEPT)])
+        self.assertEqual(delta['removed'], [self.orders[1].id])
+
+        self.assertEqual(self.pull(delta['cursor'])['results'], [])
+
+
+class UploadTests(TestCase):
+    # ảnh thật thay placeholder bằng UPDATE (không có post_save) vẫn phải đổi version snapshot nhà hàng
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        storage = override_settings(IMAGE_STORAGE_BACKEND='app.storage.LocalImageStorage',
+                                    LOCAL_IMAGE_ROOT=self.tmp.name, UPLOAD_STAGING_DIR=self.tmp.name)
+        storage.enable()
+        self.addCleanup(storage.disable)
+        cache.clear()
+        owner = User.objects.create(username='owner', email='owner@foodapp.vn')
+        placeholder = uploads.get_image_storage().placeholder
+        self.restaurant = Restaurant.objects.create(name='Quán', owner=owner, image=placeholder)
+        self.food = Food.objects.create(name='Phở', price=40000, restaurant=self.restaurant, image=placeholder)
+        self.client = APIClient()
+
+    def stage(self, instance):
+        path = os.path.join(self.tmp.name, 'staged.jpg')
+        Image.new('RGB', (8, 8)).save(path)
+        return PendingUpload.objects.create(model=instance._meta.label, object_id=instance.pk, field='image',
+                                            staged_path=path)
+
+    def etag(self):
+        response = self.client.get('/restaurants/%d/snapshot/' % self.restaurant.id)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def test_processed_upload_changes_snapshot_etag(self):
+        for instance in (self.restaurant, self.food):
+            before = self.etag()
+            pending = self.stage(instance)
+            with self.captureOnCommitCallbacks(execute=True):
+                uploads.process_upload(pending)
+            pending.refresh_from_db()
+            self.assertEqual(pending.status, UploadStatus.DONE)
+            self.assertNotEqual(self.etag(), before)
+
+
+class AvailabilityTests(TestCase):
+    # lịch phục vụ trong cache (available_ids) và điều kiện SQL (available_foods_q) phải cho cùng kết quả
+
+    def setUp(self):
+        cache.clear()
+        owner = User.objects.create(username='owner', email='owner@foodapp.vn')
+        self.restaurant = Restaurant.objects.create(name='Quán', owner=owner)
+        self.late = self.food('Cháo khuya', available_start=time(22, 0), available_end=time(2, 0))
+        self.morning = self.food('Phở sáng', serve_period=ServicePeriod.MORNING)
+        self.food('Trà đá')
+        self.food('Hết món', is_available=False)
+        self.menu = Menu.objects.create(name='Menu trưa', restaurant=self.restaurant, serve_period=ServicePeriod.NOON)
+
+    def food(self, name, **kwargs):
+        return Food.objects.create(name=name, price=30000, restaurant=self.restaurant, **kwargs)
+
+    def at(self, hour, minute=0, second=0):
+        return datetime(2024, 5, 1, hour, minute, second, tzinfo=zoneinfo.ZoneInfo('Asia/Ho_Chi_Minh'))
+
+    def serving(self, at):
+        food_ids, menu_ids = availability.available_ids(self.restaurant.id, at)
+        by_sql = set(Food.objects.filter(availability.available_foods_q(at)).values_list('id', flat=True))
+        self.assertEqual(set(food_ids), by_sql)
+        return {Food.objects.get(id=i).name for i in food_ids}, set(menu_ids)
+
+    def test_midnight_crossing_and_periods(self):
+        self.assertEqual(self.serving(self.at(23, 30)), ({'Cháo khuya', 'Trà đá'}, set()))
+        self.assertEqual(self.serving(self.at(0, 0)), ({'Cháo khuya', 'Trà đá'}, set()))
+        self.assertEqual(self.serving(self.at(1, 59)), ({'Cháo khuya', 'Trà đá'}, set()))
+        self.assertEqual(self.serving(self.at(2, 0)), ({'Trà đá'}, set()))
+        self.assertEqual(self.serving(self.at(6, 0)), ({'Phở sáng', 'Trà đá'}, set()))
+        self.assertEqual(self.serving(self.at(10, 30)), ({'Trà đá'}, {self.menu.id}))
+        self.assertEqual(self.serving(self.at(22, 0)), ({'Cháo khuya', 'Trà đá'}, set()))
+
+    def test_now_is_cached_until_next_boundary(self):
+        with mock.patch.object(availability.timezone, 'now', return_value=self.at(10, 29, 30)), \
+                mock.patch.object(availability.cache, 'set', wraps=availability.cache.set) as cache_set:
+            food_ids, _ = availability.available_ids(self.restaurant.id)
+            self.assertIn(self.morning.id, food_ids)
+        timeouts = {args[0]: args[2] for args, _ in cache_set.call_args_list}
+        self.assertEqual(timeouts[availability.now_key(self.restaurant.id)], 30)  # 10:30 là mốc kế tiếp
+
+    def test_food_change_invalidates_cached_schedule(self):
+        with mock.patch.object(availability.timezone, 'now', return_value=self.at(23, 0)):
+            self.assertIn(self.late.id, availability.available_ids(self.restaurant.id)[0])
+            self.late.is_available = False
+            self.late.save()
+            self.assertNotIn(self.late.id, availability.available_ids(self.restaurant.id)[0])
+
+
+class FeedTests(TestCase):
+    # món mới được worker ghi vào timeline người theo dõi (fan-out on write)
+
+    def setUp(self):
+        owner = User.objects.create(username='owner', email='owner@foodapp.vn')
+        self.restaurant = Restaurant.objects.create(name='Quán', owner=owner)
+        self.users = [User.objects.create(username='user%d' % i, email='user%d@foodapp.vn' % i) for i in range(3)]
+        self.restaurant.followers.add(*self.users[:2])
+
+    def publish(self, name='Phở'):
+        food = Food.objects.create(name=name, price=40000, restaurant=self.restaurant)
+        feed.publish(self.restaurant, food)
+        return food
+
+    def timeline(self, user):
+        return list(FeedItem.objects.filter(user=user).order_by('id').values_list('object_id', flat=True))
+
+    def test_fan_out_to_followers(self):
+        food = self.publish()
+        call_command('process_feed', stdout=StringIO())
+        self.assertEqual([self.timeline(user) for user in self.users], [[food.id], [food.id], []])
+        self.assertFalse(FeedJob.objects.exists())
+
+        results, has_more, _ = feed.timeline_page(self.users[0].id)
+        self.assertEqual([r['item']['id'] for r in results], [food.id])
+        self.assertFalse(has_more)
+
+    def test_fan_out_resumes_after_last_user(self):
+        food = self.publish()
+        job = FeedJob.objects.get()
+        job.last_user_id = self.users[0].id  # worker trước đã ghi xong follower đầu rồi chết
+        feed.run_job(job)
+        self.assertEqual([self.timeline(user) for user in self.users], [[], [food.id], []])
+
+    @mock.patch.object(feed, 'TRIM_SLACK', 2)
+    def test_timelines_are_trimmed_to_limit(self):
+        foods = [self.publish('Món %d' % i) for i in range(8)]
+        feed.process_feed_jobs()
+        user = self.users[0]
+        feed.trim_timelines([user.id], max_items=5)
+        self.assertEqual(self.timeline(user), [f.id for f in foods[3:]])  # giữ 5 dòng mới nhất
+        feed.trim_timelines([user.id], max_items=6)
+        self.assertEqual(len(self.timeline(user)), 5)  # chưa vượt quá max_items + TRIM_SLACK thì không xoá
+
+    def test_claimed_jobs_are_not_claimed_twice(self):
+        self.publish()
+        self.publish('Bún')
+        first = feed.claim_jobs(1)
+        second = feed.claim_jobs(10)
+        self.assertEqual(len(first), 1)
+        self.assertEqual([job.id for job in second], [FeedJob.objects.order_by('id').last().id])
+        self.assertEqual(feed.claim_jobs(10), [])
+
+        # worker nhận job rồi chết: quá CLAIM_TIMEOUT thì worker khác nhận lại
+        FeedJob.objects.filter(id=first[0].id).update(claimed_date=timezone.now() - feed.CLAIM_TIMEOUT * 2)
+        self.assertEqual([job.id for job in feed.claim_jobs(10)], [first[0].id])
+
+
+class ReorderTests(TestCase):
+    # "Đặt lại": món của đơn cũ vào giỏ theo giá hiện tại, bảng tần suất cộng dồn theo từng đơn
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='user', email='user@foodapp.vn')
+        owner = User.objects.create(username='owner', email='owner@foodapp.vn')
+        self.restaurant = Restaurant.objects.create(name='Quán', owner=owner)
+        self.pho = Food.objects.create(name='Phở', price=40000, restaurant=self.restaurant)
+        self.bun = Food.objects.create(name='Bún', price=35000, restaurant=self.restaurant)
+        self.order = Order.objects.create(user=self.user, restaurant=self.restaurant)
+        OrderDetail.objects.create(order=self.order, food=self.pho, quantity=2)
+        OrderDetail.objects.create(order=self.order, food=self.bun, quantity=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def lines(self):
+        return sorted(SubCartItem.objects.filter(sub_cart__cart__user=self.user)
+                      .values_list('food_id', 'quantity', 'price'))
+
+    def test_record_order_accumulates_stats(self):
+        reorder.record_order(self.order)
+        reorder.record_order(self.order)
+        self.assertEqual(sorted(UserFoodStat.objects.values_list('food_id', 'order_count', 'quantity')),
+                         [(self.pho.id, 2, 4), (self.bun.id, 2, 2)])
+
+    def test_reorder_uses_current_prices_and_skips_unavailable(self):
+        carts.get_cart_storage().add_item(self.user.id, self.pho, 1)
+        Food.objects.filter(id=self.pho.id).update(price=45000)
+        self.bun.is_available = False
+        self.bun.save()
+
+        response = self.client.post('/order/%d/reorder/' % self.order.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['skipped'], [self.bun.id])
+        self.assertEqual(self.lines(), [(self.pho.id, 3, 3 * 45000)])
+        self.assertEqual(Cart.objects.get(user=self.user).total_price, 3 * 45000)
+
+    def test_line_added_concurrently_does_not_raise(self):
+        # dòng giỏ được ghi sau lúc reorder đọc các dòng hiện có: bỏ qua thay vì IntegrityError
+        carts.get_cart_storage().add_item(self.user.id, self.bun, 1)
+        with mock.patch.object(SubCartItem.objects, 'select_for_update', return_value=SubCartItem.objects.none()):
+            sub_cart, skipped = reorder.reorder(self.user, self.order)
+        self.assertEqual(skipped, [])
+        self.assertEqual(self.lines(), sorted([(self.pho.id, 2, 80000), (self.bun.id, 1, 35000)]))
+        self.assertEqual(sub_cart.total_price, 80000 + 35000)
+
+
+class ProjectionTests(TestCase):
+    # ?fields=/?exclude= chỉ cắt field của serializer ngoài cùng, tên không tồn tại thì bỏ qua
+
+    def setUp(self):
+        owner = User.objects.create(username='owner', email='owner@foodapp.vn')
+        self.restaurant = Restaurant.objects.create(name='Quán', owner=owner, address='1 Lê Lợi')
+        self.category = RestaurantCategory.objects.create(name='Món nước', restaurant=self.restaurant)
+        self.client = APIClient()
+
+    def get(self, **params):
+        response = self.client.get('/restaurant_categories/%d/' % self.category.id, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_unknown_names_are_ignored(self):
+        self.assertEqual(self.get(fields='id,bogus'), {'id': self.category.id})
+        self.assertEqual(set(self.get(exclude='bogus')), {'id', 'name', 'restaurant'})
+        self.assertEqual(self.get(fields='bogus'), {})
+
+    def test_nested_serializer_keeps_its_fields(self):
+        data = self.get(fields='id,restaurant')
+        self.assertEqual(set(data), {'id', 'restaurant'})
+        self.assertEqual(set(data['restaurant']), {'id', 'name', 'image', 'address', 'shipping_fee'})
+
+        data = self.get(exclude='name')
+        self.assertEqual(set(data), {'id', 'restaurant'})
+        self.assertEqual(data['restaurant']['name'], 'Quán')
+
+        # truyền fields trực tiếp cũng không lan xuống serializer con
+        data = RestaurantCategorySerializer(self.category, fields=['restaurant']).data
+        self.assertEqual(set(data['restaurant']), {'id', 'name', 'image', 'address', 'shipping_fee'})
+
+    def test_fields_combined_with_exclude(self):
+        self.assertEqual(self.get(fields='id,name,restaurant', exclude='restaurant'),
+                         {'id': self.category.id, 'name': 'Món nước'})
+        self.assertEqual(self.get(fields='id,name', exclude='id,name'), {})
+
+    def test_list_queryset_drops_unused_relations(self):
+        request = mock.Mock(method='GET', query_params=QueryDict('fields=id,name,bogus'))
+        queryset = project_queryset(RestaurantCategory.objects.select_related('restaurant'),
+                                    RestaurantCategorySerializer, request)
+        self.assertFalse(queryset.query.select_related)
+        self.assertEqual(queryset.query.deferred_loading, ({'id', 'name'}, False))
+
+        response = self.client.get('/restaurant_categories/', {'fields': 'name', 'exclude': 'id'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [{'name': 'Món nước'}])
+
+
+class FollowersCountTests(TestCase):
+    # followers_count lưu trong DB: phải khớp bảng followers sau mọi add/remove/clear ở cả hai phía quan hệ
+
+    def setUp(self):
+        self.users = [User.objects.create(username='user%d' % i, email='user%d@foodapp.vn' % i) for i in range(3)]
+        self.restaurants = [Restaurant.objects.create(name='Quán %d' % i, owner=User.objects.create(
+            username='owner%d' % i, email='owner%d@foodapp.vn' % i)) for i in range(2)]
+
+    def counts(self):
+        for restaurant in self.restaurants:
+            restaurant.refresh_from_db(fields=['followers_count'])
+        return [restaurant.followers_count for restaurant in self.restaurants]
+
+    def test_add_remove_clear(self):
+        first, second = self.restaurants
+        first.followers.add(*self.users)
+        first.followers.add(self.users[0])  # đã theo dõi: không đếm 2 lần
+        self.assertEqual(self.counts(), [3, 0])
+
+        first.followers.remove(self.users[0], self.users[1])
+        first.followers.remove(self.users[1])  # không còn theo dõi
+        self.assertEqual(self.counts(), [1, 0])
+
+        second.followers.add(self.users[0])
+        first.followers.clear()
+        self.assertEqual(self.counts(), [0, 1])
+
+    def test_reverse_side(self):
+        user = self.users[0]
+        user.following_restaurants.add(*self.restaurants)
+        self.restaurants[0].followers.add(self.users[1])
+        self.assertEqual(self.counts(), [2, 1])
+
+        user.following_restaurants.remove(self.restaurants[1])
+        self.assertEqual(self.counts(), [2, 0])
+
+        user.following_restaurants.add(self.restaurants[1])
+        user.following_restaurants.clear()
+        self.assertEqual(self.counts(), [1, 0])
+
+        user.following_restaurants.clear()  # không còn gì để xoá
+        self.assertEqual(self.counts(), [1, 0])
+
+    def test_set_and_unfollow_drop_feed_items(self):
+        user, restaurant = self.users[0], self.restaurants[0]
+        user.following_restaurants.set(self.restaurants)
+        restaurant.followers.add(self.users[1])
+        FeedItem.objects.bulk_create([FeedItem(user=u, restaurant=r, kind=FeedKind.FOOD, object_id=1)
+                                      for u in self.users[:2] for r in self.restaurants])
+
+        restaurant.followers.set([self.users[1]])
+        self.assertEqual(self.counts(), [1, 1])
+        self.assertEqual(sorted(FeedItem.objects.values_list('user_id', 'restaurant_id')),
+                         [(user.id, self.restaurants[1].id)] + [(self.users[1].id, r.id) for r in self.restaurants])
+
+        self.users[1].following_restaurants.clear()
+        self.assertEqual(self.counts(), [0, 1])
+        self.assertEqual(list(FeedItem.objects.values_list('user_id', flat=True)), [user.id])
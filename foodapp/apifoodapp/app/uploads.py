@@ -0,0 +1,156 @@
+import logging
+import os
+import uuid
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import snapshot
+from .models import PendingUpload, UploadStatus, Restaurant, Food
+from .storage import get_image_storage
+
+logger = logging.getLogger('app.uploads')
+
+MAX_ATTEMPTS = 3
+CLAIM_TIMEOUT = timedelta(minutes=10)  # worker nhận ảnh rồi chết: sau thời gian này worker khác nhận lại
+
+
+def staging_dir():
+    path = getattr(settings, 'UPLOAD_STAGING_DIR', os.path.join(settings.BASE_DIR, 'uploads', 'staging'))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def stage_file(upload):
+    # Ghi file upload ra đĩa local, trả về đường dẫn
+    ext = os.path.splitext(upload.name)[1].lower() or '.jpg'
+    path = os.path.join(staging_dir(), uuid.uuid4().hex + ext)
+    with open(path, 'wb') as f:
+        for chunk in upload.chunks():
+            f.write(chunk)
+    return path
+
+
+def save_with_deferred_upload(serializer, field='image', **kwargs):
+    # Lưu bản ghi ngay với ảnh placeholder, ảnh thật được worker xử lý sau
+    upload = serializer.validated_data.get(field)
+    staged_path = None
+    if isinstance(upload, UploadedFile):
+        staged_path = stage_file(upload)
+        kwargs[field] = get_image_storage().placeholder
+
+    # ghi bản ghi và PendingUpload cùng 1 transaction: worker khoá dòng bản ghi trước khi gán ảnh
+    # nên luôn thấy PendingUpload mới hơn (xem process_upload)
+    with transaction.atomic():
+        instance = serializer.save(**kwargs)
+        if staged_path:
+            PendingUpload.objects.create(model=instance._meta.label, object_id=instance.pk, field=field,
+                                         staged_path=staged_path)
+    return instance
+
+
+class DeferredImageUploadMixin:
+    deferred_image_field = 'image'
+
+    def perform_create(self, serializer):
+        save_with_deferred_upload(serializer, self.deferred_image_field)
+
+    def perform_update(self, serializer):
+        save_with_deferred_upload(serializer, self.deferred_image_field)
+
+
+def discard_staged(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def newer_uploads(pending):
+    return PendingUpload.objects.filter(model=pending.model, object_id=pending.object_id, field=pending.field,
+                                        id__gt=pending.id)
+
+
+def mark(pending, status):
+    pending.status = status
+    pending.error = None
+    pending.save(update_fields=['status', 'error', 'updated_date'])
+
+
+def snapshot_restaurant(model, object_id):
+    # ảnh của nhà hàng và món nằm trong snapshot nhà hàng (app/snapshot.py)
+    if model is Restaurant:
+        return object_id
+    if model is Food:
+        return Food.objects.filter(pk=object_id).values_list('restaurant_id', flat=True).first()
+    return None
+
+
+def process_upload(pending):
+    # Ảnh mới nhất của (model, object_id, field) thắng: ảnh cũ hơn bị bỏ qua (SKIPPED), kể cả khi ảnh mới được
+    # upload trong lúc đang đẩy ảnh cũ lên storage
+    storage = get_image_storage()
+    model = apps.get_model(pending.model)
+
+    value = None
+    if newer_uploads(pending).exists():
+        mark(pending, UploadStatus.SKIPPED)
+    else:
+        value = storage.save(pending.staged_path, 'u%d_%s' % (pending.id, uuid.uuid4().hex[:8]))
+        with transaction.atomic():
+            # khoá dòng bản ghi rồi kiểm tra lại: request upload ảnh mới ghi bản ghi + PendingUpload trong 1 transaction
+            list(model.objects.select_for_update().filter(pk=pending.object_id).values_list('pk', flat=True))
+            if newer_uploads(pending).exists():
+                value = None
+                mark(pending, UploadStatus.SKIPPED)
+            else:
+                # chỉ thay nếu bản ghi vẫn đang giữ placeholder
+                updated = model.objects.filter(pk=pending.object_id, **{pending.field: storage.placeholder}) \
+                    .update(**{pending.field: value})
+                mark(pending, UploadStatus.DONE)
+                # UPDATE không gửi post_save: tự đổi version snapshot để client không giữ ảnh placeholder (304)
+                restaurant_id = snapshot_restaurant(model, pending.object_id) if updated else None
+                if restaurant_id is not None:
+                    transaction.on_commit(lambda: snapshot.bump_version(restaurant_id))
+
+    discard_staged(pending.staged_path)
+    return value
+
+
+def claim_uploads(limit):
+    # Nhận tối đa limit ảnh chờ (PENDING -> PROCESSING); SKIP LOCKED để nhiều worker chạy song song không nhận trùng
+    stale = timezone.now() - CLAIM_TIMEOUT
+    with transaction.atomic():
+        pending_uploads = list(PendingUpload.objects.select_for_update(skip_locked=True).filter(
+            Q(status=UploadStatus.PENDING) | Q(status=UploadStatus.PROCESSING, updated_date__lt=stale))
+            .order_by('id')[:limit])
+        PendingUpload.objects.filter(id__in=[p.id for p in pending_uploads]).update(
+            status=UploadStatus.PROCESSING, updated_date=timezone.now())
+    return pending_uploads
+
+
+def process_pending_uploads(limit=50):
+    done = failed = 0
+
+    for pending in claim_uploads(limit):
+        try:
+            process_upload(pending)
+            done += 1
+        except Exception as e:
+            logger.exception('Upload %s thất bại', pending)
+            pending.attempts += 1
+            pending.error = str(e)
+            pending.status = UploadStatus.PENDING
+            if pending.attempts >= MAX_ATTEMPTS:
+                pending.status = UploadStatus.FAILED
+                failed += 1
+            pending.save(update_fields=['attempts', 'error', 'status', 'updated_date'])
+            if pending.status == UploadStatus.FAILED:
+                discard_staged(pending.staged_path)
+
+    return done, failed
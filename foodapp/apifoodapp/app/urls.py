@@ -26,10 +26,14 @@ urlpatterns = [
     path('admin/', admin_site.urls),
     path('api/add-to-cart', views.AddItemToCart.as_view()),
     path('search-food/', views.SearchFoodView.as_view()),
+    path('autocomplete/', views.AutocompleteView.as_view(), name='autocomplete'),
     path('restaurant-foods/<int:restaurant_id>/foods/', views.RestaurantFoodsView.as_view(), name='restaurant-foods'),
     path('update-sub-cart-item/', views.UpdateItemToSubCart.as_view(), name='update-sub-cart-item'),
     path('follow-restaurant/<int:restaurant_id>/', views.FollowRestaurantAPIView.as_view(), name='follow-restaurant'),
     path('followed-restaurant/', views.FollowedRestaurantsAPIView.as_view(), name='followed-restaurants'),
-    path('momo-payment/', views.MomoPayment.as_view(), name='momo-payment')
+    path('feed/', views.HomeFeedView.as_view(), name='home-feed'),
+    path('trending/', views.TrendingFoodsView.as_view(), name='trending-foods'),
+    path('momo-payment/', views.MomoPayment.as_view(), name='momo-payment'),
+    path('metrics/', views.metrics, name='metrics'),
 
 ]
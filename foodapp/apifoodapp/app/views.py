@@ -4,9 +4,10 @@ import hmac
 import hashlib
 import requests
 
+from django.conf import settings
 from django.db import transaction
-from django.db.models import Sum, Count
-from django.db.models.functions import TruncDate
+from django.db.models import Sum, Count, BigIntegerField
+from django.db.models.functions import TruncDate, Cast
 from django.http import HttpResponse
 from rest_framework import viewsets, permissions, status, generics
 from rest_framework.generics import get_object_or_404
@@ -17,23 +18,86 @@ from django.core.mail import send_mail
 from rest_framework.decorators import action
 
 from .models import Restaurant, MainCategory, User, Food, Cart, SubCart, SubCartItem, RestaurantCategory, ServicePeriod, \
-    Menu, Order, OrderDetail, RestaurantAddress, MyAddress, Payment, OrderStatus, PaymentMethod, Comment, Review
+    Menu, Order, OrderDetail, RestaurantAddress, MyAddress, Payment, OrderStatus, PaymentMethod, Comment, Review, \
+    ACTIVE_ORDER_STATUSES
 
 from .serializers import RestaurantSerializer, MainCategorySerializer, UserSerializer, FoodSerializers, \
     RestaurantCategorySerializer, CartSerializer, SubCartItemSerializer, SubCartSerializer, FoodCreateSerializer, \
     CategoryCreateSerializer, MenuSerializer, OrderSerializer, OrderDetailSerializer, RestaurantAddressSerializer, \
-    MyAddressSerializer, RestaurantFollowers, CommentSerializer, ReviewSerializer, ClientMenuSerializer
+    MyAddressSerializer, RestaurantFollowers, CommentSerializer, ReviewSerializer, ClientMenuSerializer, \
+    UserSimpleSerializer, \
+    FoodValuesSerializer, RestaurantValuesSerializer, OrderValuesSerializer, ReviewValuesSerializer, Projection, \
+    project_queryset
 
 from rest_framework.decorators import action
 from rest_framework.parsers import MultiPartParser
+from rest_framework.renderers import BrowsableAPIRenderer
+from .renderers import FastJSONRenderer
 from .paginators import RestaurantPagination, MySubCartPagination
+from .metrics import registry
+from .media import image_urls
+from .uploads import DeferredImageUploadMixin, save_with_deferred_upload
+from .availability import available_ids, available_foods_q, available_menus_q, is_food_available
+from .categories import main_category_q
+from .facets import food_filters, get_facets, parse_float
+from . import snapshot, feed, popularity, reorder, autocomplete, fuzzy, search_cache, carts, order_queue
 
+ORDER_QUEUE_LIMIT = 50
 
-class UserViewSet(viewsets.ViewSet, generics.CreateAPIView,
+
+# ?available_now=1 -> chỉ trả về món/menu đang phục vụ ở thời điểm hiện tại
+def is_available_now(request):
+    return request.query_params.get('available_now') in ('1', 'true')
+
+
+# Bật đường nhanh cho trang danh sách: viewset khai báo values_serializer_class (xem ValuesSerializer)
+# và renderer_classes = FAST_RENDERER_CLASSES
+FAST_RENDERER_CLASSES = [FastJSONRenderer, BrowsableAPIRenderer]
+
+
+# ?fields= / ?exclude= (xem Projection): thu hẹp queryset theo các field client cần.
+# Chỉ cho list/retrieve, các action khác dùng get_object() cho việc riêng nên cần đủ cột
+class ProjectionMixin:
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action not in ('list', 'retrieve'):
+            return queryset
+        return project_queryset(queryset, self.get_serializer_class(), self.request)
+
+
+class ValuesListMixin(ProjectionMixin):
+    values_serializer_class = None
+
+    def get_values_serializer(self):
+        return self.values_serializer_class(projection=Projection.from_request(self.request))
+
+    def get_list_queryset(self, queryset):
+        queryset = self.filter_queryset(queryset)
+        if self.values_serializer_class is None:
+            return queryset
+        return self.get_values_serializer().values(queryset)
+
+    def get_list_data(self, rows):
+        if self.values_serializer_class is None:
+            return self.get_serializer(rows, many=True).data
+        return self.get_values_serializer().serialize(rows)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.get_list_queryset(self.get_queryset())
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_list_data(page))
+
+        return Response(self.get_list_data(queryset))
+
+
+class UserViewSet(DeferredImageUploadMixin, viewsets.ViewSet, generics.CreateAPIView,
                   generics.UpdateAPIView):
     queryset = User.objects.filter(is_active=True)
     serializer_class = UserSerializer
     parser_classes = [MultiPartParser, ]
+    deferred_image_field = 'avatar'
 
     def get_permissions(self):
         if self.action in ['get_current_user']:
@@ -50,7 +114,7 @@ class UserViewSet(viewsets.ViewSet, generics.CreateAPIView,
     #     return [permissions.AllowAny()]
 
 
-class MainCategoryViewSet(viewsets.ModelViewSet):
+class MainCategoryViewSet(DeferredImageUploadMixin, ProjectionMixin, viewsets.ModelViewSet):
     queryset = MainCategory.objects.filter(active=True)
     serializer_class = MainCategorySerializer
 
@@ -67,9 +131,11 @@ class MainCategoryViewSet(viewsets.ModelViewSet):
                         status=status.HTTP_200_OK)
 
 
-class RestaurantViewSet(viewsets.ModelViewSet):
+class RestaurantViewSet(DeferredImageUploadMixin, ValuesListMixin, viewsets.ModelViewSet):
     queryset = Restaurant.objects.all()
     serializer_class = RestaurantSerializer
+    values_serializer_class = RestaurantValuesSerializer
+    renderer_classes = FAST_RENDERER_CLASSES
     pagination_class = RestaurantPagination
 
     # permission_classes = [permissions.IsAuthenticated]
@@ -105,10 +171,13 @@ class RestaurantViewSet(viewsets.ModelViewSet):
     # 2API lấy danh sách các món ăn và các danh mục món ăn của nhà hàng
     @action(methods=['get'], url_path='foods', detail=True)
     def get_foods(self, request, pk):
-        foods = self.get_object().foods.select_related('category')
+        restaurant = self.get_object()
+        foods = restaurant.foods.select_related('category')
         q = request.query_params.get("q")
         if q:
             foods = foods.filter(name__icontains=q)
+        if is_available_now(request):
+            foods = foods.filter(id__in=available_ids(restaurant.id)[0])
 
         page = self.paginate_queryset(foods)
         if page is not None:
@@ -117,6 +186,18 @@ class RestaurantViewSet(viewsets.ModelViewSet):
 
         return Response(FoodSerializers(foods, many=True, context={'request': request}).data)
 
+    # Danh sách người theo dõi, phân trang (không trả cả danh sách id trong payload của nhà hàng nữa)
+    @action(methods=['get'], url_path='followers', detail=True)
+    def get_followers(self, request, pk):
+        restaurant = get_object_or_404(Restaurant.objects.only('id'), pk=pk)
+        followers = restaurant.followers.only('id', 'username', 'avatar').order_by('-id')
+
+        page = self.paginate_queryset(followers)
+        if page is not None:
+            return self.get_paginated_response(UserSimpleSerializer(page, many=True).data)
+
+        return Response(UserSimpleSerializer(followers, many=True).data)
+
     @action(methods=['get'], url_path='categories', detail=True)
     def get_categories(self, request, pk):
         categories = self.get_object().restaurant_categories.filter(active=True)
@@ -125,26 +206,56 @@ class RestaurantViewSet(viewsets.ModelViewSet):
             categories = categories.filter(name__icontains=q)
         page = self.paginate_queryset(categories)
         if page is not None:
-            s = RestaurantCategorySerializer(page, many=True)
+            s = RestaurantCategorySerializer(page, many=True, context={'request': request})
             return self.get_paginated_response(s.data)
 
-        return Response(RestaurantCategorySerializer(categories, many=True).data)
+        return Response(RestaurantCategorySerializer(categories, many=True, context={'request': request}).data)
 
     @action(methods=['get'], url_path='menus', detail=True)
     def get_menus(self, request, pk):
-        menus = self.get_object().menus.filter(active=True)
+        restaurant = self.get_object()
+        menus = restaurant.menus.filter(active=True)
         q = request.query_params.get("q")
         if q:
             menus = menus.filter(name__icontains=q)
-        return Response(MenuSerializer(menus, many=True).data)
+        if is_available_now(request):
+            menus = menus.filter(id__in=available_ids(restaurant.id)[1])
+        return Response(MenuSerializer(menus, many=True, context={'request': request}).data)
 
     @action(methods=['get'], url_path='client-menus', detail=True)
     def get_client_menus(self, request, pk):
-        menus = self.get_object().menus.filter(active=True)
+        restaurant = self.get_object()
+        menus = restaurant.menus.filter(active=True)
         q = request.query_params.get("q")
         if q:
             menus = menus.filter(name__icontains=q)
-        return Response(ClientMenuSerializer(menus, many=True).data)
+        if is_available_now(request):
+            # chỉ giữ menu và món đang phục vụ ở thời điểm hiện tại
+            food_ids, menu_ids = available_ids(restaurant.id)
+            menus = menus.filter(id__in=menu_ids).prefetch_related(
+                Prefetch('food', queryset=Food.objects.filter(id__in=food_ids)))
+        return Response(ClientMenuSerializer(menus, many=True, context={'request': request}).data)
+
+    # Toàn bộ màn hình nhà hàng trong 1 request: nhà hàng, danh mục, món (theo id, mỗi món 1 lần), menu (danh sách id món)
+    # Client gửi lại ETag (If-None-Match) để nhận 304 khi dữ liệu chưa đổi
+    @action(methods=['get'], url_path='snapshot', detail=True)
+    def get_snapshot(self, request, pk):
+        result = snapshot.get_snapshot(int(pk)) if pk.isdigit() else None
+        if result is None:
+            return Response({"error": "Nhà hàng không tồn tại."}, status=status.HTTP_404_NOT_FOUND)
+        version, bodies = result
+
+        etag = '"%s-%s"' % (pk, version)
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            encoding = snapshot.pick_encoding(request.headers.get('Accept-Encoding'), bodies)
+            response = HttpResponse(bodies[encoding], content_type='application/json; charset=utf-8')
+            if encoding != 'identity':
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        response['Vary'] = 'Accept-Encoding'
+        return response
 
     @action(methods=['get'], url_path='orders', detail=True)
     def get_order(self, request, pk):
@@ -156,11 +267,42 @@ class RestaurantViewSet(viewsets.ModelViewSet):
         )
         return Response(OrderSerializer(orders, many=True).data)
 
+    # Hàng đợi bếp: tablet gửi `since` (cursor nhận ở lần trước) để chỉ lấy các đơn mới/đổi trạng thái, xem app/order_queue.py
+    # /restaurants/{pk}/order-queue/?since=<cursor>&status=<trạng thái>&limit=<n>
+    @action(methods=['get'], url_path='order-queue', detail=True)
+    def get_order_queue(self, request, pk):
+        restaurant = self.get_object()
+        params = request.query_params
+
+        statuses = ACTIVE_ORDER_STATUSES
+        delivery_status = params.get('status')
+        if delivery_status:
+            if delivery_status not in ACTIVE_ORDER_STATUSES:
+                return Response({"error": "Trạng thái không hợp lệ."}, status=status.HTTP_400_BAD_REQUEST)
+            statuses = (delivery_status,)
+
+        try:
+            cursor = order_queue.parse_cursor(params.get('since'))
+            limit = max(1, min(int(params.get('limit', ORDER_QUEUE_LIMIT)), ORDER_QUEUE_LIMIT))
+        except ValueError:
+            return Response({"error": "since hoặc limit không hợp lệ."}, status=status.HTTP_400_BAD_REQUEST)
+
+        orders, removed, next_cursor, has_more = order_queue.queue_page(restaurant, statuses, cursor, limit)
+
+        return Response({
+            'cursor': next_cursor,
+            'has_more': has_more,
+            'results': OrderSerializer(orders, many=True).data,
+            'removed': removed,
+        }, status=status.HTTP_200_OK)
+
     @action(methods=['get'], url_path='food_report', detail=True)
     def get_food_report(self, request, pk):
         restaurant = self.get_object()
+        # SUM cột số nguyên: MySQL trả DECIMAL, ép về số nguyên để JSON ra số chứ không phải chuỗi
         food_report = OrderDetail.objects.filter(order__restaurant=restaurant).values('food__name').annotate(
-            total_sale=Sum('sub_total'), total_order=Count('food'), order_date=TruncDate('order__order_date'))
+            total_sale=Cast(Sum('sub_total'), BigIntegerField()), total_order=Count('food'),
+            order_date=TruncDate('order__order_date'))
         return Response(food_report)
 
     @action(methods=['get'], url_path='category_report', detail=True)
@@ -168,7 +310,8 @@ class RestaurantViewSet(viewsets.ModelViewSet):
         restaurant = self.get_object()
         category_report = OrderDetail.objects.filter(order__restaurant=restaurant).values(
             'food__category__name').annotate(
-            total_sale=Sum('sub_total'), total_order=Count('food'), order_date=TruncDate('order__order_date'))
+            total_sale=Cast(Sum('sub_total'), BigIntegerField()), total_order=Count('food'),
+            order_date=TruncDate('order__order_date'))
         return Response(category_report)
 
     def get_serializer_class(self):
@@ -182,8 +325,7 @@ class RestaurantViewSet(viewsets.ModelViewSet):
 
     # gửi mail cho flower khi thêm món ăn
     def send_email(self, restaurant, obj):
-        followers = restaurant.followers.all()
-        emails = [f.email for f in followers if f.email]
+        emails = list(restaurant.followers.exclude(email='').values_list('email', flat=True))
         newAbc = ''
 
         if isinstance(obj, Food):
@@ -218,8 +360,10 @@ class RestaurantViewSet(viewsets.ModelViewSet):
         )
 
         if serializer.is_valid():
-            food = serializer.save(restaurant=restaurant)
+            # ảnh được lưu tạm và upload nền (process_uploads), không chờ Cloudinary trong request
+            food = save_with_deferred_upload(serializer, 'image', restaurant=restaurant)
             self.send_email(restaurant, food)
+            feed.publish(restaurant, food)
             return Response(FoodSerializers(food, context={'request': request}).data, status=status.HTTP_201_CREATED)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -252,47 +396,36 @@ class RestaurantViewSet(viewsets.ModelViewSet):
         if serializer.is_valid():
             menu = serializer.save(restaurant=restaurant)
             self.send_email(restaurant, menu)
+            feed.publish(restaurant, menu)
             return Response(MenuSerializer(menu, context={'request': request}).data,
                             status=status.HTTP_201_CREATED)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class FoodViewSet(viewsets.ModelViewSet):
+class FoodViewSet(DeferredImageUploadMixin, ValuesListMixin, viewsets.ModelViewSet):
     queryset = Food.objects.all()
     serializer_class = FoodSerializers
+    values_serializer_class = FoodValuesSerializer
+    renderer_classes = FAST_RENDERER_CLASSES
     pagination_class = RestaurantPagination
     print(ServicePeriod.choices)
 
     def get_queryset(self):
-        queryset = self.queryset
         params = self.request.query_params
-
-        name = params.get('name', '').strip()
-        min_price = params.get('min_price')
-        max_price = params.get('max_price')
-        main_category = params.get('main_category', '').strip()  # send the name of main category: string
-        restaurant = params.get('restaurant', '').strip()  # send restaurant_name
-        # Sử dụng Q object to combine query conditions
-        filters = Q()
-
-        if name:
-            # queryset = queryset.filter(name__icontains=name)     .filter() is a query,
-            filters &= Q(name__icontains=name)  # instead òf that, use Q() to filter conditions
-            # After all, we are only using 1 query for all conditions
-
-        if min_price and max_price:
-            filters &= Q(price__gte=min_price, price__lte=max_price)
-
-        if main_category:
-            filters &= Q(name__icontains=main_category)
-
-        if restaurant:
-            filters &= Q(restaurant__name__icontains=restaurant)
-
-        queryset = queryset.filter(filters)  # 1 query:))
+        # toàn bộ điều kiện lọc gom vào 1 Q (xem app/facets.py), 1 query:))
+        queryset = self.queryset.filter(food_filters(params))
+        if params.get('sort') == 'popular':
+            queryset = queryset.order_by('-popularity', 'id')
         return queryset
 
+    # ?facets=1: trả thêm số món theo từng facet (giá, buổi, danh mục chính, nhà hàng, sao, còn bán) với cùng bộ lọc
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if request.query_params.get('facets') in ('1', 'true') and isinstance(response.data, dict):
+            response.data['facets'] = get_facets(self.queryset, request.query_params)
+        return response
+
     @action(methods=['post'], detail=True)
     def set_status_food(self, request, pk):
         try:
@@ -311,7 +444,7 @@ class FoodViewSet(viewsets.ModelViewSet):
         return Response(ReviewSerializer(reviews, many=True).data)
 
 
-class RestaurantCategoryViewSet(viewsets.ModelViewSet):
+class RestaurantCategoryViewSet(ProjectionMixin, viewsets.ModelViewSet):
     queryset = RestaurantCategory.objects.filter(active=True)
     serializer_class = RestaurantCategorySerializer
     pagination_class = RestaurantPagination
@@ -322,10 +455,21 @@ class RestaurantCategoryViewSet(viewsets.ModelViewSet):
         return Response(FoodSerializers(foods, many=True).data)
 
 
-class CartViewSet(viewsets.ViewSet, generics.DestroyAPIView):
+class CartStorageMixin:
+    # CART_STORAGE_BACKEND = CacheCartStorage: ghi giỏ hàng trong cache của user xuống DB trước khi API đọc/sửa bảng
+    skip_cart_flush = ()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.user.is_authenticated and self.action not in self.skip_cart_flush:
+            carts.get_cart_storage().flush(request.user.id)
+
+
+class CartViewSet(CartStorageMixin, viewsets.ViewSet, generics.DestroyAPIView):
     serializer_class = CartSerializer
     queryset = Cart.objects.all()
     permission_classes = [permissions.IsAuthenticated]
+    skip_cart_flush = ('get_badge',)
 
     @action(methods=['get'], url_path='my-cart', detail=False)
     def get_my_cart(self, request):
@@ -337,7 +481,12 @@ class CartViewSet(viewsets.ViewSet, generics.DestroyAPIView):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        return Response(CartSerializer(cart).data)
+        return Response(CartSerializer(cart, context={'request': request}).data)
+
+    # Số hiển thị trên icon giỏ hàng: {'items_number', 'total_price'} từ bộ đếm có sẵn, cache theo user
+    @action(methods=['get'], url_path='badge', detail=False)
+    def get_badge(self, request):
+        return Response(carts.get_cart_storage().badge(request.user.id), status=status.HTTP_200_OK)
 
     @action(methods=['get'], url_path='sub-carts', detail=False)
     def get_my_sub_cart(self, request):
@@ -357,21 +506,32 @@ class CartViewSet(viewsets.ViewSet, generics.DestroyAPIView):
         return paginator.get_paginated_response(serializer.data)
 
     def get_permissions(self):
-        if self.action in ['get_my_cart']:
+        if self.action in ['get_my_cart', 'get_badge']:
             return [permissions.IsAuthenticated()]
         return [permissions.AllowAny()]
 
+    def perform_destroy(self, instance):
+        instance.delete()
+        carts.invalidate_badge(instance.user_id)
+        carts.get_cart_storage().forget(instance.user_id)
+
 
-class SubCartViewSet(viewsets.ModelViewSet):
+class SubCartViewSet(CartStorageMixin, viewsets.ModelViewSet):
     serializer_class = SubCartSerializer
     queryset = SubCart.objects.all()
 
+    def perform_destroy(self, instance):
+        cart = instance.cart
+        instance.delete()
+        carts.refresh_totals(cart, [])
+
     @action(methods=['get'], url_path='restaurant-sub-cart', detail=False)
     def get_sub_cart(self, request):
         restaurant_id = request.query_params.get('restaurantId')
         user_id = request.query_params.get('userId')
 
         cart = get_object_or_404(Cart, user__id=user_id)
+        carts.get_cart_storage().flush(cart.user_id)
         sub_cart = SubCart.objects.filter(cart__id=cart.id, restaurant__id=restaurant_id).first()
 
         if not sub_cart:
@@ -379,30 +539,24 @@ class SubCartViewSet(viewsets.ModelViewSet):
 
         return Response(SubCartSerializer(sub_cart).data)
 
-    @action(methods=['post'], url_path='delete-sub-carts', detail=False)
+    # Xoá nhiều sub cart trong giỏ của người gọi: {"ids": [...]}; items_number/total_price tính lại trong SQL
+    @action(methods=['post'], url_path='delete-sub-carts', detail=False,
+            permission_classes=[permissions.IsAuthenticated])
     def delete_multiple(self, request):
-        cart_id = request.data.get('cartId')
-        items_number = request.data.get('itemsNumber')
-        ids = request.data.get('ids', [])
-
-        print(request.data)
-        print(cart_id)
-        print(items_number)
-        print(ids)
-
-        cart = get_object_or_404(Cart, pk=cart_id)
-
-        if ids:
-            ids = [int(id) for id in ids]
-            SubCart.objects.filter(id__in=ids).delete()
+        try:
+            ids = [int(i) for i in request.data.get('ids', [])]
+        except (TypeError, ValueError):
+            return Response({"error": "Tham số không hợp lệ."}, status=status.HTTP_400_BAD_REQUEST)
 
-        cart.items_number -= items_number
-        cart.save()
+        cart = Cart.objects.filter(user=request.user).first()
+        cart_id = request.data.get('cartId')  # app cũ vẫn gửi cartId, phải đúng giỏ của người gọi
+        if cart is None or (cart_id is not None and str(cart_id) != str(cart.id)):
+            return Response({"error": "Giỏ hàng không tồn tại."}, status=status.HTTP_404_NOT_FOUND)
 
-        if cart.items_number == 0:
-            cart.delete()
+        cart = carts.delete_sub_carts(cart, ids)
 
-        return Response({"message": "Xóa sub cart thành công!"}, status=status.HTTP_200_OK)
+        return Response({"message": "Xóa sub cart thành công!", "items_number": cart.items_number,
+                         "total_price": cart.total_price}, status=status.HTTP_200_OK)
 
 
 class MyAddressViewSet(viewsets.ModelViewSet):
@@ -440,7 +594,7 @@ class MyAddressViewSet(viewsets.ModelViewSet):
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-class SubCartItemViewSet(viewsets.ModelViewSet):
+class SubCartItemViewSet(CartStorageMixin, viewsets.ModelViewSet):
     serializer_class = SubCartItemSerializer
     queryset = SubCartItem.objects.all()
 
@@ -454,6 +608,15 @@ class SubCartItemViewSet(viewsets.ModelViewSet):
 
         return Response(serializer.data)
 
+    def perform_update(self, serializer):
+        item = serializer.save()
+        carts.refresh_totals(item.sub_cart.cart, [item.sub_cart_id])
+
+    def perform_destroy(self, instance):
+        cart = instance.sub_cart.cart
+        instance.delete()
+        carts.refresh_totals(cart, [instance.sub_cart_id])
+
 
 class AddItemToCart(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -465,72 +628,45 @@ class AddItemToCart(APIView):
         note = request.data.get('note', '')
 
         food = get_object_or_404(Food, id=food_id)
-        restaurant = food.restaurant
-        price = food.price
-
-        print('food name: ', food.name)
-        print('quantity: ', quantity)
 
-        cart, created = Cart.objects.get_or_create(user=user)
+        if not is_food_available(food):
+            return Response({"error": "Món ăn hiện không phục vụ."}, status=status.HTTP_400_BAD_REQUEST)
 
-        sub_cart, created = SubCart.objects.get_or_create(cart=cart, restaurant=restaurant)
-        # them hoac cap nhat
-        sub_cart_item, created = SubCartItem.objects.get_or_create(
-            food=food, sub_cart=sub_cart,
-            defaults={'restaurant': restaurant,
-                      'quantity': quantity,
-                      'price': price * quantity,
-                      'note': note}
-        )
-        if not created:
-            sub_cart_item.quantity += quantity
-            print('sub cart item quantity: ', sub_cart_item.quantity)
-            sub_cart_item.price = sub_cart_item.quantity * price
-            print('sub cart item price: ', sub_cart_item.price)
-            sub_cart_item.save()
-
-        total_price = sum(item.price for item in sub_cart.sub_cart_items.all())
-        total_quantity = sum(item.quantity for item in sub_cart.sub_cart_items.all())
-        sub_cart.total_price = total_price
-        sub_cart.total_quantity = total_quantity
-        sub_cart.save()
-
-        items_number = cart.sub_carts.all().count()
-        cart.items_number = items_number
-        cart.save()
+        # ghi vào DB hoặc cache tuỳ CART_STORAGE_BACKEND (app/carts.py)
+        cart = carts.get_cart_storage().add_item(user.id, food, quantity, note)
+        cart.user = user
 
         return Response({'message': 'Thêm thành công!', 'cart': CartSerializer(cart).data}
                         , status=status.HTTP_200_OK)
 
 
 class UpdateItemToSubCart(APIView):
+    permission_classes = [permissions.IsAuthenticated]
 
     def patch(self, request, *args, **kwargs):
         sub_cart_item_id = int(request.data.get('sub_cart_item_id'))
         quantity = int(request.data.get('quantity'))
 
-        sub_cart_item = get_object_or_404(SubCartItem, id=sub_cart_item_id)
-
-        food = sub_cart_item.food
-        price = food.price
-        sub_cart = sub_cart_item.sub_cart
-
-        sub_cart_item.quantity += quantity
-        sub_cart_item.price += quantity * price
+        # chỉ sửa được món trong giỏ của chính mình, id của người khác trả 404
+        sub_cart_item = get_object_or_404(SubCartItem.objects.select_related('food'),
+                                          id=sub_cart_item_id, sub_cart__cart__user=request.user)
 
-        sub_cart.total_quantity += quantity
-        sub_cart.total_price += quantity * price
-
-        sub_cart_item.save()
-        sub_cart.save()
+        # id món lấy từ các API đọc giỏ (đã flush xuống DB), số lượng thì cộng vào bản đang dùng (DB hoặc cache)
+        carts.get_cart_storage().add_item(request.user.id, sub_cart_item.food, quantity)
 
         return Response({"message": "Cập nhật thành công."}, status=status.HTTP_200_OK)
 
 
-class MenuViewSet(viewsets.ModelViewSet):
+class MenuViewSet(ProjectionMixin, viewsets.ModelViewSet):
     queryset = Menu.objects.filter(active=True)
     serializer_class = MenuSerializer
 
+    def get_queryset(self):
+        queryset = self.queryset
+        if self.action == 'list' and is_available_now(self.request):
+            queryset = queryset.filter(available_menus_q())
+        return queryset
+
 
 class OrderRestaurantViewSet(viewsets.ModelViewSet):
     queryset = Order.objects.prefetch_related(
@@ -559,35 +695,59 @@ class SearchFoodView(APIView):
 
         params = request.query_params
 
+        # từ khoá phổ biến trả thẳng từ cache trong RAM (app/search_cache.py)
+        key = search_cache.cache_key(params)
+        cached = search_cache.get(key)
+        if cached is not None:
+            return Response(cached, status=status.HTTP_200_OK)
+
         name = params.get('name', '').strip()
-        min_price = params.get('min_price')
-        max_price = params.get('max_price')
-        main_categories = params.getlist('main_category')  # send the name of main category: string
+        min_price = parse_float(params.get('min_price'))
+        max_price = parse_float(params.get('max_price'))
+        main_categories = params.getlist('main_category')  # id hoặc tên danh mục chính
         restaurant = params.get('restaurant', '').strip()  # send restaurant_name
 
         food_query = Food.objects.filter(is_available=True)
 
         filters = Q()
 
-        if name:
+        # ?mode=fuzzy: khớp gần đúng (sai chính tả, không dấu) qua chỉ mục trigram, xếp nhà hàng theo điểm khớp
+        scores = None
+        if name and params.get('mode') == 'fuzzy':
+            scores = dict(fuzzy.search_restaurants(name))
+            filters |= Q(restaurant_id__in=list(scores))
+            food_scores = dict(fuzzy.search_foods(name))
+            filters |= Q(id__in=list(food_scores))
+            for food_id, restaurant_id in Food.objects.filter(id__in=list(food_scores)) \
+                    .values_list('id', 'restaurant_id'):
+                scores[restaurant_id] = max(scores.get(restaurant_id, 0), food_scores[food_id])
+        elif name:
             # filters &= Q(name__icontains=name, restaurant__name__icontains=name)
             filters |= Q(name__icontains=name) | Q(restaurant__name__icontains=name)
-        if min_price and max_price:
-            filters &= Q(price__gte=min_price, price__lte=max_price)
+        # min_price / max_price dùng được riêng lẻ
+        if min_price is not None:
+            filters &= Q(price__gte=min_price)
+        if max_price is not None:
+            filters &= Q(price__lte=max_price)
 
         if main_categories:
-            # Duyệt qua từng giá trị trong mảng main_categories
-            category_filters = Q()
-            for c in main_categories:
-                category_filters |= Q(name__icontains=c)  # Hoặc field phù hợp
-            filters &= category_filters
+            filters &= main_category_q(main_categories)
 
         if restaurant:
             filters &= Q(restaurant__name__icontains=restaurant)
             filters |= Q(name__icontains=name) | Q(restaurant__name__icontains=restaurant)
 
+        if is_available_now(request):
+            filters &= available_foods_q()
+
         food_query = food_query.filter(filters)
 
+        # ?sort=popular: nhà hàng và món trong mỗi nhà hàng xếp theo điểm bán chạy
+        restaurant_order = ()
+        if params.get('sort') == 'popular':
+            food_query = food_query.order_by('-popularity', 'id')
+            restaurant_order = ('-popularity', 'id')
+
         # Lấy ra danh sách các nhà hàng có food chứa keyword, mỗi nhà hàng chỉ lấy 2 bản ghi food chứa keyword
         # sử dụng prefetch_related để tối ưu hiệu suất truy vấn, tránh vấn đề queries N+1, lucs này chỉ cần 2 câu query
         restaurants = Restaurant.objects.prefetch_related(
@@ -596,25 +756,29 @@ class SearchFoodView(APIView):
                 queryset=food_query[:2],
                 to_attr='filtered_foods'
             )
-        ).filter(foods__in=food_query).distinct()
+        ).filter(foods__in=food_query).distinct().order_by(*restaurant_order)
+
+        if scores is not None and not restaurant_order:
+            restaurants = sorted(restaurants, key=lambda r: -scores.get(r.id, 0))
 
         response_data = [
             {
                 'id': restaurant.id,
                 'restaurant': restaurant.name,
-                'image': restaurant.image.url if restaurant.image else None,
+                'image': image_urls(restaurant.image),
                 'items': [
                     {
                         'id': food.id,
                         'name': food.name,
-                        'price': f'{food.price:,.0f}đ',
-                        'image': food.image.url if food.image else None,
+                        'price': f'{food.price:,}đ',
+                        'image': image_urls(food.image),
                     }
                     for food in restaurant.filtered_foods
                 ],
             }
             for restaurant in restaurants
         ]
+        search_cache.put(key, response_data, [r['id'] for r in response_data])
         return Response(response_data, status=status.HTTP_200_OK)
 
 
@@ -623,6 +787,8 @@ class RestaurantFoodsView(APIView):
         try:
             restaurant = Restaurant.objects.get(id=restaurant_id)
             foods = restaurant.foods.all()
+            if is_available_now(request):
+                foods = foods.filter(id__in=available_ids(restaurant.id)[0])
             serializer = FoodSerializers(foods, many=True)
             return Response(serializer.data, status=status.HTTP_200_OK)
         except Restaurant.DoesNotExist:
@@ -689,9 +855,11 @@ class MomoPayment(APIView):
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(ValuesListMixin, viewsets.ModelViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
+    values_serializer_class = OrderValuesSerializer
+    renderer_classes = FAST_RENDERER_CLASSES
     permission_classes = [permissions.IsAuthenticated]
 
     def list(self, request, *args, **kwargs):
@@ -703,19 +871,50 @@ class OrderViewSet(viewsets.ModelViewSet):
         if delivery_status:
             filters = Q(delivery_status=delivery_status)
 
-        orders = orders.filter(filters).order_by("-id")
+        orders = self.get_list_queryset(orders.filter(filters).order_by("-id"))
 
-        serializer = self.get_serializer(orders, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(self.get_list_data(orders), status=status.HTTP_200_OK)
+
+    # Các món user hay đặt nhất (bảng tần suất UserFoodStat), kèm giá và trạng thái hiện tại
+    @action(methods=['get'], url_path='frequent-foods', detail=False)
+    def get_frequent_foods(self, request):
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 50)
+        except ValueError:
+            return Response({"error": "Tham số không hợp lệ."}, status=status.HTTP_400_BAD_REQUEST)
+
+        stats = list(reorder.frequent_foods(request.user, limit))
+        foods = {row['id']: feed.food_row(row) for row in Food.objects.filter(id__in=[s['food'] for s in stats])
+                 .values(*feed.FOOD_FIELDS)}
+
+        return Response([
+            dict(foods[s['food']], order_count=s['order_count'], quantity=s['quantity'],
+                 last_ordered=s['last_ordered'])
+            for s in stats if s['food'] in foods
+        ], status=status.HTTP_200_OK)
+
+    # Đặt lại: thêm toàn bộ món của đơn cũ vào giỏ hàng (giá hiện tại) trong 1 request
+    @action(methods=['post'], url_path='reorder', detail=True)
+    def reorder_order(self, request, pk):
+        order = get_object_or_404(Order, pk=pk, user=request.user)
+
+        carts.get_cart_storage().flush(request.user.id)
+        sub_cart, skipped = reorder.reorder(request.user, order)
+        if sub_cart is None:
+            return Response({"error": "Các món trong đơn hiện không còn phục vụ.", "skipped": skipped},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({'message': 'Thêm thành công!', 'skipped': skipped,
+                         'sub_cart': SubCartSerializer(sub_cart).data}, status=status.HTTP_200_OK)
 
     def create(self, request, *args, **kwargs):
         user = request.user
         sub_cart_id = int(request.data.get('sub_cart_id'))
         address_id = int(request.data.get('address_id'))
         # shipping_address = request.data.get('address')
-        shipping_fee = float(request.data.get('shipping_fee'))
+        shipping_fee = round(float(request.data.get('shipping_fee')))  # tiền lưu số nguyên đồng
 
-        total = float(request.data.get('total_price'))  # da bao gom phi ship
+        total = round(float(request.data.get('total_price')))  # da bao gom phi ship
         payment_method = request.data.get('payment')
         is_successful = False
 
@@ -725,33 +924,54 @@ class OrderViewSet(viewsets.ModelViewSet):
             payment_method = PaymentMethod.MOMO
             is_successful = True
 
-        shipping_address = get_object_or_404(MyAddress, id=address_id)
-        sub_cart = get_object_or_404(SubCart, id=sub_cart_id)
+        shipping_address = get_object_or_404(MyAddress, id=address_id, user=user)
+        carts.get_cart_storage().flush(user.id)
+        sub_cart = get_object_or_404(SubCart.objects.select_related('cart'), id=sub_cart_id, cart__user=user)
 
         cart = sub_cart.cart
 
         try:
             with transaction.atomic():
-                order = Order.objects.create(user=user, restaurant=sub_cart.restaurant,
+                # khoá các dòng của sub cart (và món) rồi so với giá hiện tại trong cùng transaction với đơn hàng:
+                # sửa giá song song phải chờ đơn này xong
+                rows, stale = carts.verify_prices(sub_cart)
+                if not rows:
+                    return Response({"error": "Giỏ hàng trống."}, status=status.HTTP_400_BAD_REQUEST)
+                if stale:
+                    carts.reprice_sub_cart(sub_cart)
+                    sub_cart.refresh_from_db(fields=['total_price', 'total_quantity'])
+                    return Response({"error": "Giá một số món đã thay đổi, vui lòng kiểm tra lại giỏ hàng.",
+                                     "foods": [row['food_id'] for row in stale],
+                                     "sub_cart": SubCartSerializer(sub_cart).data}, status=status.HTTP_409_CONFLICT)
+
+                # số tiền thu tính từ các dòng đã kiểm tra, tổng client gửi lên chỉ dùng để đối chiếu
+                expected = sum(row['price'] for row in rows) + shipping_fee
+                if total != expected:
+                    return Response({"error": "Tổng tiền không khớp với giỏ hàng, vui lòng kiểm tra lại.",
+                                     "total_price": expected}, status=status.HTTP_409_CONFLICT)
+
+                order = Order.objects.create(user=user, restaurant_id=sub_cart.restaurant_id,
                                              shipping_address=shipping_address,
                                              shipping_fee=shipping_fee,
-                                             total=total,
+                                             total=expected,
                                              delivery_status=OrderStatus.PENDING)
 
                 Payment.objects.create(user=user, order=order,
                                        created_date=datetime.now,
-                                       amount=total, payment_method=payment_method,
+                                       amount=expected, payment_method=payment_method,
                                        is_successful=is_successful)
 
-                for s in sub_cart.sub_cart_items.all():
-                    OrderDetail.objects.create(food=s.food, order=order,
-                                               quantity=s.quantity,
-                                               sub_total=s.price)
+                OrderDetail.objects.bulk_create([
+                    OrderDetail(food_id=row['food_id'], order=order, quantity=row['quantity'], sub_total=row['price'])
+                    for row in rows
+                ])
+                popularity.record_order(order)
+                reorder.record_order(order)
 
                 sub_cart.delete()
-                cart.items_number -= 1
+                carts.refresh_totals(cart, [])
+                cart.refresh_from_db(fields=['items_number', 'total_price'])
 
-                cart.save()
                 if cart.items_number == 0:
                     cart.delete()
 
@@ -887,14 +1107,19 @@ class FollowRestaurantAPIView(APIView):
         restaurant = get_object_or_404(Restaurant, id=restaurant_id)
         user = request.user
 
-        if restaurant.followers.filter(id=user.id).exists():
-            restaurant.followers.remove(user)
-            return Response({"message": "Hủy theo dõi thành công", "following": False}, status=status.HTTP_200_OK)
-        else:
-            # Nếu chưa theo dõi, thêm vào danh sách
-            restaurant.followers.add(user)
-            print('fol', restaurant.followers)
-            return Response({"message": "Theo dõi thành công", "following": True}, status=status.HTTP_200_OK)
+        # followers_count được signal m2m_changed cập nhật trong cùng transaction
+        with transaction.atomic():
+            if restaurant.followers.filter(id=user.id).exists():
+                restaurant.followers.remove(user)
+                message, following = "Hủy theo dõi thành công", False
+            else:
+                # Nếu chưa theo dõi, thêm vào danh sách
+                restaurant.followers.add(user)
+                message, following = "Theo dõi thành công", True
+
+        restaurant.refresh_from_db(fields=['followers_count'])
+        return Response({"message": message, "following": following, "followers_count": restaurant.followers_count},
+                        status=status.HTTP_200_OK)
 
     def get(self, request, restaurant_id):
         restaurant = get_object_or_404(Restaurant, id=restaurant_id)
@@ -906,6 +1131,79 @@ class FollowRestaurantAPIView(APIView):
         return Response(serializer.data)
 
 
+# Trang chủ: món/menu mới của các nhà hàng đang theo dõi (timeline ghi sẵn) xen với món phổ biến gần đây
+# /feed/?cursor=<id dòng cuối>&limit=<n>&lat=&lng= (không gửi lat/lng thì lấy theo địa chỉ của user)
+class HomeFeedView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        user = request.user
+        params = request.query_params
+
+        try:
+            cursor = int(params.get('cursor', 0))
+            limit = min(int(params.get('limit', feed.FEED_PAGE_SIZE)), feed.FEED_MAX_PAGE_SIZE)
+            lat = float(params['lat']) if params.get('lat') else None
+            lng = float(params['lng']) if params.get('lng') else None
+        except ValueError:
+            return Response({"error": "Tham số không hợp lệ."}, status=status.HTTP_400_BAD_REQUEST)
+        if limit <= 0:
+            return Response({"error": "Tham số không hợp lệ."}, status=status.HTTP_400_BAD_REQUEST)
+
+        results, has_more, next_cursor = feed.timeline_page(user.id, cursor, limit)
+
+        if not cursor:
+            # chỉ trang đầu mới chèn món phổ biến, các trang sau đọc tiếp timeline theo cursor
+            if lat is None or lng is None:
+                address = user.my_addresses.filter(latitude__isnull=False, longitude__isnull=False) \
+                    .values('latitude', 'longitude').first()
+                if address:
+                    lat, lng = address['latitude'], address['longitude']
+            if lat is not None and lng is not None:
+                results = feed.merge(results, feed.popular_nearby(lat, lng))
+
+        return Response({
+            'cursor': next_cursor,
+            'has_more': has_more,
+            'results': results,
+        }, status=status.HTTP_200_OK)
+
+
+# Món đang bán chạy (điểm có suy giảm theo thời gian), đọc top-K có sẵn trong cache
+# /trending/?main_category=<id>&lat=&lng=&limit=<n> (lat/lng: chỉ lấy nhà hàng cùng khu vực ~5km)
+class TrendingFoodsView(APIView):
+    def get(self, request):
+        params = request.query_params
+        try:
+            category_id = int(params.get('main_category', 0)) or None
+            limit = min(int(params.get('limit', 20)), popularity.TOP_K)
+            lat = float(params['lat']) if params.get('lat') else None
+            lng = float(params['lng']) if params.get('lng') else None
+        except ValueError:
+            return Response({"error": "Tham số không hợp lệ."}, status=status.HTTP_400_BAD_REQUEST)
+
+        top = popularity.get_top(category_id, popularity.area_of(lat, lng))[:limit]
+        foods = {row['id']: feed.food_row(row) for row in Food.objects.filter(id__in=[food_id for food_id, _ in top])
+                 .values(*feed.FOOD_FIELDS)}
+
+        results = []
+        for food_id, score in top:
+            if food_id in foods:
+                results.append(dict(foods[food_id], popularity=round(score, 2)))
+        return Response(results, status=status.HTTP_200_OK)
+
+
+# Gợi ý khi gõ (tên món, nhà hàng, danh mục chính), trả lời từ chỉ mục trong RAM, không query DB
+# /autocomplete/?q=<tiền tố>&limit=<n>
+class AutocompleteView(APIView):
+    def get(self, request):
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 20)
+        except ValueError:
+            return Response({"error": "Tham số không hợp lệ."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(autocomplete.suggest(request.query_params.get('q', ''), limit), status=status.HTTP_200_OK)
+
+
 class FollowedRestaurantsAPIView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = RestaurantPagination
@@ -929,9 +1227,11 @@ class CommentViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
 
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(ValuesListMixin, viewsets.ModelViewSet):
     queryset = Review.objects.all()
     serializer_class = ReviewSerializer
+    values_serializer_class = ReviewValuesSerializer
+    renderer_classes = FAST_RENDERER_CLASSES
     pagination_class = RestaurantPagination
 
     def get_permissions(self):
@@ -956,15 +1256,13 @@ class ReviewViewSet(viewsets.ModelViewSet):
             food = get_object_or_404(Food, id=int(food_id))
             filters &= Q(food=food)
 
-        reviews = queryset.filter(filters).order_by("-id")
+        reviews = self.get_list_queryset(queryset.filter(filters).order_by("-id"))
 
         paginated_reviews = self.paginate_queryset(reviews)
         if paginated_reviews is not None:
-            serializer = self.get_serializer(paginated_reviews, many=True)
-            return self.get_paginated_response(serializer.data)
+            return self.get_paginated_response(self.get_list_data(paginated_reviews))
 
-        serializer = self.get_serializer(reviews, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(self.get_list_data(reviews), status=status.HTTP_200_OK)
 
     def create(self, request, *args, **kwargs):
         user = request.user
@@ -1004,3 +1302,11 @@ class ReviewViewSet(viewsets.ModelViewSet):
 
 def index(request):
     return HttpResponse("e-food app")
+
+
+def metrics(request):
+    allowed_ips = getattr(settings, 'METRICS_ALLOWED_IPS', None)
+    if allowed_ips is not None and request.META.get('REMOTE_ADDR') not in allowed_ips:
+        return HttpResponse(status=status.HTTP_403_FORBIDDEN)
+
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')